@@ -1,30 +1,36 @@
 import os
+import secrets
+import time
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
 from flask import render_template, jsonify
 import flask
-from flask_session import Session
 import google_auth_oauthlib.flow
-import googleapiclient.discovery
 from datetime import datetime, timedelta
 
+import fit_rollup
+import fit_session
+import fit_store
+import fit_sync
+
 # Flask app setup
 app = flask.Flask(__name__)
 app.secret_key = 'busabuuegfybjxjanisi'
 
 # Configure server-side session
-app.config['SESSION_TYPE'] = 'filesystem'
-app.config['SESSION_FILE_DIR'] = os.path.join(os.getcwd(), 'flask_sessions')
 app.config['SESSION_PERMANENT'] = True
 app.config['SESSION_USE_SIGNER'] = True
 app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
 app.config['SESSION_COOKIE_SECURE'] = False
 app.config['SESSION_COOKIE_DOMAIN'] = False
+# Only write a session when it changes, not on every request that reads it
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False
 
-if not os.path.exists(app.config['SESSION_FILE_DIR']):
-    os.makedirs(app.config['SESSION_FILE_DIR'])
+fit_session.init_app(app)
 
-Session(app)
+# Synced Fit points, and /data answers computed from them
+point_store = fit_store.PointStore()
+data_cache = fit_store.TTLCache()
 
 # Google Fit API setup
 SCOPES = [
@@ -44,36 +50,6 @@ sleep_stages = {
     6: "REM"
 }
 
-def get_sleep_data(service, start_time_millis, end_time_millis):
-    dataset = f"{start_time_millis}000000-{end_time_millis}000000"
-    sleep_data = []
-    try:
-        response = service.users().dataSources().datasets().get(
-            userId='me',
-            dataSourceId='derived:com.google.sleep.segment:com.google.android.gms:merged',
-            datasetId=dataset
-        ).execute()
-
-        for point in response.get('point', []):
-            start = int(point['startTimeNanos']) / 1e6
-            end = int(point['endTimeNanos']) / 1e6
-            duration_minutes = (end - start) / 60000
-            stage = point['value'][0]['intVal']
-            sleep_data.append({
-                'start': datetime.fromtimestamp(start / 1000).isoformat(),
-                'end': datetime.fromtimestamp(end / 1000).isoformat(),
-                'duration_minutes': duration_minutes,
-                'stage': stage
-            })
-
-    except Exception as e:
-        print(f"[ERROR] Sleep data fetch failed: {e}")
-        response = {}
-
-    print(f"[DEBUG] Raw sleep aggregate response: {response}")
-    print(f"[DEBUG] Found {len(sleep_data)} sleep segments")
-    return sleep_data
-
 @app.route('/')
 def index():
     return 'Welcome! <a href="/authorize">Connect Google Fit</a>'
@@ -95,6 +71,20 @@ def authorize():
     print(f"[DEBUG] Saved state in session: {state}")
     return flask.redirect(authorization_url)
 
+def forget_unreachable_users(user_id):
+    """Mark the user as seen and delete the points of users whose sessions have all expired.
+
+    A user id only lives in a session, written when the user signs in, so
+    nobody can read the points of a user not seen for the session lifetime.
+    """
+    now_ns = time.time_ns()
+    point_store.touch(user_id, now_ns)
+    forgotten = point_store.forget_unseen(now_ns - int(fit_session.FIT_SESSION_TTL_SECONDS * 10 ** 9))
+    for forgotten_id in forgotten:
+        data_cache.invalidate(forgotten_id)
+    if forgotten:
+        print(f"[DEBUG] Deleted the points of {len(forgotten)} users not seen since their sessions expired")
+
 @app.route('/oauth2callback')
 def oauth2callback():
     if 'state' not in flask.session:
@@ -113,72 +103,94 @@ def oauth2callback():
     flow.fetch_token(authorization_response=flask.request.url)
 
     credentials = flow.credentials
-    fitness_service = googleapiclient.discovery.build('fitness', 'v1', credentials=credentials)
 
-    now = datetime.now()
-    start_time_millis = int((now - timedelta(hours=36)).timestamp() * 1000)
-    end_time_millis = int(now.timestamp() * 1000)
+    # The browser session identifies the user whose points are synced
+    user_id = flask.session.setdefault('user_id', secrets.token_urlsafe(16))
+    forget_unreachable_users(user_id)
+    fit_sync.sync(point_store, user_id, credentials)
+    data_cache.invalidate(user_id)
 
-    # Get sleep data
-    sleep_segments = get_sleep_data(fitness_service, start_time_millis, end_time_millis)
-    total_sleep = sum(seg['duration_minutes'] for seg in sleep_segments)
+    now = datetime.now()
+    start_ns = int((now - timedelta(hours=36)).timestamp() * 1e9)
+    end_ns = int(now.timestamp() * 1e9)
+    data = fit_sync.summary(point_store, user_id, start_ns, end_ns)
 
-    for seg in sleep_segments:
+    for seg in data['sleep_segments']:
         print(f"Stage {seg['stage']} - {sleep_stages.get(seg['stage'], 'Unknown')} from {seg['start']} to {seg['end']} ({seg['duration_minutes']} mins)")
 
-    # Aggregate steps + heart rate
-    response = fitness_service.users().dataset().aggregate(
-        userId="me",
-        body={
-            "aggregateBy": [
-                {
-                    "dataSourceId": "raw:com.google.step_count.delta:nl.appyhapps.healthsync:HealthSync - steps"
-                },
-                {
-                    "dataTypeName": "com.google.heart_rate.bpm"
-                }
-            ],
-            "bucketByTime": {"durationMillis": 86400000},
-            "startTimeMillis": start_time_millis,
-            "endTimeMillis": end_time_millis
-        }
-    ).execute()
-
-    steps = 0
-    heart_rates = []
-    for bucket in response.get('bucket', []):
-        for dataset in bucket.get('dataset', []):
-            for point in dataset.get('point', []):
-                data_type = point['dataTypeName']
-                if data_type == 'com.google.step_count.delta':
-                    steps += point['value'][0].get('intVal', 0)
-                elif data_type == 'com.google.heart_rate.bpm':
-                    heart_rates.append(point['value'][0].get('fpVal', 0.0))
-
-    avg_hr = round(sum(heart_rates) / len(heart_rates), 2) if heart_rates else "N/A"
-
-    print(f"[DEBUG] Total steps: {steps}")
-    print(f"[DEBUG] Avg heart rate: {avg_hr}")
-
-    flask.session['fit_data'] = {
-        "steps": steps,
-        "avg_heart_rate": avg_hr,
-        "total_sleep_minutes": round(total_sleep, 2),
-        "sleep_segments": sleep_segments
-    }
+    print(f"[DEBUG] Total steps: {data['steps']}")
+    print(f"[DEBUG] Avg heart rate: {data['avg_heart_rate']}")
 
     return render_template('index.html',
-                           steps=steps,
-                           avg_heart_rate=avg_hr,
-                           total_sleep=round(total_sleep, 2),
-                           sleep_segments=sleep_segments,
+                           steps=data['steps'],
+                           avg_heart_rate=data['avg_heart_rate'],
+                           total_sleep=data['total_sleep_minutes'],
+                           sleep_segments=data['sleep_segments'],
                            sleep_stages=sleep_stages)
 
+# Times are stored as int64 nanoseconds, which end in 2262
+MAX_TIME_MS = (2 ** 63 - 1) // 10 ** 6
+
+def requested_range(default_hours):
+    """(start, end) in epoch ms from ?start= and ?end=, by default the last `default_hours`.
+
+    Raises ValueError unless 0 <= start < end <= MAX_TIME_MS.
+    """
+    # The default end is rounded up to the minute so repeated requests share a cache entry
+    end_ms = int(flask.request.args.get('end', -(-int(time.time()) // 60) * 60 * 1000))
+    start_ms = int(flask.request.args.get('start', end_ms - default_hours * 3600 * 1000))
+    if not 0 <= start_ms < end_ms <= MAX_TIME_MS:
+        raise ValueError(f"range {start_ms} to {end_ms} out of bounds")
+    return start_ms, end_ms
+
 @app.route('/data')
 def get_data():
-    data = flask.session.get('fit_data')
-    if not data:
+    """Synced data between ?start= and ?end= (epoch milliseconds), by default the last 36 hours.
+
+    Answers come from the local store, never the Fit API, and are cached
+    for FIT_DATA_CACHE_SECONDS; ?points=1 adds every stored point.
+    """
+    user_id = flask.session.get('user_id')
+    if not user_id:
         return jsonify({"error": "No data available. Please authorize first."}), 400
+
+    try:
+        start_ms, end_ms = requested_range(default_hours=36)
+    except ValueError:
+        return jsonify({"error": "start and end must be epoch milliseconds, with start before end."}), 400
+    include_points = flask.request.args.get('points') == '1'
+
+    key = (user_id, start_ms, end_ms, include_points)
+    data = data_cache.get(key)
+    if data is None:
+        data = fit_sync.summary(point_store, user_id, start_ms * 10 ** 6, end_ms * 10 ** 6, include_points)
+        data_cache.put(key, data)
+    return jsonify(data)
+
+@app.route('/rollups')
+def get_rollups():
+    """Hourly and daily steps, heart rate and sleep between ?start= and ?end=, by default the last 30 days.
+
+    Computed from the local store like /data, and cached the same way.
+    Ranges longer than FIT_ROLLUP_MAX_DAYS are refused.
+    """
+    user_id = flask.session.get('user_id')
+    if not user_id:
+        return jsonify({"error": "No data available. Please authorize first."}), 400
+
+    try:
+        start_ms, end_ms = requested_range(default_hours=30 * 24)
+    except ValueError:
+        return jsonify({"error": "start and end must be epoch milliseconds, with start before end."}), 400
+    # Buckets are allocated for the whole range, points or not
+    if end_ms - start_ms > fit_rollup.FIT_ROLLUP_MAX_DAYS * 24 * 3600 * 1000:
+        return jsonify({"error": f"Ranges are limited to {fit_rollup.FIT_ROLLUP_MAX_DAYS:g} days."}), 400
+
+    key = (user_id, 'rollups', start_ms, end_ms)
+    data = data_cache.get(key)
+    if data is None:
+        data = fit_rollup.rollup(point_store, user_id, start_ms * 10 ** 6, end_ms * 10 ** 6, sleep_stages)
+        data_cache.put(key, data)
     return jsonify(data)
 
 if __name__ == '__main__':
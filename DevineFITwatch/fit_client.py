@@ -0,0 +1,119 @@
+"""Google Fit API access for the Flask app.
+
+The fitness service is built once per process from the discovery document
+bundled with googleapiclient, and shared by every request. Queries run on a
+small thread pool; each pool thread keeps its own httplib2.Http, so its
+connection to the API stays open between requests (httplib2 objects can't
+be shared between threads). `fetch` runs independent queries concurrently
+under one deadline, and a query that fails or times out gives its default
+instead of failing the page.
+"""
+import os
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import google_auth_httplib2
+import googleapiclient.discovery
+import httplib2
+from googleapiclient import discovery_cache
+
+# Seconds to wait for all queries of one fetch; also the socket timeout of each request
+FIT_TIMEOUT_SECONDS = float(os.environ.get('FIT_TIMEOUT_SECONDS', 10))
+# Threads running Fit queries, shared by all requests
+FIT_WORKERS = int(os.environ.get('FIT_WORKERS', 8))
+# Base URL of the Fit users API, e.g. http://127.0.0.1:9000/fitness/v1/users/ for a local fake server
+FIT_API_ENDPOINT = os.environ.get('FIT_API_ENDPOINT')
+# Most points per page of a raw dataset read
+FIT_PAGE_SIZE = int(os.environ.get('FIT_PAGE_SIZE', 1000))
+
+SLEEP_DATA_SOURCE = 'derived:com.google.sleep.segment:com.google.android.gms:merged'
+STEPS_DATA_SOURCE = 'raw:com.google.step_count.delta:nl.appyhapps.healthsync:HealthSync - steps'
+HEART_RATE_DATA_SOURCE = 'derived:com.google.heart_rate.bpm:com.google.android.gms:merge_heart_rate_bpm'
+
+# One dataset query: request(service) builds the API call, parse(response) reads
+# its result, and default stands in when the call fails or runs out of time.
+# A paged query's request(service, page_token) is called until a response has
+# no nextPageToken, and parse gets one response with every page's points.
+FitQuery = namedtuple('FitQuery', ['request', 'parse', 'default', 'paged'], defaults=[False])
+
+_service = None
+_service_lock = threading.Lock()
+_local = threading.local()
+_executor = ThreadPoolExecutor(FIT_WORKERS, thread_name_prefix='fit')
+
+
+def get_service():
+    """The fitness v1 service, built on first use from the bundled discovery document.
+
+    It is built without credentials; each request is executed with the
+    caller's credentials instead, so one service serves every user.
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            document = discovery_cache.get_static_doc('fitness', 'v1')
+            client_options = {'api_endpoint': FIT_API_ENDPOINT} if FIT_API_ENDPOINT else None
+            _service = googleapiclient.discovery.build_from_document(
+                document, http=httplib2.Http(), client_options=client_options)
+        return _service
+
+
+def _thread_http():
+    http = getattr(_local, 'http', None)
+    if http is None:
+        http = _local.http = httplib2.Http(timeout=FIT_TIMEOUT_SECONDS)
+    return http
+
+
+def execute(service, query, http=None):
+    """A query's parsed result; `http` defaults to the service's own."""
+    if not query.paged:
+        return query.parse(query.request(service).execute(http=http))
+    response = query.request(service, None).execute(http=http)
+    points = list(response.get('point', []))
+    while response.get('nextPageToken'):
+        response = query.request(service, response['nextPageToken']).execute(http=http)
+        points += response.get('point', [])
+    response['point'] = points
+    return query.parse(response)
+
+
+def _run(service, query, credentials):
+    return execute(service, query, google_auth_httplib2.AuthorizedHttp(credentials, http=_thread_http()))
+
+
+def fetch(credentials, queries, timeout=FIT_TIMEOUT_SECONDS):
+    """Run a dict of named FitQuery objects concurrently; returns each one's result by name."""
+    service = get_service()
+    futures = {name: _executor.submit(_run, service, query, credentials) for name, query in queries.items()}
+    done, _ = wait(futures.values(), timeout=timeout)
+
+    results = {}
+    for name, future in futures.items():
+        if future not in done:
+            future.cancel()
+            print(f"[ERROR] Fit {name} query timed out after {timeout}s")
+            results[name] = queries[name].default
+        elif future.exception() is not None:
+            print(f"[ERROR] Fit {name} query failed: {future.exception()}")
+            results[name] = queries[name].default
+        else:
+            results[name] = future.result()
+    return results
+
+
+def dataset_query(data_source_id, start_ns, end_ns, default=None):
+    """Every raw point of one data source between two times in nanoseconds, across pages."""
+    return FitQuery(
+        request=lambda service, page_token: service.users().dataSources().datasets().get(
+            userId='me',
+            dataSourceId=data_source_id,
+            datasetId=f"{start_ns}-{end_ns}",
+            limit=FIT_PAGE_SIZE,
+            pageToken=page_token
+        ),
+        parse=lambda response: response.get('point', []),
+        default=default,
+        paged=True,
+    )
@@ -0,0 +1,168 @@
+"""Hourly and daily rollups of synced Fit points, computed with NumPy.
+
+Points are read from the PointStore chunk by chunk, turned into arrays and
+folded into one accumulator per bucket, so memory follows the number of
+hours and days in the range, not the number of points. Buckets are UTC
+hours and days; a point falls in the bucket its start time is in.
+
+Heart rate percentiles come from a per-day histogram with bins
+HEART_RATE_RESOLUTION bpm wide. They are nearest-rank percentiles and
+exact for readings with that precision (Fit reports whole or tenths of a
+bpm). The histogram takes about 3.6 MB per year of range, which is why
+/rollups refuses ranges longer than FIT_ROLLUP_MAX_DAYS.
+"""
+import os
+from datetime import datetime
+
+import numpy as np
+
+HEART_RATE_RESOLUTION = float(os.environ.get('HEART_RATE_RESOLUTION', 0.1))
+# Readings above this many bpm count as this many
+HEART_RATE_MAX = 250
+HEART_RATE_PERCENTILES = (50, 95)
+# Longest range /rollups answers
+FIT_ROLLUP_MAX_DAYS = float(os.environ.get('FIT_ROLLUP_MAX_DAYS', 731))
+
+HOUR_NANOS = 3600 * 10 ** 9
+DAY_NANOS = 24 * HOUR_NANOS
+MINUTE_NANOS = 60 * 10 ** 9
+
+ROW_DTYPE = np.dtype([('start', np.int64), ('end', np.int64), ('value', np.float64)])
+
+
+def row_array(rows):
+    """A structured (start, end, value) array from store rows."""
+    return np.fromiter(rows, dtype=ROW_DTYPE, count=len(rows))
+
+
+def _chunks(store, user_id, source, start_ns, end_ns):
+    for rows in store.chunks(user_id, source, start_ns, end_ns):
+        yield row_array(rows)
+
+
+def _buckets(start_ns, end_ns, width):
+    """(index of the first bucket, number of buckets) covering [start_ns, end_ns)."""
+    first = start_ns // width
+    return first, max(-(-end_ns // width) - first, 0)
+
+
+def _segments(index):
+    """Start offsets of the runs of equal values in a sorted index array, and those values."""
+    starts = np.flatnonzero(np.diff(index)) + 1
+    starts = np.concatenate(([0], starts))
+    return starts, index[starts]
+
+
+def _nearest_rank(hist, counts, q):
+    """q-th percentile of each histogram row, in bpm; NaN where the row is empty."""
+    cumulative = np.cumsum(hist, axis=-1)
+    rank = np.maximum(np.ceil(q / 100 * counts), 1)
+    index = (cumulative < rank[..., None]).sum(axis=-1)
+    return np.where(counts > 0, index * HEART_RATE_RESOLUTION, np.nan)
+
+
+def _column(values, counts=None, digits=2):
+    """A JSON-ready list, with None where a bucket has no points."""
+    values = np.round(values, digits).tolist()
+    if counts is None:
+        return values
+    return [value if count else None for value, count in zip(values, counts.tolist())]
+
+
+def _step_sums(store, user_id, start_ns, end_ns):
+    first_hour, hours = _buckets(start_ns, end_ns, HOUR_NANOS)
+    first_day, days = _buckets(start_ns, end_ns, DAY_NANOS)
+    hourly, daily = np.zeros(hours), np.zeros(days)
+    for chunk in _chunks(store, user_id, 'steps', start_ns, end_ns):
+        hourly += np.bincount(chunk['start'] // HOUR_NANOS - first_hour, weights=chunk['value'], minlength=hours)
+        daily += np.bincount(chunk['start'] // DAY_NANOS - first_day, weights=chunk['value'], minlength=days)
+    return hourly, daily
+
+
+def _heart_rate(store, user_id, start_ns, end_ns):
+    first_day, days = _buckets(start_ns, end_ns, DAY_NANOS)
+    bins = int(round(HEART_RATE_MAX / HEART_RATE_RESOLUTION)) + 1
+    counts = np.zeros(days, dtype=np.int64)
+    totals = np.zeros(days)
+    low = np.full(days, np.inf)
+    high = np.full(days, -np.inf)
+    hist = np.zeros((days, bins), dtype=np.int32)
+
+    for chunk in _chunks(store, user_id, 'heart_rate', start_ns, end_ns):
+        day = chunk['start'] // DAY_NANOS - first_day
+        value = chunk['value']
+        counts += np.bincount(day, minlength=days)
+        totals += np.bincount(day, weights=value, minlength=days)
+        # Rows come in time order, so each day is one run of the chunk
+        starts, run_days = _segments(day)
+        low[run_days] = np.minimum(low[run_days], np.minimum.reduceat(value, starts))
+        high[run_days] = np.maximum(high[run_days], np.maximum.reduceat(value, starts))
+        # Only the days this chunk covers are counted into the histogram
+        first, span = run_days[0], run_days[-1] - run_days[0] + 1
+        bin_index = np.clip(np.rint(value / HEART_RATE_RESOLUTION), 0, bins - 1).astype(np.int64)
+        hist[first:first + span] += np.bincount((day - first) * bins + bin_index,
+                                                minlength=span * bins).reshape(span, bins).astype(np.int32)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        daily = {'count': counts, 'min': low, 'max': high, 'mean': totals / counts}
+    for q in HEART_RATE_PERCENTILES:
+        daily[f'p{q}'] = _nearest_rank(hist, counts, q)
+
+    count = int(counts.sum())
+    overall = {'count': count}
+    if count:
+        overall.update(min=float(low.min()), max=float(high.max()), mean=round(float(totals.sum() / count), 2))
+        total_hist = hist.sum(axis=0, dtype=np.int64)
+        for q in HEART_RATE_PERCENTILES:
+            overall[f'p{q}'] = round(float(_nearest_rank(total_hist, np.array(count), q)), 2)
+    else:
+        overall.update({key: None for key in ['min', 'max', 'mean'] + [f'p{q}' for q in HEART_RATE_PERCENTILES]})
+    return overall, daily
+
+
+def _sleep_minutes(store, user_id, start_ns, end_ns, stage_names):
+    """{stage name: minutes per day}; stages missing from stage_names count as 'Unknown'."""
+    first_day, days = _buckets(start_ns, end_ns, DAY_NANOS)
+    codes = sorted(stage_names)
+    names = [stage_names[code] for code in codes] + ['Unknown']
+    # Maps a stage code to its row in `minutes`; the last row is 'Unknown'
+    lookup = np.full(max(codes) + 1, len(codes))
+    lookup[codes] = np.arange(len(codes))
+    minutes = np.zeros(len(names) * days)
+
+    for chunk in _chunks(store, user_id, 'sleep', start_ns, end_ns):
+        stage = chunk['value'].astype(np.int64)
+        known = (stage >= 0) & (stage < len(lookup))
+        row = np.where(known, lookup[np.where(known, stage, 0)], len(codes))
+        day = chunk['start'] // DAY_NANOS - first_day
+        minutes += np.bincount(row * days + day, weights=(chunk['end'] - chunk['start']) / MINUTE_NANOS,
+                               minlength=len(names) * days)
+    return dict(zip(names, minutes.reshape(len(names), days)))
+
+
+def rollup(store, user_id, start_ns, end_ns, stage_names):
+    """Steps, heart rate and sleep between two times in hourly and daily buckets.
+
+    Daily series are lists with one entry per day from `day_start` (epoch
+    ms), and hourly_steps has one per hour from `hour_start`. Heart rate
+    entries are None on days without readings.
+    """
+    hourly_steps, daily_steps = _step_sums(store, user_id, start_ns, end_ns)
+    heart_rate, daily_heart_rate = _heart_rate(store, user_id, start_ns, end_ns)
+    sleep = _sleep_minutes(store, user_id, start_ns, end_ns, stage_names)
+    counts = daily_heart_rate['count']
+
+    return {
+        "start": datetime.fromtimestamp(start_ns / 1e9).isoformat(),
+        "end": datetime.fromtimestamp(end_ns / 1e9).isoformat(),
+        "hour_start": start_ns // HOUR_NANOS * HOUR_NANOS // 10 ** 6,
+        "day_start": start_ns // DAY_NANOS * DAY_NANOS // 10 ** 6,
+        "steps": int(daily_steps.sum()),
+        "hourly_steps": hourly_steps.astype(np.int64).tolist(),
+        "daily_steps": daily_steps.astype(np.int64).tolist(),
+        "heart_rate": heart_rate,
+        "daily_heart_rate": {key: counts.tolist() if key == 'count' else _column(values, counts)
+                             for key, values in daily_heart_rate.items()},
+        "sleep_minutes": {name: round(float(values.sum()), 2) for name, values in sleep.items()},
+        "daily_sleep_minutes": {name: _column(values) for name, values in sleep.items()},
+    }
@@ -0,0 +1,143 @@
+"""Server-side session storage for the Flask app.
+
+Sessions hold only small values: the OAuth state and the user id that keys
+the point store. Fit data lives in fit_store. FIT_SESSION_STORE picks where
+sessions are kept:
+
+- "sqlite": a file that every worker process on the host opens;
+- "memory": an LRU in this process, lost on restart;
+- "filesystem": one pickle file per session under flask_sessions/.
+
+The first two cap the number of sessions at FIT_SESSION_STORE_SIZE and drop
+them FIT_SESSION_TTL_SECONDS after their last change. Both plug into
+Flask-Session's cachelib interface, which needs get, set and delete. The
+variables and the table are prefixed because bicep's server reads
+SESSION_STORE* for its own snapshot store, which has other defaults and
+another schema.
+"""
+import collections
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+
+from flask_session import Session
+
+# Losing a session means a new user id and a full initial sync, so the
+# default store survives restarts
+FIT_SESSION_STORE = os.environ.get('FIT_SESSION_STORE', 'sqlite')
+FIT_SESSION_STORE_PATH = os.environ.get('FIT_SESSION_STORE_PATH', 'fit_sessions.sqlite3')
+FIT_SESSION_STORE_SIZE = int(os.environ.get('FIT_SESSION_STORE_SIZE', 10000))
+FIT_SESSION_TTL_SECONDS = float(os.environ.get('FIT_SESSION_TTL_SECONDS', 30 * 86400))
+SESSION_FILE_DIR = os.path.join(os.getcwd(), 'flask_sessions')
+
+EXPIRE_INTERVAL_SECONDS = 60
+
+
+class MemorySessionCache:
+    """LRU of pickled sessions with a time-to-live, local to one process."""
+
+    def __init__(self, max_entries=FIT_SESSION_STORE_SIZE):
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if time.time() > expires_at:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+        return pickle.loads(data)
+
+    def set(self, key, value, timeout=FIT_SESSION_TTL_SECONDS):
+        data = pickle.dumps(value)
+        with self.lock:
+            self.entries[key] = (data, time.time() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return True
+
+    def delete(self, key):
+        with self.lock:
+            return self.entries.pop(key, None) is not None
+
+
+class SQLiteSessionCache:
+    """Pickled sessions in an SQLite file that every worker process on the host opens.
+
+    WAL mode lets readers in one worker proceed while another writes.
+    Expired rows, and the least recently written ones beyond `max_entries`,
+    are deleted at most once a minute.
+    """
+
+    def __init__(self, path=FIT_SESSION_STORE_PATH, max_entries=FIT_SESSION_STORE_SIZE):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS fit_sessions (id TEXT PRIMARY KEY, data BLOB NOT NULL, "
+            "written_at REAL NOT NULL, expires_at REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS fit_sessions_written_at ON fit_sessions (written_at)")
+        self.expired_at = 0.0
+
+    def get(self, key):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT data FROM fit_sessions WHERE id = ? AND expires_at > ?", (key, time.time())).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key, value, timeout=FIT_SESSION_TTL_SECONDS):
+        data = pickle.dumps(value)
+        now = time.time()
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO fit_sessions (id, data, written_at, expires_at) VALUES (?, ?, ?, ?)",
+                (key, data, now, now + timeout))
+            if now - self.expired_at > EXPIRE_INTERVAL_SECONDS:
+                self.expire(now)
+        return True
+
+    def delete(self, key):
+        with self.lock:
+            return self.db.execute("DELETE FROM fit_sessions WHERE id = ?", (key,)).rowcount > 0
+
+    def expire(self, now):
+        """Delete expired sessions and the oldest beyond the cap; the caller holds the lock."""
+        self.db.execute("DELETE FROM fit_sessions WHERE expires_at <= ?", (now,))
+        self.db.execute(
+            "DELETE FROM fit_sessions WHERE id IN (SELECT id FROM fit_sessions ORDER BY written_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,))
+        self.expired_at = now
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def init_app(app, kind=FIT_SESSION_STORE, max_entries=FIT_SESSION_STORE_SIZE):
+    """Install the session store named by `kind` on the app."""
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(seconds=FIT_SESSION_TTL_SECONDS)
+    if kind == 'filesystem':
+        app.config['SESSION_TYPE'] = 'filesystem'
+        app.config['SESSION_FILE_DIR'] = SESSION_FILE_DIR
+        os.makedirs(SESSION_FILE_DIR, exist_ok=True)
+    else:
+        if kind == 'memory':
+            cache = MemorySessionCache(max_entries)
+        else:
+            if kind != 'sqlite':
+                print(f"[ERROR] Unknown FIT_SESSION_STORE {kind!r}, using sqlite")
+            cache = SQLiteSessionCache(max_entries=max_entries)
+        app.config['SESSION_TYPE'] = 'cachelib'
+        app.config['SESSION_CACHELIB'] = cache
+    Session(app)
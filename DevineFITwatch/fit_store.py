@@ -0,0 +1,160 @@
+"""Local time-series store of synced Google Fit points, and the cache in front of it.
+
+Points live in one SQLite table keyed by user, data source and time, so a
+range read is a single index scan. Alongside them, `sync_state` records how
+far each user's data sources have been synced and `users` when each user
+last signed in, so users nobody can reach any more can be deleted.
+"""
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+FIT_STORE_PATH = os.environ.get('FIT_STORE_PATH', 'fit_data.sqlite3')
+# Seconds a /data answer is served from memory before it is read from the store again
+FIT_DATA_CACHE_SECONDS = float(os.environ.get('FIT_DATA_CACHE_SECONDS', 60))
+FIT_DATA_CACHE_SIZE = int(os.environ.get('FIT_DATA_CACHE_SIZE', 1024))
+# Rows per query when a long range is read in chunks
+FIT_STORE_CHUNK_ROWS = int(os.environ.get('FIT_STORE_CHUNK_ROWS', 50000))
+
+
+class PointStore:
+    """Fit data points in SQLite, one row per point.
+
+    The points table is WITHOUT ROWID, so rows are stored in key order and
+    a user's range of one source is read sequentially. WAL mode lets /data
+    reads proceed while a sync writes. Each sync batch is one transaction
+    that also moves the source's synced-until time, so the two never
+    disagree. Rerunning a window replaces the points it already stored.
+    """
+
+    def __init__(self, path=FIT_STORE_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS points (user_id TEXT NOT NULL, source TEXT NOT NULL, "
+            "start_ns INTEGER NOT NULL, end_ns INTEGER NOT NULL, value REAL, "
+            "PRIMARY KEY (user_id, source, start_ns, end_ns)) WITHOUT ROWID")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sync_state (user_id TEXT NOT NULL, source TEXT NOT NULL, "
+            "synced_until_ns INTEGER NOT NULL, PRIMARY KEY (user_id, source)) WITHOUT ROWID")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, seen_ns INTEGER NOT NULL) WITHOUT ROWID")
+
+    def touch(self, user_id, seen_ns):
+        """Record that the user signed in at `seen_ns`."""
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO users (user_id, seen_ns) VALUES (?, ?)", (user_id, seen_ns))
+
+    def forget_unseen(self, before_ns):
+        """Delete every point and sync state of users last seen before `before_ns`; returns their ids."""
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                users = [row[0] for row in self.db.execute("SELECT user_id FROM users WHERE seen_ns < ?", (before_ns,))]
+                for table in ('points', 'sync_state', 'users'):
+                    self.db.executemany(f"DELETE FROM {table} WHERE user_id = ?", [(user_id,) for user_id in users])
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return users
+
+    def synced_until(self, user_id):
+        """{source: nanoseconds} up to which each of the user's sources has been synced."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT source, synced_until_ns FROM sync_state WHERE user_id = ?", (user_id,)).fetchall()
+        return dict(rows)
+
+    def append(self, user_id, source, rows, synced_until_ns):
+        """Store (start_ns, end_ns, value) rows of one source and record how far it is synced."""
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO points (user_id, source, start_ns, end_ns, value) VALUES (?, ?, ?, ?, ?)",
+                    [(user_id, source, start_ns, end_ns, value) for start_ns, end_ns, value in rows])
+                self.db.execute(
+                    "INSERT OR REPLACE INTO sync_state (user_id, source, synced_until_ns) VALUES (?, ?, ?)",
+                    (user_id, source, synced_until_ns))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def range(self, user_id, source, start_ns, end_ns):
+        """(start_ns, end_ns, value) rows of one source starting in [start_ns, end_ns), in time order."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT start_ns, end_ns, value FROM points "
+                "WHERE user_id = ? AND source = ? AND start_ns >= ? AND start_ns < ? ORDER BY start_ns",
+                (user_id, source, start_ns, end_ns)).fetchall()
+
+    def chunks(self, user_id, source, start_ns, end_ns, size=FIT_STORE_CHUNK_ROWS):
+        """The rows of `range` that have a value, as lists of at most `size` rows.
+
+        Each chunk is its own query, resuming after the last key read, so
+        the lock isn't held while the caller works on a chunk and a long
+        range never has to fit in memory at once.
+        """
+        after = (start_ns - 1, 2 ** 63 - 1)
+        while True:
+            with self.lock:
+                rows = self.db.execute(
+                    "SELECT start_ns, end_ns, value FROM points "
+                    "WHERE user_id = ? AND source = ? AND (start_ns, end_ns) > (?, ?) AND start_ns < ? "
+                    "AND value IS NOT NULL ORDER BY start_ns, end_ns LIMIT ?",
+                    (user_id, source, after[0], after[1], end_ns, size)).fetchall()
+            if rows:
+                yield rows
+            if len(rows) < size:
+                return
+            after = rows[-1][:2]
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+class TTLCache:
+    """LRU of computed answers keyed by tuples whose first item is the user id.
+
+    Entries expire `ttl` seconds after they are stored; `invalidate` drops a
+    user's entries when a sync brings in new points.
+    """
+
+    def __init__(self, ttl=FIT_DATA_CACHE_SECONDS, max_entries=FIT_DATA_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self.entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic())
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, user_id):
+        with self.lock:
+            for key in [key for key in self.entries if key[0] == user_id]:
+                del self.entries[key]
@@ -2,21 +2,20 @@ import os
 os.environ['OAUTHLIB_INSECURE_TRANSPORT'] = '1'
 
 import flask
-from flask_session import Session
 import google_auth_oauthlib.flow
 import googleapiclient.discovery
 from datetime import datetime, timedelta
 
+import fit_session
+
 app = flask.Flask(__name__)
 app.secret_key = 'RawiJIOJOAMLOWKOmsam'
 
 # Session setup
-app.config['SESSION_TYPE'] = 'filesystem'
 app.config['SESSION_PERMANENT'] = True
 app.config['SESSION_USE_SIGNER'] = True
-app.config['SESSION_FILE_DIR'] = os.path.join(os.getcwd(), 'flask_session')
-os.makedirs(app.config['SESSION_FILE_DIR'], exist_ok=True)
-Session(app)
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False
+fit_session.init_app(app)
 
 SCOPES = ['https://www.googleapis.com/auth/fitness.activity.read']
 REDIRECT_URI = 'http://localhost:8080/oauth2callback'
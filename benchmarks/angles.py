@@ -0,0 +1,101 @@
+"""Per-call `calculate_angle` against the vectorised angle engine.
+
+Run from the repository root:
+
+    python -m benchmarks.angles --frames 2000
+
+The live per-frame path copies only the six arm landmarks out of each
+MediaPipe result, as the local app and sessions without an ROI crop do;
+copying all 33 is reported separately. Exits 1 if any angle differs from
+calculate_angle's, or the live path is slower than it.
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+from mediapipe.framework.formats import landmark_pb2
+
+from bicep.angles import ARM_LANDMARKS, NUM_LANDMARKS, arm_angles, landmarks_to_array
+from bicep.app import calculate_angle, mp_pose
+
+
+def synthetic_recording(frames, seed=0):
+    rng = np.random.default_rng(seed)
+    points = rng.uniform(0.2, 0.8, (frames, NUM_LANDMARKS, 4)).astype(np.float32)
+    points[..., 3] = rng.uniform(0.5, 1.0, (frames, NUM_LANDMARKS))
+    return points
+
+
+def to_landmark_lists(points):
+    recording = []
+    for frame in points:
+        landmark_list = landmark_pb2.NormalizedLandmarkList()
+        for x, y, z, v in frame:
+            landmark_list.landmark.add(x=x, y=y, z=z, visibility=v)
+        recording.append(landmark_list.landmark)
+    return recording
+
+
+def legacy_arm_angles(landmarks):
+    # The pre-vectorisation path: enum lookups by formatted name and two
+    # calculate_angle calls per arm
+    angles = []
+    for side in ("LEFT", "RIGHT"):
+        shoulder = [landmarks[mp_pose.PoseLandmark[f"{side}_SHOULDER"].value].x, landmarks[mp_pose.PoseLandmark[f"{side}_SHOULDER"].value].y]
+        elbow = [landmarks[mp_pose.PoseLandmark[f"{side}_ELBOW"].value].x, landmarks[mp_pose.PoseLandmark[f"{side}_ELBOW"].value].y]
+        wrist = [landmarks[mp_pose.PoseLandmark[f"{side}_WRIST"].value].x, landmarks[mp_pose.PoseLandmark[f"{side}_WRIST"].value].y]
+        angles.append((int(calculate_angle(shoulder, elbow, wrist)),
+                       int(calculate_angle(elbow, shoulder, [shoulder[0], 1]))))
+    return angles
+
+
+def timed(fn, frames):
+    start = time.perf_counter()
+    result = fn()
+    return result, (time.perf_counter() - start) / frames * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--frames", type=int, default=2000)
+    args = parser.parse_args()
+
+    points = synthetic_recording(args.frames)
+    recording = to_landmark_lists(points)
+    buffer = np.empty((NUM_LANDMARKS, 4), np.float32)
+
+    legacy, legacy_us = timed(lambda: [legacy_arm_angles(lms) for lms in recording], args.frames)
+    per_frame, per_frame_us = timed(
+        lambda: [arm_angles(landmarks_to_array(lms, out=buffer, indices=ARM_LANDMARKS)) for lms in recording],
+        args.frames)
+    _, convert_us = timed(lambda: [landmarks_to_array(lms, out=buffer, indices=ARM_LANDMARKS) for lms in recording],
+                          args.frames)
+    _, convert_all_us = timed(lambda: [landmarks_to_array(lms, out=buffer) for lms in recording], args.frames)
+    _, angles_us = timed(lambda: [arm_angles(frame) for frame in points], args.frames)
+    batch, batch_us = timed(lambda: arm_angles(points), args.frames)
+
+    _, curl, upper_arm = batch
+    vectorised = [[(int(curl[i, s]), int(upper_arm[i, s])) for s in range(2)] for i in range(args.frames)]
+    live = [[(int(angles[1][s]), int(angles[2][s])) for s in range(2)] for angles in per_frame]
+
+    report = {
+        "frames": args.frames,
+        "us_per_frame": {
+            "legacy_calculate_angle": round(legacy_us, 3),
+            "vectorised_per_frame": round(per_frame_us, 3),
+            "landmarks_to_array_arms": round(convert_us, 3),
+            "landmarks_to_array_all": round(convert_all_us, 3),
+            "arm_angles_per_frame": round(angles_us, 3),
+            "vectorised_batch": round(batch_us, 3),
+        },
+        "identical_angles": vectorised == legacy and live == legacy,
+    }
+    print(json.dumps(report, indent=2))
+    if not report["identical_angles"] or per_frame_us > legacy_us:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
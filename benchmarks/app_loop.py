@@ -0,0 +1,231 @@
+"""Frame rate and latency of the local app loop, serial against pipelined.
+
+Run from the repository root:
+
+    python -m benchmarks.app_loop
+    python -m benchmarks.app_loop --video recordings/curls.mp4 --seconds 20
+
+Both loops run headless with a CurlTracker and the same rendering callback
+bicep.app.main uses, with output sent to /dev/null. The serial loop is the
+old main(): read, rescale, infer, print, then read again. The camera is
+simulated: frames rendered from the fixture landmark stream, or read from
+--video, are exposed at --fps and queued in a four-frame driver buffer, so a
+reader that falls behind gets stale frames as it would from a webcam.
+Reported per loop: frames shown per second, each rendered frame's age since
+it was exposed, and for the pipeline each stage's rate, time per frame and
+latency. Both loops are then run over the frames as a video file, where
+nothing may be dropped, and must produce the same counts; exits 1 when they
+differ.
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import FPS, load_camera_landmarks, render_frame
+from bicep.app import DISPLAY_SCALE, CurlTracker, mp_pose, rescale_frame
+from bicep.live import FramePipeline, StageMeter
+from bicep.posture import get_classifier
+
+CAMERA_SIZE = (640, 480)
+# Frames a webcam driver queues for a reader that falls behind
+CAMERA_BUFFER = 4
+
+
+class SimulatedCamera:
+    """Releases `frames` at `fps` in real time, like an MJPEG webcam.
+
+    Like a V4L2 driver, the camera queues up to `buffer` frames: grab()
+    blocks until a frame is due and otherwise returns the oldest one still
+    queued, so a reader that falls behind sees stale frames. retrieve()
+    decodes the grabbed frame from JPEG; `exposed` maps each decoded frame's
+    id to the time it was exposed.
+    """
+
+    def __init__(self, frames, fps, seconds, buffer=CAMERA_BUFFER):
+        self.frames = [cv2.imencode(".jpg", frame)[1] for frame in frames]
+        self.fps = fps
+        self.seconds = seconds
+        self.buffer = buffer
+        self.started = None
+        self.last = -1
+        self.exposed = {}
+
+    def grab(self):
+        now = time.perf_counter()
+        if self.started is None:
+            self.started = now
+        exposed = int((now - self.started) * self.fps)
+        due = max(self.last + 1, exposed - self.buffer + 1)
+        if due / self.fps >= self.seconds:
+            return False
+        time.sleep(max(0.0, self.started + due / self.fps - now))
+        self.last = due
+        return True
+
+    def retrieve(self):
+        frame = cv2.imdecode(self.frames[self.last % len(self.frames)], cv2.IMREAD_COLOR)
+        self.exposed[id(frame)] = self.started + self.last / self.fps
+        return True, frame
+
+    def read(self):
+        return self.retrieve() if self.grab() else (False, None)
+
+
+class FrameList:
+    def __init__(self, frames):
+        self.frames = iter(frames)
+        self.frame = None
+
+    def grab(self):
+        self.frame = next(self.frames, None)
+        return self.frame is not None
+
+    def retrieve(self):
+        return True, self.frame.copy()
+
+    def read(self):
+        return self.retrieve() if self.grab() else (False, None)
+
+
+def fixture_frames(count):
+    points = load_camera_landmarks()[:count]
+    return [render_frame(p, size=CAMERA_SIZE, seed=i) for i, p in enumerate(points)]
+
+
+def video_frames(path, count):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def render(image, result):
+    pose_landmarks, output_data = result or (None, None)
+    print("No human found" if pose_landmarks is None else json.dumps(output_data))
+    return True
+
+
+class FrameAges:
+    """Rescales and renders like the app, recording each rendered frame's age since exposure."""
+
+    def __init__(self, camera):
+        self.camera = camera
+        self.exposed = {}
+        self.ages = []
+
+    def prepare(self, frame):
+        small = rescale_frame(frame, DISPLAY_SCALE)
+        exposed_at = getattr(self.camera, "exposed", {}).pop(id(frame), None)
+        if exposed_at is not None:
+            self.exposed[id(small)] = exposed_at
+        return small
+
+    def render(self, image, result):
+        render(image, result)
+        exposed_at = self.exposed.pop(id(image), None)
+        if exposed_at is not None:
+            self.ages.append(time.perf_counter() - exposed_at)
+        return True
+
+    def report(self):
+        if not self.ages:
+            return None
+        ages = np.array(self.ages) * 1000
+        return {"mean": round(float(ages.mean()), 1), "p95": round(float(np.percentile(ages, 95)), 1)}
+
+
+def scores(tracker):
+    return {"left_counter": tracker.left_arm_analysis.counter, "right_counter": tracker.right_arm_analysis.counter,
+            "left_errors": dict(tracker.left_arm_analysis.detected_errors),
+            "right_errors": dict(tracker.right_arm_analysis.detected_errors)}
+
+
+def run_serial(cap, classifier):
+    meter = StageMeter("serial")
+    ages = FrameAges(cap)
+    started = time.perf_counter()
+    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
+        tracker = CurlTracker(pose, classifier)
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            captured_at = time.perf_counter()
+            frame = ages.prepare(frame)
+            ages.render(frame, tracker.process(frame))
+            meter.record(captured_at, captured_at)
+    report = meter.report(time.perf_counter() - started)
+    report["max_latency_ms"] = round(meter.max_latency * 1000, 1)
+    report["age_since_exposure_ms"] = ages.report()
+    return report, scores(tracker)
+
+
+def run_pipeline(cap, classifier, drop_frames):
+    ages = FrameAges(cap)
+    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
+        tracker = CurlTracker(pose, classifier)
+        pipeline = FramePipeline(cap, tracker.process, ages.render, prepare=ages.prepare,
+                                 drop_frames=drop_frames, stats_seconds=0)
+        report = pipeline.run()
+    report["age_since_exposure_ms"] = ages.report()
+    return report, scores(tracker)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the serial and pipelined local app loops")
+    parser.add_argument("--video", help="video to use as camera frames instead of rendered fixture frames")
+    parser.add_argument("--fps", type=float, default=FPS, help="simulated camera frame rate")
+    parser.add_argument("--seconds", type=float, default=10, help="length of each simulated camera run")
+    parser.add_argument("--frames", type=int, default=150, help="frames loaded, and run as a video file")
+    args = parser.parse_args()
+
+    frames = video_frames(args.video, args.frames) if args.video else fixture_frames(args.frames)
+    try:
+        classifier = get_classifier()
+    except Exception as e:
+        print(f"Warning: Posture classifier unavailable, timing without it: {e}", file=sys.stderr)
+        classifier = None
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        serial_camera, _ = run_serial(SimulatedCamera(frames, args.fps, args.seconds), classifier)
+        pipelined_camera, _ = run_pipeline(SimulatedCamera(frames, args.fps, args.seconds), classifier, True)
+        serial_file, serial_scores = run_serial(FrameList(frames), classifier)
+        pipelined_file, pipelined_scores = run_pipeline(FrameList(frames), classifier, False)
+
+    report = {
+        "frames": len(frames),
+        "frame_size": list(frames[0].shape[1::-1]),
+        "posture_classifier": classifier is not None,
+        "camera": {
+            "fps": args.fps,
+            "seconds": args.seconds,
+            "serial": serial_camera,
+            "pipelined": pipelined_camera,
+            "speedup": round(pipelined_camera["render"]["fps"] / serial_camera["fps"], 2),
+        },
+        "file": {
+            "serial": dict(serial_file, scores=serial_scores),
+            "pipelined": dict(pipelined_file, scores=pipelined_scores),
+            "match": serial_scores == pipelined_scores
+                     and pipelined_file["inference"]["fps"] is not None
+                     and pipelined_file["capture"]["dropped"] == 0,
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if not report["file"]["match"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""Check the exercise engine against the original bicep state machine, and time both.
+
+Run from the repository root:
+
+    python -m benchmarks.exercise_parity
+
+Replays the fixture landmark stream through the pre-engine bicep analysis
+(kept below as `LegacyBicepAnalysis`), through `BicepPoseAnalysis` and
+through an `ExerciseEngine` running both curls, and compares angles, stage,
+counters and errors on every frame. Then times a frame of each, best of
+five passes over the stream, including an engine that also runs squats and
+lateral raises on both sides. The legacy analysis gets its angles from
+`arm_angles`, which runs on the same FeatureSet as the engine. Exits 1 on
+any mismatch.
+"""
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import load_expected, load_landmarks
+from bicep.angles import arm_angles
+from bicep.app import BicepPoseAnalysis
+from bicep.exercises import EXERCISES, ExerciseEngine, ExerciseState
+
+# Constants from server.py
+THRESHOLDS = dict(stage_down_threshold=120, stage_up_threshold=90, peak_contraction_threshold=60,
+                  loose_upper_arm_angle_threshold=40, visibility_threshold=0.65)
+SIDES = ("left", "right")
+
+
+class LegacyBicepAnalysis:
+    # BicepPoseAnalysis.analyze_angles as it was before the exercise engine
+    def __init__(self, side, stage_down_threshold, stage_up_threshold, peak_contraction_threshold,
+                 loose_upper_arm_angle_threshold, visibility_threshold):
+        self.stage_down_threshold = stage_down_threshold
+        self.stage_up_threshold = stage_up_threshold
+        self.peak_contraction_threshold = peak_contraction_threshold
+        self.loose_upper_arm_angle_threshold = loose_upper_arm_angle_threshold
+        self.visibility_threshold = visibility_threshold
+        self.side_index = SIDES.index(side)
+        self.counter = 0
+        self.stage = "down"
+        self.detected_errors = {"LOOSE_UPPER_ARM": 0, "PEAK_CONTRACTION": 0}
+        self.loose_upper_arm = False
+        self.peak_contraction_angle = 1000
+
+    def analyze_angles(self, angles):
+        visibility, curl, upper_arm = angles
+        if not float(visibility[self.side_index]) > self.visibility_threshold:
+            return (None, None)
+
+        bicep_curl_angle = int(curl[self.side_index])
+        if bicep_curl_angle > self.stage_down_threshold:
+            self.stage = "down"
+        elif bicep_curl_angle < self.stage_up_threshold and self.stage == "down":
+            self.stage = "up"
+            self.counter += 1
+
+        ground_upper_arm_angle = int(upper_arm[self.side_index])
+        if ground_upper_arm_angle > self.loose_upper_arm_angle_threshold:
+            if not self.loose_upper_arm:
+                self.loose_upper_arm = True
+                self.detected_errors["LOOSE_UPPER_ARM"] += 1
+        else:
+            self.loose_upper_arm = False
+
+        if self.stage == "up" and bicep_curl_angle < self.peak_contraction_angle:
+            self.peak_contraction_angle = bicep_curl_angle
+        elif self.stage == "down":
+            if self.peak_contraction_angle != 1000 and self.peak_contraction_angle >= self.peak_contraction_threshold:
+                self.detected_errors["PEAK_CONTRACTION"] += 1
+            self.peak_contraction_angle = 1000
+
+        return (bicep_curl_angle, ground_upper_arm_angle)
+
+
+def snapshot(analysis, angles):
+    return (tuple(angles) if angles else (None, None), analysis.stage, analysis.counter, dict(analysis.detected_errors))
+
+
+def check_parity(points):
+    legacy = [LegacyBicepAnalysis(side, **THRESHOLDS) for side in SIDES]
+    ported = [BicepPoseAnalysis(side, **THRESHOLDS) for side in SIDES]
+    engine_states = [BicepPoseAnalysis(side, **THRESHOLDS) for side in SIDES]
+    engine = ExerciseEngine(engine_states)
+
+    mismatches = []
+    for i, frame_points in enumerate(points):
+        if np.isnan(frame_points[0, 0]):
+            continue
+        angles = arm_angles(frame_points)
+        expected = [snapshot(a, a.analyze_angles(angles)) for a in legacy]
+        from_ported = [snapshot(a, a.analyze_angles(angles, None)) for a in ported]
+        from_engine = [snapshot(s, v) for s, v in zip(engine_states, engine.step(frame_points))]
+        if not expected == from_ported == from_engine:
+            mismatches.append({"frame": i, "legacy": expected, "ported": from_ported, "engine": from_engine})
+
+    scores = {a.side: {"counter": a.counter, "errors": dict(a.detected_errors)} for a in engine_states}
+    return {
+        "frames": len(points),
+        "mismatched_frames": len(mismatches),
+        "first_mismatch": mismatches[0] if mismatches else None,
+        "engine_scores": scores,
+        "expected": load_expected()["scores"],
+        "match": not mismatches and scores == load_expected()["scores"],
+    }
+
+
+def per_frame_us(fn, frames, passes=5):
+    # Best of several passes, so one noisy pass doesn't decide the comparison
+    best = float("inf")
+    for _ in range(passes):
+        started = time.perf_counter()
+        for frame_points in frames:
+            fn(frame_points)
+        best = min(best, time.perf_counter() - started)
+    return round(best / len(frames) * 1e6, 2)
+
+
+def timings(points):
+    frames = points[~np.isnan(points[:, 0, 0])]
+
+    legacy = [LegacyBicepAnalysis(side, **THRESHOLDS) for side in SIDES]
+    def legacy_step(frame_points):
+        angles = arm_angles(frame_points)
+        for analysis in legacy:
+            analysis.analyze_angles(angles)
+
+    curls = ExerciseEngine([BicepPoseAnalysis(side, **THRESHOLDS) for side in SIDES])
+    everything = ExerciseEngine([ExerciseState(define(side)) for define in EXERCISES.values() for side in SIDES])
+    return {
+        "legacy_two_curls_us": per_frame_us(legacy_step, frames),
+        "engine_two_curls_us": per_frame_us(curls.step, frames),
+        "engine_all_exercises_us": per_frame_us(everything.step, frames),
+        "engine_all_exercises_states": len(everything.states),
+        "engine_all_exercises_angles": len(everything.features.angles),
+    }
+
+
+def main():
+    points = load_landmarks()
+    report = {"parity": check_parity(points), "per_frame": timings(points)}
+    print(json.dumps(report, indent=2))
+    if not report["parity"]["match"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
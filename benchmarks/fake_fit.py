@@ -0,0 +1,203 @@
+"""A local stand-in for the Google Fit REST API and OAuth token endpoint.
+
+    python -m benchmarks.fake_fit --port 9000 --latency-ms 150
+
+serves until interrupted; point DevineFITwatch at it with
+FIT_API_ENDPOINT=http://127.0.0.1:9000/fitness/v1/users/. Benchmarks start
+it in-process with FakeFitServer.
+
+Data is synthetic and a pure function of time, so any range query gives the
+same points as any other covering the same span: a step count every 15
+minutes during the day, a heart rate reading every 5 minutes and 30-minute
+sleep segments from 23:00 to 07:00 UTC. Dataset reads honour `limit` and
+`pageToken`. Every request waits `latency` seconds first, plus
+`slow[path fragment]` for matching paths; `requests` counts requests and
+`connections` the TCP connections accepted.
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STEP_DATA_TYPE = "com.google.step_count.delta"
+HEART_RATE_DATA_TYPE = "com.google.heart_rate.bpm"
+SLEEP_DATA_TYPE = "com.google.sleep.segment"
+
+MINUTE_NANOS = 60 * 10 ** 9
+STEP_INTERVAL = 15 * MINUTE_NANOS
+HEART_RATE_INTERVAL = 5 * MINUTE_NANOS
+SLEEP_INTERVAL = 30 * MINUTE_NANOS
+DAY_NANOS = 24 * 60 * MINUTE_NANOS
+# Sleep stages cycle light, deep, light, REM, with a short wake
+SLEEP_CYCLE = (4, 4, 5, 4, 6, 6, 1)
+
+
+def _unit(kind, slot):
+    """Deterministic pseudo-random number in [0, 1) for one slot of one series."""
+    digest = hashlib.blake2b(f"{kind}:{slot}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little") / 2 ** 64
+
+
+def _slots(start_ns, end_ns, interval):
+    return range(-(-start_ns // interval), -(-end_ns // interval))
+
+
+def _hour(ns):
+    return ns % DAY_NANOS // (60 * MINUTE_NANOS)
+
+
+def step_points(start_ns, end_ns):
+    points = []
+    for slot in _slots(start_ns, end_ns, STEP_INTERVAL):
+        start = slot * STEP_INTERVAL
+        if 7 <= _hour(start) < 22:
+            points.append({"startTimeNanos": str(start), "endTimeNanos": str(start + STEP_INTERVAL),
+                           "dataTypeName": STEP_DATA_TYPE, "value": [{"intVal": int(_unit("steps", slot) * 600)}]})
+    return points
+
+
+def heart_rate_points(start_ns, end_ns):
+    points = []
+    for slot in _slots(start_ns, end_ns, HEART_RATE_INTERVAL):
+        start = slot * HEART_RATE_INTERVAL
+        resting = not 7 <= _hour(start) < 23
+        bpm = round((55 if resting else 70) + _unit("hr", slot) * (15 if resting else 50), 1)
+        points.append({"startTimeNanos": str(start), "endTimeNanos": str(start),
+                       "dataTypeName": HEART_RATE_DATA_TYPE, "value": [{"fpVal": bpm}]})
+    return points
+
+
+def sleep_points(start_ns, end_ns):
+    points = []
+    for slot in _slots(start_ns, end_ns, SLEEP_INTERVAL):
+        start = slot * SLEEP_INTERVAL
+        hour = _hour(start)
+        if hour >= 23 or hour < 7:
+            stage = SLEEP_CYCLE[slot % len(SLEEP_CYCLE)]
+            points.append({"startTimeNanos": str(start), "endTimeNanos": str(start + SLEEP_INTERVAL),
+                           "dataTypeName": SLEEP_DATA_TYPE, "value": [{"intVal": stage}]})
+    return points
+
+
+def points_for(source, start_ns, end_ns):
+    if "sleep" in source:
+        return sleep_points(start_ns, end_ns)
+    if "heart_rate" in source:
+        return heart_rate_points(start_ns, end_ns)
+    if "step_count" in source:
+        return step_points(start_ns, end_ns)
+    return []
+
+
+class FitHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, a kept-alive
+    # connection would wait on the client's delayed ACK between them
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def delay(self):
+        seconds = self.server.latency + sum(extra for fragment, extra in self.server.slow.items()
+                                           if fragment in self.path)
+        with self.server.lock:
+            self.server.requests += 1
+        time.sleep(seconds)
+
+    def reply(self, status, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length) if length else b""
+
+    def do_GET(self):
+        self.delay()
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path)
+        if "/datasets/" not in path:
+            return self.reply(404, {"error": {"code": 404, "message": f"Unknown path {path}"}})
+        prefix, dataset_id = path.rsplit("/datasets/", 1)
+        source = prefix.rsplit("/dataSources/", 1)[-1]
+        start_ns, end_ns = (int(part) for part in dataset_id.split("-"))
+        points = points_for(source, start_ns, end_ns)
+        response = {"dataSourceId": source, "minStartTimeNs": str(start_ns), "maxEndTimeNs": str(end_ns)}
+        # Pages are `limit` points long; the token is the offset of the next one
+        query = urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query)
+        if "limit" in query:
+            offset = int(query.get("pageToken", ["0"])[0])
+            limit = int(query["limit"][0])
+            if offset + limit < len(points):
+                response["nextPageToken"] = str(offset + limit)
+            points = points[offset:offset + limit]
+        response["point"] = points
+        self.reply(200, response)
+
+    def do_POST(self):
+        self.read_body()
+        self.delay()
+        path = urllib.parse.urlsplit(self.path).path
+        if path.endswith("/token"):
+            return self.reply(200, {"access_token": "fake-access-token", "expires_in": 3600,
+                                    "token_type": "Bearer", "refresh_token": "fake-refresh-token"})
+        self.reply(404, {"error": {"code": 404, "message": f"Unknown path {path}"}})
+
+
+class FakeFitServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, slow=None):
+        super().__init__(("127.0.0.1", port), FitHandler)
+        self.latency = latency
+        self.slow = dict(slow or {})
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    @property
+    def api_endpoint(self):
+        return f"{self.url}/fitness/v1/users/"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a fake Google Fit API")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=150)
+    args = parser.parse_args()
+    server = FakeFitServer(args.port, args.latency_ms / 1000)
+    print(f"Fake Fit API on {server.api_endpoint}, token endpoint {server.url}/token")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
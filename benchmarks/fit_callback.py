@@ -0,0 +1,161 @@
+"""End-to-end latency of DevineFITwatch's /oauth2callback against a fake Fit API.
+
+Run from the repository root:
+
+    python -m benchmarks.fit_callback
+    python -m benchmarks.fit_callback --latency-ms 300 --callbacks 50
+
+Starts benchmarks.fake_fit with the given latency per request, writes a
+client secrets file whose token endpoint is the fake server, and drives the
+real /oauth2callback route through Flask's test client: token exchange, Fit
+sync and template rendering. The route runs once with fit_client.fetch and
+once with the previous data path, which built the service from the
+discovery document on every call and ran queries one after the other on a
+fresh connection. Each path's first callback is a new user's initial sync
+and is reported on its own; the rest sync incrementally. Reported per path:
+callback latency, API connections opened per callback, and latency of a
+36-hour fetch of every synced source, the queries an initial sync makes per
+window. A final run makes heart rate reads slower than the timeout and
+checks that the fetch still answers within it, with steps and sleep points
+and no heart rate. Exits 1 when /data differs between the two paths or the
+timeout isn't kept.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import googleapiclient.discovery
+import numpy as np
+from google.oauth2.credentials import Credentials
+
+from benchmarks.fake_fit import FakeFitServer
+
+FIT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DevineFITwatch")
+sys.path.insert(0, FIT_DIR)
+
+import fit_client  # noqa: E402
+import fit_sync  # noqa: E402
+
+
+def legacy_fetch(credentials, queries, timeout=None):
+    """The data path before fit_client: build per call, queries in sequence."""
+    service = googleapiclient.discovery.build("fitness", "v1", credentials=credentials,
+                                              client_options={"api_endpoint": fit_client.FIT_API_ENDPOINT})
+    return {name: fit_client.execute(service, query) for name, query in queries.items()}
+
+
+def write_client_secrets(directory, token_uri):
+    secrets = {"web": {"client_id": "fake-client", "client_secret": "fake-secret",
+                       "auth_uri": token_uri.replace("/token", "/auth"), "token_uri": token_uri,
+                       "redirect_uris": ["http://localhost:8080/oauth2callback"]}}
+    with open(os.path.join(directory, "cred.json"), "w") as f:
+        json.dump(secrets, f)
+
+
+def callback(client):
+    with client.session_transaction() as session:
+        session["state"] = "fake-state"
+    started = time.perf_counter()
+    response = client.get("/oauth2callback?state=fake-state&code=fake-code")
+    elapsed = time.perf_counter() - started
+    if response.status_code != 200:
+        raise RuntimeError(f"/oauth2callback returned {response.status_code}: {response.data[:200]!r}")
+    return elapsed
+
+
+def summary(seconds):
+    ms = np.array(seconds) * 1000
+    return {"mean_ms": round(float(ms.mean()), 1), "p50_ms": round(float(np.percentile(ms, 50)), 1),
+            "p95_ms": round(float(np.percentile(ms, 95)), 1)}
+
+
+def time_fetches(fetch, credentials, queries, count):
+    seconds = []
+    for _ in range(count):
+        started = time.perf_counter()
+        fetch(credentials, queries())
+        seconds.append(time.perf_counter() - started)
+    return summary(seconds)
+
+
+def run_path(app, server, fetch, callbacks, data_range):
+    fit_client.fetch, original = fetch, fit_client.fetch
+    try:
+        client = app.test_client()
+        initial_sync = callback(client)
+        connections = server.connections
+        seconds = [callback(client) for _ in range(callbacks)]
+        result = summary(seconds)
+        result["initial_sync_ms"] = round(initial_sync * 1000, 1)
+        result["connections_per_callback"] = round((server.connections - connections) / callbacks, 2)
+        data = client.get("/data?start=%d&end=%d" % data_range).get_json()
+    finally:
+        fit_client.fetch = original
+    return result, data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time /oauth2callback against a fake Fit API")
+    parser.add_argument("--latency-ms", type=float, default=150, help="latency the fake API adds to each request")
+    parser.add_argument("--callbacks", type=int, default=20)
+    parser.add_argument("--timeout", type=float, default=0.5, help="fetch timeout for the slow heart rate run")
+    args = parser.parse_args()
+
+    server = FakeFitServer(latency=args.latency_ms / 1000).start()
+    fit_client.FIT_API_ENDPOINT = server.api_endpoint
+    directory = tempfile.mkdtemp(prefix="fit_callback_")
+    write_client_secrets(directory, f"{server.url}/token")
+    os.chdir(directory)
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        import app as fit_app
+        fit_app.app.config["TESTING"] = True
+
+        now_ms = int(time.time() * 1000)
+        data_range = (now_ms - 36 * 3600000, now_ms - 3600000)
+        legacy, legacy_data = run_path(fit_app.app, server, legacy_fetch, args.callbacks, data_range)
+        concurrent, concurrent_data = run_path(fit_app.app, server, fit_client.fetch, args.callbacks, data_range)
+
+        credentials = Credentials(token="fake-access-token")
+        fetch_range = ((now_ms - 36 * 3600000) * 10 ** 6, now_ms * 10 ** 6)
+        queries = lambda: {name: fit_client.dataset_query(source, *fetch_range)
+                           for name, source in fit_sync.SYNC_SOURCES.items()}
+        fetch_legacy = time_fetches(legacy_fetch, credentials, queries, args.callbacks)
+        fetch_concurrent = time_fetches(fit_client.fetch, credentials, queries, args.callbacks)
+
+        server.slow["merge_heart_rate_bpm"] = args.timeout * 4
+        started = time.perf_counter()
+        slow = fit_client.fetch(credentials, queries(), timeout=args.timeout)
+        slow_elapsed = time.perf_counter() - started
+        server.slow.clear()
+    server.stop()
+
+    timeout_kept = (slow_elapsed < args.timeout + 0.2 and slow["heart_rate"] is None
+                    and len(slow["steps"]) > 0 and len(slow["sleep"]) > 0)
+    report = {
+        "latency_ms": args.latency_ms,
+        "callbacks": args.callbacks,
+        "callback": {"legacy": legacy, "concurrent": concurrent,
+                     "speedup": round(legacy["mean_ms"] / concurrent["mean_ms"], 2)},
+        "fetch": {"legacy": fetch_legacy, "concurrent": fetch_concurrent,
+                  "speedup": round(fetch_legacy["mean_ms"] / fetch_concurrent["mean_ms"], 2)},
+        "same_data": legacy_data == concurrent_data,
+        "slow_heart_rate": {"timeout_s": args.timeout, "elapsed_ms": round(slow_elapsed * 1000, 1),
+                            "points": {name: None if points is None else len(points) for name, points in slow.items()},
+                            "timeout_kept": timeout_kept},
+        "steps": concurrent_data["steps"],
+        "avg_heart_rate": concurrent_data["avg_heart_rate"],
+    }
+    print(json.dumps(report, indent=2))
+    if not (report["same_data"] and timeout_kept):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Vectorised Fit rollups against a per-point Python loop, on a synthetic year.
+
+Run from the repository root:
+
+    python -m benchmarks.fit_rollup
+    python -m benchmarks.fit_rollup --days 730 --hr-seconds 10
+
+Fills a temporary PointStore with --days of synthetic points: steps every
+15 minutes during the day, a heart rate reading every --hr-seconds and
+30-minute sleep segments at night. It then computes hourly and daily step
+sums, daily heart rate min/max/mean/p50/p95 and sleep minutes per stage
+twice:
+
+- loop: every row read with PointStore.range and walked in Python, the way
+  the app used to walk Fit responses;
+- rollup: fit_rollup.rollup, reading the store chunk by chunk.
+
+It reports the time and peak traced memory of each, next to the time it
+takes just to read the rows in chunks, and checks that the two agree and
+that rollup gives the same answer with tiny chunks. Exits 1 on any
+mismatch.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+FIT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DevineFITwatch")
+sys.path.insert(0, FIT_DIR)
+
+import fit_rollup  # noqa: E402
+import fit_store  # noqa: E402
+
+HOUR_NANOS = fit_rollup.HOUR_NANOS
+DAY_NANOS = fit_rollup.DAY_NANOS
+MINUTE_NANOS = fit_rollup.MINUTE_NANOS
+# The app's sleep_stages map
+SLEEP_STAGES = {1: "Awake", 2: "Sleep", 3: "Out-of-bed", 4: "Light sleep", 5: "Deep sleep", 6: "REM"}
+SLEEP_CYCLE = np.array([4, 4, 5, 4, 6, 6, 1])
+
+
+def synthetic_day(day_start, hr_seconds, rng):
+    """{source: (start, end, value) arrays} for one day."""
+    steps = np.arange(7 * 4, 22 * 4) * 15 * MINUTE_NANOS + day_start
+    heart = np.arange(0, DAY_NANOS, hr_seconds * 10 ** 9) + day_start
+    hour = (heart - day_start) // HOUR_NANOS
+    resting = (hour < 7) | (hour >= 23)
+    bpm = np.round(np.where(resting, 55 + rng.random(len(heart)) * 15, 70 + rng.random(len(heart)) * 50), 1)
+    # Sleep from 23:00 to 07:00 the next morning, in 30-minute segments
+    sleep = day_start + 23 * HOUR_NANOS + np.arange(16) * 30 * MINUTE_NANOS
+    return {
+        "steps": (steps, steps + 15 * MINUTE_NANOS, rng.integers(0, 600, len(steps)).astype(float)),
+        "heart_rate": (heart, heart, bpm),
+        "sleep": (sleep, sleep + 30 * MINUTE_NANOS, SLEEP_CYCLE[np.arange(16) % len(SLEEP_CYCLE)].astype(float)),
+    }
+
+
+def fill_store(store, user_id, first_day, days, hr_seconds):
+    rng = np.random.default_rng(0)
+    points = 0
+    for day in range(days):
+        day_start = (first_day + day) * DAY_NANOS
+        for source, (start, end, value) in synthetic_day(day_start, hr_seconds, rng).items():
+            rows = list(zip(start.tolist(), end.tolist(), value.tolist()))
+            store.append(user_id, source, rows, day_start + DAY_NANOS)
+            points += len(rows)
+    return points
+
+
+def nearest_rank(values, q):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(q / 100 * len(ordered)), 1) - 1]
+
+
+def loop_rollup(store, user_id, start_ns, end_ns):
+    """The per-point way: every row in a list, buckets in dicts."""
+    hourly, daily = defaultdict(float), defaultdict(float)
+    for start, _, value in store.range(user_id, "steps", start_ns, end_ns):
+        hourly[start // HOUR_NANOS] += value
+        daily[start // DAY_NANOS] += value
+
+    readings = defaultdict(list)
+    for start, _, value in store.range(user_id, "heart_rate", start_ns, end_ns):
+        readings[start // DAY_NANOS].append(value)
+    heart_rate = {day: {"count": len(values), "min": min(values), "max": max(values),
+                        "mean": round(sum(values) / len(values), 2),
+                        "p50": nearest_rank(values, 50), "p95": nearest_rank(values, 95)}
+                  for day, values in readings.items()}
+
+    sleep = defaultdict(float)
+    for start, end, stage in store.range(user_id, "sleep", start_ns, end_ns):
+        sleep[SLEEP_STAGES.get(int(stage), "Unknown")] += (end - start) / MINUTE_NANOS
+    return {"hourly": hourly, "daily": daily, "heart_rate": heart_rate, "sleep": sleep}
+
+
+def agree(loop, rolled, start_ns):
+    first_hour, first_day = start_ns // HOUR_NANOS, start_ns // DAY_NANOS
+    hourly = {first_hour + i: v for i, v in enumerate(rolled["hourly_steps"]) if v}
+    daily = {first_day + i: v for i, v in enumerate(rolled["daily_steps"]) if v}
+    if hourly != {k: v for k, v in loop["hourly"].items() if v} or daily != {k: v for k, v in loop["daily"].items() if v}:
+        return False
+    columns = rolled["daily_heart_rate"]
+    for day, expected in loop["heart_rate"].items():
+        i = day - first_day
+        for key, value in expected.items():
+            if abs(columns[key][i] - value) > fit_rollup.HEART_RATE_RESOLUTION / 2 + 1e-9:
+                return False
+    if sum(columns["count"]) != sum(stats["count"] for stats in loop["heart_rate"].values()):
+        return False
+    return all(abs(rolled["sleep_minutes"].get(name, 0) - minutes) < 1e-6 for name, minutes in loop["sleep"].items())
+
+
+class SmallChunks:
+    """A store whose chunks are `size` rows long."""
+
+    def __init__(self, store, size):
+        self.store = store
+        self.size = size
+
+    def chunks(self, *args):
+        return self.store.chunks(*args, size=self.size)
+
+
+def measure(run):
+    started = time.perf_counter()
+    result = run()
+    seconds = time.perf_counter() - started
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, {"seconds": round(seconds, 3), "peak_mb": round(peak / 2 ** 20, 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time Fit rollups over a synthetic year")
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--hr-seconds", type=int, default=15, help="seconds between heart rate readings")
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix="fit_rollup_")
+    store = fit_store.PointStore(os.path.join(directory, "fit_data.sqlite3"))
+    first_day = time.time_ns() // DAY_NANOS - args.days
+    started = time.perf_counter()
+    points = fill_store(store, "user", first_day, args.days, args.hr_seconds)
+    fill_seconds = time.perf_counter() - started
+    start_ns, end_ns = first_day * DAY_NANOS, (first_day + args.days) * DAY_NANOS
+
+    loop, loop_stats = measure(lambda: loop_rollup(store, "user", start_ns, end_ns))
+    started = time.perf_counter()
+    for source in ("steps", "heart_rate", "sleep"):
+        for _ in store.chunks("user", source, start_ns, end_ns):
+            pass
+    read_seconds = time.perf_counter() - started
+    rolled, rollup_stats = measure(lambda: fit_rollup.rollup(store, "user", start_ns, end_ns, SLEEP_STAGES))
+    small = fit_rollup.rollup(SmallChunks(store, 997), "user", start_ns, end_ns, SLEEP_STAGES)
+    store.close()
+
+    report = {
+        "days": args.days,
+        "points": points,
+        "fill_seconds": round(fill_seconds, 1),
+        "loop": loop_stats,
+        "rollup": rollup_stats,
+        "store_read_seconds": round(read_seconds, 3),
+        "speedup": round(loop_stats["seconds"] / rollup_stats["seconds"], 2),
+        "agree": agree(loop, rolled, start_ns),
+        "same_with_small_chunks": small == rolled,
+        "steps": rolled["steps"],
+        "heart_rate": rolled["heart_rate"],
+        "sleep_minutes": rolled["sleep_minutes"],
+    }
+    print(json.dumps(report, indent=2))
+    if not (report["agree"] and report["same_with_small_chunks"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Session store load test for DevineFITwatch.
+
+Run from the repository root:
+
+    python -m benchmarks.fit_sessions
+    python -m benchmarks.fit_sessions --users 5000 --cap 1000 --threads 8
+
+Drives the real app through Flask's test client from --threads threads.
+Each simulated user does GET /authorize, which writes the OAuth state to
+the session. The callback's session write is then stood in for, followed
+by --reads GETs of /data, which only read the session. This runs once per
+session setup:
+
+- before: Flask-Session's filesystem store, refreshed on every request,
+  with the 36-hour Fit payload in each session as the callback used to
+  store it;
+- memory and sqlite: fit_session's stores, capped at --cap sessions, with
+  only the user id in the session.
+
+Reported per setup: latency of each request kind, throughput, bytes on disk
+and sessions kept. Exits 1 if a capped store keeps more than --cap
+sessions, or a user's /data answer differs from the first user's.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks import fake_fit
+from benchmarks.fit_callback import write_client_secrets
+
+FIT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DevineFITwatch")
+sys.path.insert(0, FIT_DIR)
+
+import fit_session  # noqa: E402
+import fit_sync  # noqa: E402
+
+HOUR_NANOS = fit_sync.HOUR_NANOS
+
+
+def disk_bytes(directory):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(directory) for name in files)
+
+
+def fill_points(store, user_id, now_ns):
+    start_ns = now_ns - 36 * HOUR_NANOS
+    for source, data_source in fit_sync.SYNC_SOURCES.items():
+        rows = fit_sync.point_rows(fake_fit.points_for(data_source, start_ns, now_ns))
+        store.append(user_id, source, rows, now_ns)
+
+
+def simulate_user(app, payload, reads, data_query, timings):
+    client = app.test_client()
+    started = time.perf_counter()
+    response = client.get("/authorize")
+    timings["authorize"].append(time.perf_counter() - started)
+    if response.status_code != 302:
+        raise RuntimeError(f"/authorize returned {response.status_code}")
+
+    # What the callback leaves in the session
+    started = time.perf_counter()
+    with client.session_transaction() as session:
+        session["user_id"] = "user"
+        if payload is not None:
+            session["fit_data"] = payload
+    timings["callback_write"].append(time.perf_counter() - started)
+
+    data = None
+    for _ in range(reads):
+        started = time.perf_counter()
+        response = client.get(data_query)
+        timings["data"].append(time.perf_counter() - started)
+        data = response.get_json()
+    return data
+
+
+def run_setup(app, kind, users, reads, threads, cap, payload, data_query, directory):
+    app.config["SESSION_REFRESH_EACH_REQUEST"] = kind == "before"
+    fit_session.init_app(app, "filesystem" if kind == "before" else kind, max_entries=cap)
+    timings = {"authorize": [], "callback_write": [], "data": []}
+    lock = threading.Lock()
+
+    def one_user(_):
+        local = {key: [] for key in timings}
+        data = simulate_user(app, payload, reads, data_query, local)
+        with lock:
+            for key, values in local.items():
+                timings[key] += values
+        return data
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        answers = list(executor.map(one_user, range(users)))
+    elapsed = time.perf_counter() - started
+
+    cache = app.config.get("SESSION_CACHELIB")
+    if kind == "sqlite":
+        with cache.lock:
+            cache.expire(time.time())
+            kept = cache.db.execute("SELECT COUNT(*) FROM fit_sessions").fetchone()[0]
+            cache.db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    elif kind == "memory":
+        kept = len(cache.entries)
+    else:
+        kept = len(os.listdir(fit_session.SESSION_FILE_DIR))
+
+    report = {key: {"mean_ms": round(float(np.mean(values)) * 1000, 3),
+                    "p95_ms": round(float(np.percentile(values, 95)) * 1000, 3)}
+              for key, values in timings.items()}
+    report["requests_per_s"] = round(users * (reads + 2) / elapsed, 1)
+    report["disk_bytes"] = disk_bytes(directory)
+    report["sessions_kept"] = kept
+    return report, answers
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test DevineFITwatch's session stores")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--reads", type=int, default=5, help="/data requests per user")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--cap", type=int, default=1000, help="FIT_SESSION_STORE_SIZE for the capped stores")
+    args = parser.parse_args()
+
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        os.chdir(tempfile.mkdtemp(prefix="fit_sessions_app_"))
+        import app as fit_app
+        fit_app.app.config["TESTING"] = True
+        now_ns = time.time_ns()
+        fill_points(fit_app.point_store, "user", now_ns)
+        payload = fit_sync.summary(fit_app.point_store, "user", now_ns - 36 * HOUR_NANOS, now_ns)
+        end_ms = now_ns // 10 ** 6
+        data_query = f"/data?start={end_ms - 36 * 3600000}&end={end_ms}"
+
+        reports = {}
+        for kind in ("before", "memory", "sqlite"):
+            # A fresh working directory per setup, so disk usage is its own
+            directory = tempfile.mkdtemp(prefix=f"fit_sessions_{kind}_")
+            write_client_secrets(directory, "http://127.0.0.1:9/token")
+            os.chdir(directory)
+            fit_session.SESSION_FILE_DIR = os.path.join(directory, "flask_sessions")
+            reports[kind], answers = run_setup(fit_app.app, kind, args.users, args.reads, args.threads, args.cap,
+                                               payload if kind == "before" else None, data_query, directory)
+            reports[kind]["same_answers"] = all(answer == answers[0] for answer in answers)
+
+    report = {"users": args.users, "reads": args.reads, "threads": args.threads, "cap": args.cap,
+              "session_payload_bytes": len(json.dumps(payload)), **reports}
+    print(json.dumps(report, indent=2))
+    ok = (all(reports[kind]["same_answers"] for kind in reports)
+          and all(reports[kind]["sessions_kept"] <= args.cap for kind in ("memory", "sqlite")))
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
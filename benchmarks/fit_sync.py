@@ -0,0 +1,176 @@
+"""Incremental Fit sync and the store-backed /data route against a fake Fit API.
+
+Run from the repository root:
+
+    python -m benchmarks.fit_sync
+    python -m benchmarks.fit_sync --days 90 --latency-ms 150
+
+Syncs a user from benchmarks.fake_fit into a temporary PointStore and checks:
+
+- initial sync: API requests and points stored for --days of history;
+- incremental sync an hour later: only the new windows are read, and the
+  store ends up holding exactly the points the fake API has for the span;
+- paging: the same span synced with a page size of 50 points stores the
+  same rows;
+- resume: with one window failing, each source advances only up to that
+  window, and the next sync fills the gap;
+- /data: latency from the TTL cache and from the store, with no Fit API
+  requests on the read path.
+
+Exits 1 when any check fails.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from google.oauth2.credentials import Credentials
+
+from benchmarks import fake_fit
+from benchmarks.fake_fit import FakeFitServer
+
+FIT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "DevineFITwatch")
+sys.path.insert(0, FIT_DIR)
+
+import fit_client  # noqa: E402
+import fit_store  # noqa: E402
+import fit_sync  # noqa: E402
+
+HOUR_NANOS = fit_sync.HOUR_NANOS
+
+
+def expected_rows(start_ns, end_ns):
+    """{source: rows} the fake API serves for the span, as the store keeps them."""
+    return {source: fit_sync.point_rows(fake_fit.points_for(data_source, start_ns, end_ns))
+            for source, data_source in fit_sync.SYNC_SOURCES.items()}
+
+
+def stored_rows(store, user_id, start_ns, end_ns):
+    return {source: [tuple(row) for row in store.range(user_id, source, start_ns, end_ns)]
+            for source in fit_sync.SYNC_SOURCES}
+
+
+def counted_sync(server, store, user_id, credentials, now_ns):
+    requests = server.requests
+    started = time.perf_counter()
+    read = fit_sync.sync(store, user_id, credentials, now_ns=now_ns)
+    return {"seconds": round(time.perf_counter() - started, 3), "requests": server.requests - requests,
+            "points_read": sum(read.values())}
+
+
+def check_paging(server, store, credentials, start_ns, now_ns, page_size):
+    page_size, fit_client.FIT_PAGE_SIZE = fit_client.FIT_PAGE_SIZE, page_size
+    try:
+        result = counted_sync(server, store, "paged", credentials, now_ns)
+    finally:
+        fit_client.FIT_PAGE_SIZE = page_size
+    result["same_rows"] = stored_rows(store, "paged", start_ns, now_ns) == stored_rows(store, "user", start_ns, now_ns)
+    return result
+
+
+def check_resume(server, store, credentials, start_ns, now_ns):
+    """Fail one mid-history window of every source, then sync again."""
+    windows = fit_sync.plan_windows({}, fit_sync.SYNC_SOURCES, now_ns)
+    failed_start, _ = windows["steps"][len(windows["steps"]) // 2]
+    timeout = 2 + server.latency * 4
+    server.slow[f"/datasets/{failed_start}-"] = timeout + 1
+    try:
+        fit_sync.sync(store, "resume", credentials, now_ns=now_ns, timeout=timeout)
+        time.sleep(1 + server.latency)  # let the stalled requests finish before the next sync
+    finally:
+        server.slow.clear()
+    stopped_at = store.synced_until("resume")
+    stopped = all(stopped_at.get(source) == failed_start for source in fit_sync.SYNC_SOURCES)
+    no_gap_fill = all(not store.range("resume", source, failed_start, now_ns) for source in fit_sync.SYNC_SOURCES)
+
+    resumed = counted_sync(server, store, "resume", credentials, now_ns)
+    complete = stored_rows(store, "resume", start_ns, now_ns) == stored_rows(store, "user", start_ns, now_ns)
+    return {"stopped_at_failed_window": stopped and no_gap_fill, "resume_requests": resumed["requests"],
+            "complete_after_resume": complete}
+
+
+def time_reads(client, server, queries, repeats):
+    requests = server.requests
+    seconds = {"store": [], "cache": []}
+    for query in queries:
+        for kind in ("store", "cache"):
+            for _ in range(repeats if kind == "cache" else 1):
+                started = time.perf_counter()
+                response = client.get(query)
+                seconds[kind].append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{query} returned {response.status_code}")
+    report = {kind: {"mean_ms": round(float(np.mean(values)) * 1000, 3),
+                     "p95_ms": round(float(np.percentile(values, 95)) * 1000, 3)}
+              for kind, values in seconds.items()}
+    report["fit_requests"] = server.requests - requests
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check incremental Fit sync and /data against a fake Fit API")
+    parser.add_argument("--days", type=float, default=30, help="history the initial sync reads")
+    parser.add_argument("--latency-ms", type=float, default=50, help="latency the fake API adds to each request")
+    parser.add_argument("--reads", type=int, default=20, help="distinct /data ranges to time")
+    args = parser.parse_args()
+
+    fit_sync.FIT_SYNC_INITIAL_DAYS = args.days
+    server = FakeFitServer(latency=args.latency_ms / 1000).start()
+    fit_client.FIT_API_ENDPOINT = server.api_endpoint
+    directory = tempfile.mkdtemp(prefix="fit_sync_")
+    store = fit_store.PointStore(os.path.join(directory, "fit_data.sqlite3"))
+    credentials = Credentials(token="fake-access-token")
+
+    now_ns = time.time_ns() // (60 * 10 ** 9) * 60 * 10 ** 9
+    start_ns = now_ns - int(args.days * 24 * HOUR_NANOS)
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        initial = counted_sync(server, store, "user", credentials, now_ns)
+        initial_complete = stored_rows(store, "user", start_ns, now_ns) == expected_rows(start_ns, now_ns)
+        later_ns = now_ns + HOUR_NANOS
+        incremental = counted_sync(server, store, "user", credentials, later_ns)
+        incremental_complete = stored_rows(store, "user", start_ns, later_ns) == expected_rows(start_ns, later_ns)
+
+        paging = check_paging(server, store, credentials, start_ns, now_ns, page_size=50)
+        resume = check_resume(server, store, credentials, start_ns, now_ns)
+
+        # The app opens its own store in the working directory
+        os.chdir(directory)
+        import app as fit_app
+        fit_app.app.config["TESTING"] = True
+        fit_app.point_store = store
+        client = fit_app.app.test_client()
+        with client.session_transaction() as session:
+            session["user_id"] = "user"
+        end_ms = now_ns // 10 ** 6
+        day_ms = 24 * 3600 * 1000
+        queries = [f"/data?start={end_ms - (i + 2) * day_ms}&end={end_ms - i * day_ms}" for i in range(args.reads)]
+        reads = time_reads(client, server, queries, repeats=5)
+        reads["cache_hits"] = fit_app.data_cache.hits
+    store.close()
+    server.stop()
+
+    report = {
+        "days": args.days,
+        "latency_ms": args.latency_ms,
+        "initial_sync": dict(initial, complete=initial_complete),
+        "incremental_sync": dict(incremental, complete=incremental_complete),
+        "paging": paging,
+        "resume": resume,
+        "data_reads": reads,
+    }
+    print(json.dumps(report, indent=2))
+    ok = (initial_complete and incremental_complete and paging["same_rows"]
+          and resume["stopped_at_failed_window"] and resume["complete_after_resume"]
+          and incremental["requests"] < initial["requests"] and reads["fit_requests"] == 0)
+    if not ok:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
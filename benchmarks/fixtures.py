@@ -0,0 +1,330 @@
+"""Checked-in benchmark fixtures and the generator that produced them.
+
+    python -m benchmarks.fixtures    # regenerate benchmarks/fixtures/
+
+`curl_landmarks.npz` is a synthetic (N, 33, 4) landmark stream of a person
+doing bicep curls with both arms: clean reps, reps with a swinging upper arm,
+shallow reps that miss peak contraction, a rest between sets and a stretch
+where the person steps out of frame (NaN rows). `frames/` is a short JPEG
+sequence rendered from the start of the same stream at the 320x240 size the
+web client sends. The rendered person is one MediaPipe Pose finds, with arm
+landmarks close to the stream's, so image benchmarks time the real
+detection and analysis path; the generator checks every frame. Rendered
+through MediaPipe, the whole stream scores the same as the landmarks.
+`expected.json` holds the rep counts and errors of the original
+BicepPoseAnalysis on the stream. That code is kept here as
+`baseline_score_stream`, so refactors of the analysis path are checked
+against the behaviour they replaced rather than against themselves.
+"""
+import json
+import os
+
+import cv2
+import numpy as np
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+LANDMARKS_PATH = os.path.join(FIXTURES_DIR, "curl_landmarks.npz")
+FRAMES_DIR = os.path.join(FIXTURES_DIR, "frames")
+EXPECTED_PATH = os.path.join(FIXTURES_DIR, "expected.json")
+
+FPS = 30
+FRAME_SIZE = (320, 240)
+NUM_JPEG_FRAMES = 24
+# Image benchmarks fail when MediaPipe finds the person in fewer of the
+# fixture frames than this, as they would then mostly time "No human found"
+MIN_PERSON_FOUND = 0.9
+
+# Rough standing pose in normalised image coordinates; the subject's left
+# side appears on the right of the image
+_TEMPLATE = {
+    0: (0.50, 0.18),                                   # nose
+    1: (0.51, 0.16), 2: (0.52, 0.16), 3: (0.53, 0.16),  # left eye
+    4: (0.49, 0.16), 5: (0.48, 0.16), 6: (0.47, 0.16),  # right eye
+    7: (0.55, 0.17), 8: (0.45, 0.17),                   # ears
+    9: (0.51, 0.21), 10: (0.49, 0.21),                  # mouth
+    11: (0.58, 0.30), 12: (0.42, 0.30),                 # shoulders
+    13: (0.59, 0.45), 14: (0.41, 0.45),                 # elbows
+    15: (0.59, 0.58), 16: (0.41, 0.58),                 # wrists
+    17: (0.59, 0.61), 18: (0.41, 0.61),                 # pinkies
+    19: (0.59, 0.61), 20: (0.41, 0.61),                 # index fingers
+    21: (0.58, 0.60), 22: (0.42, 0.60),                 # thumbs
+    23: (0.55, 0.60), 24: (0.45, 0.60),                 # hips
+    25: (0.55, 0.78), 26: (0.45, 0.78),                 # knees
+    27: (0.55, 0.95), 28: (0.45, 0.95),                 # ankles
+    29: (0.55, 0.97), 30: (0.45, 0.97),                 # heels
+    31: (0.56, 0.98), 32: (0.44, 0.98),                 # foot index
+}
+
+# Colours of the rendered scene and person, BGR
+_BACKGROUND = (70, 80, 70)
+_FLOOR = (150, 160, 170)
+_SKIN = (140, 170, 215)
+_HAIR = (30, 40, 60)
+_SHIRT = (160, 80, 40)
+_TROUSERS = (60, 50, 40)
+_SHOES = (30, 30, 30)
+
+# (reps, lowest curl angle, upper-arm swing in degrees) for each set
+_SETS = [(6, 35, 0), (4, 40, 50), (4, 70, 0)]
+
+
+def _curl_profile(reps, peak_angle, frames_per_rep=48):
+    t = np.arange(reps * frames_per_rep) / frames_per_rep
+    # Elbow angle goes 165 -> peak_angle -> 165 once per rep
+    return peak_angle + (165 - peak_angle) * (0.5 + 0.5 * np.cos(2 * np.pi * t))
+
+
+def synthetic_curl_stream(seed=0, jitter=True):
+    """The landmark stream; without `jitter`, where the person actually is rather than where Pose puts them."""
+    rng = np.random.default_rng(seed)
+    curl, swing, present = [], [], []
+
+    def rest(frames, visible=True):
+        curl.append(np.full(frames, 165.0))
+        swing.append(np.zeros(frames))
+        present.append(np.full(frames, visible))
+
+    rest(30)
+    for reps, peak_angle, max_swing in _SETS:
+        profile = _curl_profile(reps, peak_angle)
+        curl.append(profile)
+        swing.append(max_swing * (165 - profile) / (165 - peak_angle))
+        present.append(np.ones(len(profile), bool))
+        rest(90)
+    rest(60, visible=False)
+    rest(30)
+
+    curl = np.deg2rad(np.concatenate(curl))
+    swing = np.deg2rad(np.concatenate(swing))
+    present = np.concatenate(present)
+
+    frames = len(curl)
+    points = np.zeros((frames, 33, 4), np.float32)
+    for index, (x, y) in _TEMPLATE.items():
+        points[:, index, 0] = x
+        points[:, index, 1] = y
+    points[..., 2] = -0.1
+    points[..., 3] = 0.95
+
+    upper_arm, forearm = 0.15, 0.13
+    for shoulder, elbow, wrist, direction, lag in [(11, 13, 15, 1, 0), (12, 14, 16, -1, 3)]:
+        arm_curl = np.roll(curl, lag)
+        arm_swing = np.roll(swing, lag)
+        # Upper arm hangs from the shoulder, rotated forward by the swing
+        points[:, elbow, 0] = points[:, shoulder, 0] + direction * upper_arm * np.sin(arm_swing)
+        points[:, elbow, 1] = points[:, shoulder, 1] + upper_arm * np.cos(arm_swing)
+        # Forearm makes the curl angle with the upper arm at the elbow
+        forearm_direction = arm_swing + (np.pi - arm_curl)
+        points[:, wrist, 0] = points[:, elbow, 0] + direction * forearm * np.sin(forearm_direction)
+        points[:, wrist, 1] = points[:, elbow, 1] + forearm * np.cos(forearm_direction)
+        for hand in (wrist + 2, wrist + 4, wrist + 6):
+            points[:, hand, :2] = points[:, wrist, :2] + 0.01
+
+    # Jitter only the landmarks the analysis and posture model read, which
+    # keeps the checked-in file small
+    tracked = [0, 11, 12, 13, 14, 15, 16, 23, 24]
+    if jitter:
+        points[:, tracked, :2] += rng.normal(0, 0.002, (frames, len(tracked), 2)).astype(np.float32)
+    points[~present] = np.nan
+    return points
+
+
+def _limb(image, a, b, radius, colour):
+    cv2.line(image, a, b, colour, 2 * radius, cv2.LINE_AA)
+    cv2.circle(image, a, radius, colour, -1, cv2.LINE_AA)
+    cv2.circle(image, b, radius, colour, -1, cv2.LINE_AA)
+
+
+def _head(image, nose, unit):
+    x, y = nose[0], nose[1] - 4 * unit
+    cv2.ellipse(image, (x, y - 6 * unit), (15 * unit, 17 * unit), 0, 180, 360, _HAIR, -1, cv2.LINE_AA)
+    cv2.ellipse(image, (x, y), (13 * unit, 17 * unit), 0, 0, 360, _SKIN, -1, cv2.LINE_AA)
+    cv2.ellipse(image, (x, y - 11 * unit), (13 * unit, 7 * unit), 0, 180, 360, _HAIR, -1, cv2.LINE_AA)
+    for side in (-1, 1):
+        eye = (x + side * 5 * unit, y - 3 * unit)
+        cv2.ellipse(image, eye, (3 * unit, 2 * unit), 0, 0, 360, (250, 250, 250), -1, cv2.LINE_AA)
+        cv2.circle(image, eye, max(1, unit * 3 // 2), (40, 30, 20), -1, cv2.LINE_AA)
+        cv2.line(image, (eye[0] - 3 * unit, y - 7 * unit), (eye[0] + 3 * unit, y - 7 * unit), _HAIR, unit)
+        cv2.ellipse(image, (x + side * 13 * unit, y), (2 * unit, 4 * unit), 0, 0, 360, _SKIN, -1)
+    cv2.line(image, (x, y - 2 * unit), (x, y + 4 * unit), (110, 140, 190), unit)
+    cv2.ellipse(image, (x, y + 9 * unit), (4 * unit, 2 * unit), 0, 0, 180, (80, 80, 160), -1, cv2.LINE_AA)
+
+
+def render_frame(points, size=FRAME_SIZE, seed=0):
+    """A BGR camera frame of the person in `points`: a T-shirt, trousers and a face.
+
+    Rows of NaN give the empty room. Sensor noise is drawn from `seed`.
+    """
+    width, height = size
+    rng = np.random.default_rng(seed)
+    image = np.full((height, width, 3), _BACKGROUND, np.uint8)
+    image[int(height * 0.9):] = _FLOOR
+    if not np.isnan(points[0, 0]):
+        _draw_person(image, points, max(1, round(height / 240)))
+    noise = rng.normal(0, 3, image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def _draw_person(image, points, unit):
+    height, width = image.shape[:2]
+    pixels = [(int(x * width), int(y * height)) for x, y in points[:, :2]]
+
+    for hip, knee, ankle in [(23, 25, 27), (24, 26, 28)]:
+        _limb(image, pixels[hip], pixels[knee], 9 * unit, _TROUSERS)
+        _limb(image, pixels[knee], pixels[ankle], 8 * unit, _TROUSERS)
+        cv2.ellipse(image, pixels[ankle], (8 * unit, 4 * unit), 0, 0, 360, _SHOES, -1)
+
+    # The torso is narrower than the shoulder line, so the arms stand clear of it
+    torso = np.array([pixels[11], pixels[12], pixels[24], pixels[23]], float)
+    centre = torso.mean(axis=0)
+    torso = ((torso - centre) * (0.7, 1.08) + centre).astype(np.int32)
+    cv2.fillConvexPoly(image, torso, _SHIRT, cv2.LINE_AA)
+
+    nose = pixels[0]
+    neck = ((pixels[11][0] + pixels[12][0]) // 2, (pixels[11][1] + pixels[12][1]) // 2 - 4 * unit)
+    _limb(image, neck, (nose[0], nose[1] + 6 * unit), 5 * unit, _SKIN)
+
+    for shoulder, elbow, wrist in [(11, 13, 15), (12, 14, 16)]:
+        s, e, w = np.array(pixels[shoulder]), np.array(pixels[elbow]), np.array(pixels[wrist])
+        _limb(image, pixels[shoulder], pixels[elbow], 6 * unit, _SKIN)
+        _limb(image, pixels[elbow], pixels[wrist], 5 * unit, _SKIN)
+        # Short sleeves over the top of the upper arm, a hand beyond the wrist
+        _limb(image, pixels[shoulder], tuple((s + 0.3 * (e - s)).astype(int)), 7 * unit, _SHIRT)
+        direction = (w - e) / max(np.hypot(*(w - e)), 1)
+        hand = tuple((w + direction * 9 * unit).astype(int))
+        angle = float(np.degrees(np.arctan2(direction[1], direction[0])))
+        cv2.ellipse(image, hand, (9 * unit, 5 * unit), angle, 0, 360, _SKIN, -1, cv2.LINE_AA)
+
+    _head(image, nose, unit)
+
+
+def load_landmarks():
+    return np.load(LANDMARKS_PATH)["points"]
+
+
+def load_camera_landmarks():
+    """The pose camera frames of the stream should be rendered from.
+
+    The checked-in stream carries the frame-to-frame jitter of inferred
+    landmarks; drawn into frames it would look like a person who never
+    holds still.
+    """
+    return synthetic_curl_stream(jitter=False)
+
+
+def load_jpeg_frames():
+    names = sorted(name for name in os.listdir(FRAMES_DIR) if name.endswith(".jpg"))
+    frames = []
+    for name in names:
+        with open(os.path.join(FRAMES_DIR, name), "rb") as f:
+            frames.append(f.read())
+    return frames
+
+
+def load_expected():
+    with open(EXPECTED_PATH) as f:
+        return json.load(f)
+
+
+def score_stream(points):
+    """Rep counts and errors from BicepPoseAnalysis over a landmark stream."""
+    from bicep.angles import arm_angles
+    from bicep.app import BicepPoseAnalysis
+
+    analyses = {side: BicepPoseAnalysis(side, 120, 90, 60, 40, 0.65) for side in ("left", "right")}
+    for frame_points in points:
+        if np.isnan(frame_points[0, 0]):
+            continue
+        angles = arm_angles(frame_points)
+        for analysis in analyses.values():
+            analysis.analyze_angles(angles, None)
+    return {side: {"counter": analysis.counter, "errors": dict(analysis.detected_errors)}
+            for side, analysis in analyses.items()}
+
+
+class _BaselineArm:
+    """BicepPoseAnalysis.analyze_pose as the repository first shipped it, for expected.json."""
+
+    def __init__(self, side, stage_down_threshold=120, stage_up_threshold=90, peak_contraction_threshold=60,
+                 loose_upper_arm_angle_threshold=40, visibility_threshold=0.65):
+        self.joints = {"left": (11, 13, 15), "right": (12, 14, 16)}[side]
+        self.stage_down_threshold = stage_down_threshold
+        self.stage_up_threshold = stage_up_threshold
+        self.peak_contraction_threshold = peak_contraction_threshold
+        self.loose_upper_arm_angle_threshold = loose_upper_arm_angle_threshold
+        self.visibility_threshold = visibility_threshold
+        self.counter = 0
+        self.stage = "down"
+        self.detected_errors = {"LOOSE_UPPER_ARM": 0, "PEAK_CONTRACTION": 0}
+        self.loose_upper_arm = False
+        self.peak_contraction_angle = 1000
+
+    @staticmethod
+    def calculate_angle(point1, point2, point3):
+        radians = (np.arctan2(point3[1] - point2[1], point3[0] - point2[0])
+                   - np.arctan2(point1[1] - point2[1], point1[0] - point2[0]))
+        degrees = np.abs(radians * 180.0 / np.pi)
+        return degrees if degrees <= 180 else 360 - degrees
+
+    def analyze(self, points):
+        if not all(points[i, 3] > self.visibility_threshold for i in self.joints):
+            return
+        shoulder, elbow, wrist = ([float(points[i, 0]), float(points[i, 1])] for i in self.joints)
+
+        curl_angle = int(self.calculate_angle(shoulder, elbow, wrist))
+        if curl_angle > self.stage_down_threshold:
+            self.stage = "down"
+        elif curl_angle < self.stage_up_threshold and self.stage == "down":
+            self.stage = "up"
+            self.counter += 1
+
+        upper_arm_angle = int(self.calculate_angle(elbow, shoulder, [shoulder[0], 1]))
+        if upper_arm_angle > self.loose_upper_arm_angle_threshold:
+            if not self.loose_upper_arm:
+                self.loose_upper_arm = True
+                self.detected_errors["LOOSE_UPPER_ARM"] += 1
+        else:
+            self.loose_upper_arm = False
+
+        if self.stage == "up" and curl_angle < self.peak_contraction_angle:
+            self.peak_contraction_angle = curl_angle
+        elif self.stage == "down":
+            if self.peak_contraction_angle != 1000 and self.peak_contraction_angle >= self.peak_contraction_threshold:
+                self.detected_errors["PEAK_CONTRACTION"] += 1
+            self.peak_contraction_angle = 1000
+
+
+def baseline_score_stream(points):
+    """Rep counts and errors the original analysis gives a landmark stream."""
+    arms = {side: _BaselineArm(side) for side in ("left", "right")}
+    for frame_points in points:
+        if np.isnan(frame_points[0, 0]):
+            continue
+        for arm in arms.values():
+            arm.analyze(frame_points)
+    return {side: {"counter": arm.counter, "errors": dict(arm.detected_errors)} for side, arm in arms.items()}
+
+
+def main():
+    os.makedirs(FRAMES_DIR, exist_ok=True)
+    points = synthetic_curl_stream()
+    np.savez_compressed(LANDMARKS_PATH, points=points)
+
+    from bicep.app import mp_pose
+
+    camera = synthetic_curl_stream(jitter=False)
+    with mp_pose.Pose(static_image_mode=True, min_detection_confidence=0.5) as pose:
+        for i in range(NUM_JPEG_FRAMES):
+            # Every other frame of the first clean reps
+            image = render_frame(camera[30 + 2 * i], seed=i)
+            if not pose.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)).pose_landmarks:
+                raise SystemExit(f"MediaPipe finds no person in frame {i}")
+            cv2.imwrite(os.path.join(FRAMES_DIR, f"{i:03d}.jpg"), image, [cv2.IMWRITE_JPEG_QUALITY, 85])
+
+    with open(EXPECTED_PATH, "w") as f:
+        json.dump({"frames": len(points), "fps": FPS, "scores": baseline_score_stream(points)}, f, indent=2)
+        f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Bytes on the wire and decode CPU per frame for the /ws frame protocols.
+
+Run from the repository root:
+
+    python -m benchmarks.frame_protocol --width 640 --height 480 --frames 200
+"""
+import argparse
+import base64
+import json
+import time
+
+import cv2
+import numpy as np
+
+from bicep.frames import (
+    FORMAT_I420, FORMAT_JPEG, FORMAT_RGB,
+    decode_binary_frame, decode_json_frame, encode_binary_frame,
+)
+
+
+def synthetic_frame(width, height, seed=0):
+    # Smooth gradients plus sensor-like noise compress roughly like a webcam frame
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    noise = rng.normal(0, 6, base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def measure(decode, message, frames):
+    start = time.process_time()
+    for _ in range(frames):
+        decode(message)
+    return (time.process_time() - start) / frames * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--quality", type=int, default=92)
+    args = parser.parse_args()
+
+    bgr = synthetic_frame(args.width, args.height)
+    ok, jpeg = cv2.imencode(".jpg", bgr, [cv2.IMWRITE_JPEG_QUALITY, args.quality])
+    jpeg = jpeg.tobytes()
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+    i420 = cv2.cvtColor(bgr, cv2.COLOR_BGR2YUV_I420)
+
+    messages = {
+        "json_base64_jpeg": json.dumps({"image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()}),
+        "binary_jpeg": encode_binary_frame(jpeg, FORMAT_JPEG, args.width, args.height),
+        "binary_rgb": encode_binary_frame(rgb.tobytes(), FORMAT_RGB, args.width, args.height),
+        "binary_i420": encode_binary_frame(i420.tobytes(), FORMAT_I420, args.width, args.height),
+    }
+
+    report = {"width": args.width, "height": args.height, "frames": args.frames, "modes": {}}
+    for name, message in messages.items():
+        decode = decode_json_frame if name.startswith("json") else decode_binary_frame
+        report["modes"][name] = {
+            "bytes_per_frame": len(message.encode() if isinstance(message, str) else message),
+            "decode_cpu_ms_per_frame": round(measure(decode, message, args.frames), 4),
+        }
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
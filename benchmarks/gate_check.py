@@ -0,0 +1,187 @@
+"""Check that the frame-change gate leaves rep counts unchanged, and count the inference it saves.
+
+Run from the repository root:
+
+    python -m benchmarks.gate_check
+    python -m benchmarks.gate_check --video recordings/curls.mp4
+
+The fixture check renders every frame of the checked-in landmark stream,
+without its landmark jitter but with fresh sensor noise and a JPEG round
+trip per frame, and passes it through a FrameGate. Frames the gate lets through use the stream's
+landmarks, as MediaPipe would return them; the rest reuse the last inferred
+frame's landmarks, as CurlSession does. Counts must match
+benchmarks/fixtures/expected.json. It then reports the share of frames
+inferred over the whole stream, during the rest between sets, with the
+person out of frame and for ten seconds of an empty room, plus the gate's
+cost per frame at the pose input size. With --video, the video is also run
+through MediaPipe with and without the gate. Exits 1 when counts differ.
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import FPS, load_camera_landmarks, load_expected, load_landmarks, render_frame
+from benchmarks.pipeline import new_analyzers
+from bicep.angles import NUM_LANDMARKS, landmarks_to_array
+from bicep.app import mp_pose
+from bicep.exercises import ExerciseEngine
+from bicep.gate import FrameGate
+from bicep.preprocess import POSE_INPUT_SIZE
+
+EMPTY_ROOM_SECONDS = 10
+JPEG_QUALITY = 80
+# Largest landmark movement, in normalised image units, within a second of rest
+REST_SPREAD = 0.03
+
+
+def camera_frame(points, seed):
+    image = render_frame(points, seed=seed)
+    ok, jpeg = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, JPEG_QUALITY])
+    return cv2.cvtColor(cv2.imdecode(jpeg, cv2.IMREAD_COLOR), cv2.COLOR_BGR2RGB)
+
+
+def scores(analyzers):
+    return {analysis.side: {"counter": analysis.counter, "errors": dict(analysis.detected_errors)}
+            for analysis in analyzers}
+
+
+def still_runs(points):
+    """Frame indices of the longest visible stretch where the person holds still, and of the absence."""
+    present = ~np.isnan(points[:, 0, 0])
+    # Landmark jitter moves every frame; a second with little overall spread is a rest
+    half = FPS // 2
+    still = np.zeros(len(points), bool)
+    for i in range(half, len(points) - half):
+        window = points[i - half:i + half + 1, :, :2]
+        still[i] = present[i - half:i + half + 1].all() and np.ptp(window, axis=0).max() < REST_SPREAD
+
+    best, start = (0, 0), None
+    for i, frame_still in enumerate(np.append(still, False)):
+        if frame_still and start is None:
+            start = i
+        elif not frame_still and start is not None:
+            best = max(best, (start, i), key=lambda run: run[1] - run[0])
+            start = None
+    return range(*best), np.flatnonzero(~present)
+
+
+def check_fixture():
+    points = load_landmarks()
+    camera = load_camera_landmarks()
+    analyzers = new_analyzers()
+    engine = ExerciseEngine(analyzers)
+    gate = FrameGate()
+    inferred = np.zeros(len(points), bool)
+    last = None
+
+    for i, frame_points in enumerate(points):
+        image = camera_frame(camera[i], seed=i)
+        if gate.check(image, i / FPS):
+            inferred[i] = True
+            last = None if np.isnan(frame_points[0, 0]) else frame_points
+        if last is not None:
+            engine.step(last)
+
+    rest, absent = still_runs(points)
+    expected = load_expected()["scores"]
+    return {
+        "frames": len(points),
+        "inferred_share": round(float(inferred.mean()), 3),
+        "rest_frames": len(rest),
+        "rest_inferred_share": round(float(inferred[list(rest)].mean()), 3) if len(rest) else None,
+        "absent_frames": len(absent),
+        "absent_inferred_share": round(float(inferred[absent].mean()), 3) if len(absent) else None,
+        "scores": scores(analyzers),
+        "expected": expected,
+        "match": scores(analyzers) == expected,
+    }
+
+
+def empty_room():
+    gate = FrameGate()
+    empty = np.full((NUM_LANDMARKS, 4), np.nan)
+    frames = EMPTY_ROOM_SECONDS * FPS
+    inferred = sum(gate.check(camera_frame(empty, seed=i), i / FPS) for i in range(frames))
+    return {"seconds": EMPTY_ROOM_SECONDS, "frames": frames, "inferred": int(inferred)}
+
+
+def gate_cost(input_size):
+    points = load_camera_landmarks()
+    width, height = 640, 480
+    scale = min(1.0, input_size / width) if input_size else 1.0
+    frames = [cv2.resize(camera_frame(p, seed=i), (round(width * scale), round(height * scale)))
+              for i, p in enumerate(points[:120])]
+    gate = FrameGate()
+    started = time.perf_counter()
+    for i, frame in enumerate(frames * 10):
+        gate.check(frame, i / FPS)
+    return {"frame_size": list(frames[0].shape[1::-1]),
+            "us_per_frame": round((time.perf_counter() - started) / (len(frames) * 10) * 1e6, 2)}
+
+
+def score_video(path, use_gate):
+    analyzers = new_analyzers()
+    engine = ExerciseEngine(analyzers)
+    gate = FrameGate() if use_gate else None
+    points = np.empty((NUM_LANDMARKS, 4), np.float32)
+    found = False
+    pose_seconds = 0.0
+    frames = inferred = 0
+
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or FPS
+    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            if gate is None or gate.check(image, frames / fps):
+                inferred += 1
+                started = time.perf_counter()
+                results = pose.process(image)
+                pose_seconds += time.perf_counter() - started
+                found = bool(results.pose_landmarks)
+                if found:
+                    landmarks_to_array(results.pose_landmarks.landmark, out=points)
+            frames += 1
+            if found:
+                engine.step(points)
+    cap.release()
+
+    return {
+        "scores": scores(analyzers),
+        "inferred_share": round(inferred / max(frames, 1), 3),
+        "pose_ms_per_frame": round(pose_seconds / max(frames, 1) * 1000, 2),
+    }
+
+
+def check_video(path):
+    full = score_video(path, False)
+    gated = score_video(path, True)
+    return {"video": path, "every_frame": full, "gated": gated, "match": full["scores"] == gated["scores"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rep counts and inference calls with and without the frame gate")
+    parser.add_argument("--video", help="recorded curl video to run through MediaPipe both ways")
+    parser.add_argument("--input-size", type=int, default=POSE_INPUT_SIZE)
+    args = parser.parse_args()
+
+    report = {"fixture": check_fixture()}
+    report["empty_room"] = empty_room()
+    report["cost"] = gate_cost(args.input_size)
+    if args.video:
+        report["video"] = check_video(args.video)
+    print(json.dumps(report, indent=2))
+
+    if not all(section["match"] for section in report.values() if "match" in section):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Load test /ws with image frames against client-side landmark frames.
+
+Run from the repository root:
+
+    python -m benchmarks.landmark_load --sessions 1,50,500 --image-sessions 1,4 --duration 10
+
+Starts server.py under uvicorn, then for each mode and session count opens
+that many WebSocket clients. Each client sends a frame, waits for the reply
+and keeps to --fps. Image clients send the fixture JPEGs as binary frames;
+landmark clients send the fixture landmark stream as FORMAT_LANDMARKS frames.
+Reports achieved frame rate, reply latency percentiles and the server's CPU
+use, so frames per server CPU-second compares the two modes directly, plus
+the share of replies that found a person. Exits 1 when that share is below
+MIN_PERSON_FOUND for image frames, which all show one. The clients share
+the machine with the server; pin them elsewhere with taskset for cleaner
+numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import numpy as np
+import websockets
+
+from benchmarks.fixtures import MIN_PERSON_FOUND, load_jpeg_frames, load_landmarks
+from bicep.frames import FORMAT_JPEG, PROTOCOL_BINARY, PROTOCOL_LANDMARKS, encode_binary_frame, encode_landmark_frame
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def cpu_seconds(pid):
+    """User plus system CPU time of a process, from /proc on Linux."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def start_server(port):
+    # Load the posture model before the port opens so TensorFlow start-up doesn't land in a measurement
+    env = dict(os.environ, POSTURE_WARMUP=os.environ.get("POSTURE_WARMUP", "startup"))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server
+        except OSError:
+            time.sleep(0.5)
+    server.kill()
+    raise RuntimeError("server did not start")
+
+
+NO_HUMAN = "No human found"
+
+
+def fixture_frames(protocol):
+    if protocol == PROTOCOL_LANDMARKS:
+        points = load_landmarks()
+        return [encode_landmark_frame(None if np.isnan(p[0, 0]) else p, seq=i) for i, p in enumerate(points)]
+    return [encode_binary_frame(jpeg, FORMAT_JPEG, seq=i) for i, jpeg in enumerate(load_jpeg_frames())]
+
+
+async def client(uri, frames, fps, clock, latencies, no_human):
+    interval = 1 / fps
+    async with websockets.connect(uri, max_size=None, compression=None) as ws:
+        await clock["start"].wait()
+        i = 0
+        next_send = time.perf_counter()
+        while time.perf_counter() < clock["stop_at"]:
+            started = time.perf_counter()
+            await ws.send(frames[i % len(frames)])
+            reply = await ws.recv()
+            latencies.append(time.perf_counter() - started)
+            if json.loads(reply).get("error") == NO_HUMAN:
+                no_human.append(i)
+            i += 1
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_send = time.perf_counter()
+
+
+async def run_level(port, pid, protocol, sessions, fps, duration):
+    uri = f"ws://127.0.0.1:{port}/ws?protocol={protocol}"
+    frames = fixture_frames(protocol)
+    latencies = []
+    no_human = []
+    clock = {"start": asyncio.Event(), "stop_at": float("inf")}
+
+    tasks = [asyncio.create_task(client(uri, frames, fps, clock, latencies, no_human)) for _ in range(sessions)]
+    # Let every client connect before the clock starts
+    await asyncio.sleep(1 + sessions * 0.005)
+
+    cpu_before = cpu_seconds(pid)
+    started = time.perf_counter()
+    clock["stop_at"] = started + duration
+    clock["start"].set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    cpu_after = cpu_seconds(pid)
+
+    errors = [r for r in results if isinstance(r, Exception)]
+    samples = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    server_cpu = None if cpu_before is None else cpu_after - cpu_before
+    return {
+        "mode": protocol,
+        "sessions": sessions,
+        "target_fps": fps,
+        "frames": len(latencies),
+        "fps": round(len(latencies) / elapsed, 1),
+        "fps_per_session": round(len(latencies) / elapsed / sessions, 2),
+        "latency_ms": {name: round(float(np.percentile(samples, q)), 2) for name, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "server_cpu_utilisation": None if server_cpu is None else round(server_cpu / elapsed, 3),
+        "frames_per_server_cpu_second": round(len(latencies) / server_cpu, 1) if server_cpu else None,
+        "person_found": round(1 - len(no_human) / len(latencies), 3) if latencies else None,
+        "client_errors": len(errors),
+    }
+
+
+def parse_levels(text):
+    return [int(level) for level in text.split(",") if level]
+
+
+async def run(args):
+    port = free_port()
+    server = start_server(port)
+    try:
+        levels = []
+        for protocol, sessions in [(PROTOCOL_BINARY, parse_levels(args.image_sessions)),
+                                   (PROTOCOL_LANDMARKS, parse_levels(args.sessions))]:
+            for count in sessions:
+                levels.append(await run_level(port, server.pid, protocol, count, args.fps, args.duration))
+                print(json.dumps(levels[-1]), file=sys.stderr)
+    finally:
+        server.terminate()
+        server.wait()
+    return {"cpu_count": os.cpu_count(), "levels": levels}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare /ws load for image frames and client-side landmarks")
+    parser.add_argument("--sessions", default="1,50,500", help="landmark session counts to try")
+    parser.add_argument("--image-sessions", default="1,4", help="image session counts to try")
+    parser.add_argument("--fps", type=float, default=30)
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    if any(level["mode"] == PROTOCOL_BINARY and (level["person_found"] or 0) < MIN_PERSON_FOUND
+           for level in results["levels"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
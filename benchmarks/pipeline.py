@@ -0,0 +1,237 @@
+"""Per-stage latency of the /ws bicep pipeline on the checked-in fixtures.
+
+Run from the repository root:
+
+    python -m benchmarks.pipeline --output results.json
+    python -m benchmarks.pipeline --baseline results.json   # exit 1 on regressions
+
+Each stage of a /ws frame is timed on its own (JSON parse, base64 decode,
+imdecode, cvtColor, pose.process, analyze_pose, response serialisation),
+along with calculate_angle, the posture models and the whole
+CurlSession.process call. Results are JSON with p50/p95/p99 in milliseconds
+and single-threaded throughput per stage. The two stages that run
+pose.process also report the share of calls that found the person, and the
+run exits 1 when that is below MIN_PERSON_FOUND.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.angles import to_landmark_lists
+from benchmarks.fixtures import MIN_PERSON_FOUND, load_jpeg_frames, load_landmarks
+from bicep.app import BicepPoseAnalysis, calculate_angle, mp_pose
+from bicep.responses import CompactEncoder, dumps
+
+# Constants from server.py
+VISIBILITY_THRESHOLD = 0.65
+STAGE_UP_THRESHOLD = 90
+STAGE_DOWN_THRESHOLD = 120
+PEAK_CONTRACTION_THRESHOLD = 60
+LOOSE_UPPER_ARM_ANGLE_THRESHOLD = 40
+
+# A stage regresses when its p50 grows by more than this fraction
+REGRESSION_TOLERANCE = 0.2
+
+
+def new_analyzers():
+    return [BicepPoseAnalysis(side, STAGE_DOWN_THRESHOLD, STAGE_UP_THRESHOLD, PEAK_CONTRACTION_THRESHOLD,
+                              LOOSE_UPPER_ARM_ANGLE_THRESHOLD, VISIBILITY_THRESHOLD)
+            for side in ("left", "right")]
+
+
+def json_messages(jpegs):
+    return [json.dumps({"image": "data:image/jpeg;base64," + base64.b64encode(jpeg).decode()}) for jpeg in jpegs]
+
+
+def measure(fn, inputs, iterations, warmup=5):
+    """Call `fn` on inputs round-robin and return per-call stats."""
+    for i in range(min(warmup, iterations)):
+        fn(inputs[i % len(inputs)])
+
+    samples = np.empty(iterations)
+    for i in range(iterations):
+        item = inputs[i % len(inputs)]
+        started = time.perf_counter()
+        fn(item)
+        samples[i] = time.perf_counter() - started
+
+    samples *= 1000
+    p50, p95, p99 = np.percentile(samples, [50, 95, 99])
+    return {
+        "iterations": iterations,
+        "mean_ms": round(float(samples.mean()), 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "throughput_per_s": round(iterations / (samples.sum() / 1000), 1),
+    }
+
+
+def stage_inputs(jpegs):
+    """Intermediate values of the /ws path for each fixture frame."""
+    messages = json_messages(jpegs)
+    parsed = [json.loads(message) for message in messages]
+    encoded = [data["image"] for data in parsed]
+    buffers = [np.frombuffer(base64.b64decode(image.split(",")[1]), np.uint8) for image in encoded]
+    bgr = [cv2.imdecode(buffer, cv2.IMREAD_COLOR) for buffer in buffers]
+    rgb = [cv2.cvtColor(frame, cv2.COLOR_BGR2RGB) for frame in bgr]
+    return messages, encoded, buffers, bgr, rgb
+
+
+def response_samples(points):
+    """Responses shaped like the ones /ws sends, replayed from the landmark stream."""
+    left, right = new_analyzers()
+    responses = []
+    for landmarks in to_landmark_lists(points[~np.isnan(points[:, 0, 0])]):
+        left_angles = left.analyze_pose(landmarks, None)
+        right_angles = right.analyze_pose(landmarks, None)
+        responses.append({
+            "left_counter": left.counter, "right_counter": right.counter,
+            "left_errors": dict(left.detected_errors), "right_errors": dict(right.detected_errors),
+            "left_angles": left_angles, "right_angles": right_angles, "stage": left.stage,
+            "posture": "Correct",
+        })
+    return responses
+
+
+def bench_posture(iterations):
+    from bicep.posture import MODEL_PATHS, NUM_FEATURES, KerasModel, PostureClassifier
+
+    results = {}
+    rows = [np.random.default_rng(i).normal(0, 0.3, (1, NUM_FEATURES)).astype(np.float32) for i in range(16)]
+
+    try:
+        classifier = PostureClassifier.load()
+        results["posture_classifier"] = measure(classifier.predict, rows, iterations)
+    except Exception as e:
+        results["posture_classifier"] = {"skipped": str(e)}
+
+    # The per-frame Model.predict call the classifier replaced, on the same model file
+    model_path = next((path for path in MODEL_PATHS if os.path.exists(path)), None)
+    try:
+        if model_path is None:
+            raise FileNotFoundError("bicep_dp.keras not found")
+        model = KerasModel(model_path).model
+        results["posture_keras_predict"] = measure(lambda row: model.predict(row, verbose=0), rows, max(1, iterations // 10))
+    except Exception as e:
+        results["posture_keras_predict"] = {"skipped": str(e)}
+    return results
+
+
+def run(iterations, pose_iterations, include_posture=True):
+    from bicep.frames import PROTOCOL_JSON
+    from bicep.session import CurlSession
+
+    jpegs = load_jpeg_frames()
+    points = load_landmarks()
+    messages, encoded, buffers, bgr, rgb = stage_inputs(jpegs)
+    detected = points[~np.isnan(points[:, 0, 0])]
+    landmark_lists = to_landmark_lists(detected)
+    responses = response_samples(points)
+
+    stages = {}
+    stages["json_parse"] = measure(json.loads, messages, iterations)
+    stages["base64_decode"] = measure(lambda image: base64.b64decode(image.split(",")[1]), encoded, iterations)
+    stages["imdecode"] = measure(lambda buffer: cv2.imdecode(buffer, cv2.IMREAD_COLOR), buffers, iterations)
+    stages["cvtColor"] = measure(lambda frame: cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), bgr, iterations)
+
+    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
+        found = []
+        stages["pose_process"] = measure(lambda frame: found.append(bool(pose.process(frame).pose_landmarks)),
+                                         rgb, pose_iterations)
+        stages["pose_process"]["person_found"] = round(sum(found) / len(found), 3)
+
+    analyzers = new_analyzers()
+    stages["analyze_pose"] = measure(
+        lambda landmarks: [analysis.analyze_pose(landmarks, None) for analysis in analyzers],
+        landmark_lists, iterations)
+    stages["send_json_serialise"] = measure(json.dumps, responses, iterations)
+    stages["send_fast_serialise"] = measure(dumps, responses, iterations)
+    stages["send_compact_serialise"] = measure(CompactEncoder().encode, responses, iterations)
+
+    arm_points = [(frame[11, :2].tolist(), frame[13, :2].tolist(), frame[15, :2].tolist()) for frame in detected]
+    stages["calculate_angle"] = measure(lambda arm: calculate_angle(*arm), arm_points, iterations)
+
+    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
+        session = CurlSession(pose, *new_analyzers(), PROTOCOL_JSON)
+        found = []
+        stages["session_process"] = measure(lambda message: found.append(session.process(message)[1] is not None),
+                                            messages, pose_iterations)
+        stages["session_process"]["person_found"] = round(sum(found) / len(found), 3)
+
+    if include_posture:
+        stages.update(bench_posture(iterations))
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "environment": environment(),
+        "fixtures": {"jpeg_frames": len(jpegs), "frame_size": list(rgb[0].shape[1::-1]),
+                     "landmark_frames": len(points)},
+        "stages": stages,
+    }
+
+
+def environment():
+    import mediapipe
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "mediapipe": mediapipe.__version__,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Stages whose p50 is more than `tolerance` slower than the baseline."""
+    regressions = {}
+    for name, stats in results["stages"].items():
+        before = baseline.get("stages", {}).get(name, {})
+        if "p50_ms" not in stats or "p50_ms" not in before or not before["p50_ms"]:
+            continue
+        change = stats["p50_ms"] / before["p50_ms"] - 1
+        if change > tolerance:
+            regressions[name] = {"baseline_p50_ms": before["p50_ms"], "p50_ms": stats["p50_ms"],
+                                 "change": round(change, 3)}
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark each stage of the /ws bicep pipeline")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--pose-iterations", type=int, default=200, help="iterations for stages that run pose.process")
+    parser.add_argument("--no-posture", action="store_true", help="skip the posture model stages")
+    parser.add_argument("--output", help="write results here as well as to stdout")
+    parser.add_argument("--baseline", help="results JSON from an earlier run to compare p50s against")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    results = run(args.iterations, args.pose_iterations, include_posture=not args.no_posture)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            results["regressions"] = compare(results, json.load(f), args.tolerance)
+    results["no_person"] = [name for name, stats in results["stages"].items()
+                            if stats.get("person_found", 1) < MIN_PERSON_FOUND]
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+
+    if results.get("regressions") or results["no_person"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""Accuracy against pose inference saved for landmark prediction between inferences.
+
+Run from the repository root:
+
+    python -m benchmarks.prediction_check
+    python -m benchmarks.prediction_check --video recordings/curls.mp4
+
+The fixture check treats the checked-in landmark stream as what MediaPipe
+would return on every frame. Each setting of the maximum skip runs the
+stream through a LandmarkPredictor: frames it predicts use the extrapolated
+landmarks, the rest use the stream's. The stream is also played at 2x and
+3x speed (every 2nd or 3rd frame) so reps are faster than any real curl.
+Frame times are the stream's own, as a client's frame timestamps would be.
+
+Reported per run: share of frames inferred, rep counts and errors against a
+run without prediction, the curl and upper-arm angle error on predicted
+frames and the predictor's own cost per frame. The angle error is measured
+against the stream, jitter included. No setting bounds it: its maximum
+comes from arms that start moving while frames are predicted. With --video,
+the video is also run through MediaPipe with and without prediction and
+pose time per frame is compared. Exits 1 when counts differ anywhere.
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import FPS, load_landmarks
+from benchmarks.pipeline import new_analyzers
+from bicep.angles import NUM_LANDMARKS, landmarks_to_array
+from bicep.app import mp_pose
+from bicep.exercises import ExerciseEngine
+from bicep.predict import (
+    POSE_PREDICT_ANGLE_BUDGET, POSE_PREDICT_ANGLE_TOLERANCE, POSE_PREDICT_TOLERANCE, LandmarkPredictor,
+)
+
+MAX_SKIPS = (1, 2, 3, 5)
+SPEEDS = (1, 2, 3)
+
+
+def scores(analyzers):
+    return {analysis.side: {"counter": analysis.counter, "errors": dict(analysis.detected_errors)}
+            for analysis in analyzers}
+
+
+def replay(points, max_skip, angle_budget, tolerance, angle_tolerance):
+    """Run a landmark stream with prediction; max_skip 0 infers every frame."""
+    analyzers = new_analyzers()
+    engine = ExerciseEngine(analyzers)
+    predictor = LandmarkPredictor(engine.features, engine.thresholds(), max_skip, angle_budget, tolerance,
+                                  angle_tolerance)
+    inferred = detected = 0
+    angle_errors = []
+    predictor_seconds = 0.0
+
+    for i, frame_points in enumerate(points):
+        now = i / FPS
+        if np.isnan(frame_points[0, 0]):
+            predictor.reset()
+            continue
+        detected += 1
+
+        started = time.perf_counter()
+        predicted = predictor.predict(now)
+        if predicted is None:
+            predictor.observe(frame_points, now)
+        predictor_seconds += time.perf_counter() - started
+
+        if predicted is None:
+            inferred += 1
+            engine.step(frame_points)
+        else:
+            engine.step(predicted)
+            # Curl and upper-arm angles on both sides
+            angle_errors.append(np.abs(engine.features(predicted)[0] - engine.features(frame_points)[0]))
+
+    errors = np.concatenate(angle_errors) if angle_errors else np.zeros(0)
+    return {
+        "scores": scores(analyzers),
+        "inferred_share": round(inferred / max(detected, 1), 3),
+        "angle_error_deg": {
+            "mean": round(float(errors.mean()), 2) if errors.size else None,
+            "p95": round(float(np.percentile(errors, 95)), 2) if errors.size else None,
+            "max": round(float(errors.max()), 2) if errors.size else None,
+        },
+        "predictor_us_per_frame": round(predictor_seconds / max(detected, 1) * 1e6, 2),
+    }
+
+
+def check_fixture(angle_budget, tolerance, angle_tolerance):
+    points = load_landmarks()
+    runs = []
+    for speed in SPEEDS:
+        stream = points[::speed]
+        reference = replay(stream, 0, angle_budget, tolerance, angle_tolerance)["scores"]
+        for max_skip in MAX_SKIPS:
+            result = replay(stream, max_skip, angle_budget, tolerance, angle_tolerance)
+            runs.append(dict({"speed": speed, "max_skip": max_skip}, **result,
+                             reference=reference, match=result["scores"] == reference))
+    return {"runs": runs, "match": all(run["match"] for run in runs)}
+
+
+def score_video(path, max_skip, angle_budget, tolerance, angle_tolerance):
+    analyzers = new_analyzers()
+    engine = ExerciseEngine(analyzers)
+    predictor = LandmarkPredictor(engine.features, engine.thresholds(), max_skip, angle_budget, tolerance,
+                                  angle_tolerance)
+    points = np.empty((NUM_LANDMARKS, 4), np.float32)
+    pose_seconds = 0.0
+    frames = inferred = 0
+
+    cap = cv2.VideoCapture(path)
+    fps = cap.get(cv2.CAP_PROP_FPS) or FPS
+    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            now = frames / fps
+            frames += 1
+            predicted = predictor.predict(now)
+            if predicted is not None:
+                engine.step(predicted)
+                continue
+
+            inferred += 1
+            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            started = time.perf_counter()
+            results = pose.process(image)
+            pose_seconds += time.perf_counter() - started
+            if not results.pose_landmarks:
+                predictor.reset()
+                continue
+            landmarks_to_array(results.pose_landmarks.landmark, out=points)
+            predictor.observe(points, now)
+            engine.step(points)
+    cap.release()
+
+    return {
+        "scores": scores(analyzers),
+        "inferred_share": round(inferred / max(frames, 1), 3),
+        "pose_ms_per_frame": round(pose_seconds / max(frames, 1) * 1000, 2),
+    }
+
+
+def check_video(path, angle_budget, tolerance, angle_tolerance, max_skip):
+    full = score_video(path, 0, angle_budget, tolerance, angle_tolerance)
+    predicted = score_video(path, max_skip, angle_budget, tolerance, angle_tolerance)
+    return {
+        "video": path,
+        "every_frame": full,
+        "predicted": predicted,
+        "match": full["scores"] == predicted["scores"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rep counts and pose time with and without landmark prediction")
+    parser.add_argument("--video", help="recorded curl video to run through MediaPipe both ways")
+    parser.add_argument("--max-skip", type=int, default=3, help="maximum skip for the --video comparison")
+    parser.add_argument("--angle-budget", type=float, default=POSE_PREDICT_ANGLE_BUDGET)
+    parser.add_argument("--tolerance", type=float, default=POSE_PREDICT_TOLERANCE)
+    parser.add_argument("--angle-tolerance", type=float, default=POSE_PREDICT_ANGLE_TOLERANCE)
+    args = parser.parse_args()
+
+    report = {"fixture": check_fixture(args.angle_budget, args.tolerance, args.angle_tolerance)}
+    if args.video:
+        report["video"] = check_video(args.video, args.angle_budget, args.tolerance, args.angle_tolerance,
+                                      args.max_skip)
+    print(json.dumps(report, indent=2))
+
+    if not all(section["match"] for section in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Bytes and serialisation time per /ws response for each response format.
+
+Run from the repository root:
+
+    python -m benchmarks.response_size
+
+Replays the fixture landmark stream through a CurlSession and builds each
+frame's response the way server.py does, timing fields included. Each
+response is then serialised as send_json does (stdlib json), with the fast
+encoder, and compact with a full snapshot every 30 frames and on state
+changes only. The compact messages are also applied in order to a client
+state the way a client would, and every frame's state is checked against the
+full response. Exits 1 if any frame reconstructs differently.
+"""
+import json
+import random
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import load_landmarks
+from benchmarks.pipeline import new_analyzers
+from bicep.frames import PROTOCOL_LANDMARKS, encode_landmark_frame
+from bicep.responses import CompactEncoder, FRAME_KEYS, compact_response, dumps, orjson
+from bicep.session import CurlSession
+
+
+def server_responses(points):
+    session = CurlSession(None, *new_analyzers(), PROTOCOL_LANDMARKS)
+    rng = random.Random(0)
+    responses = []
+    for i, frame_points in enumerate(points):
+        message = encode_landmark_frame(None if np.isnan(frame_points[0, 0]) else frame_points,
+                                        seq=i, ts=1.7e12 + i * 33.3)
+        response_data, features = session.process(message)
+        if features is not None:
+            response_data["posture"] = "Correct"
+        response_data["dropped_frames"] = 0
+        response_data["server_ms"] = round(rng.uniform(8, 15), 1)
+        response_data["max_fps"] = round(1000 / response_data["server_ms"], 1)
+        response_data["latency_ms"] = round(rng.uniform(20, 40), 1)
+        # Snapshot the nested dicts the session keeps updating
+        response_data = json.loads(json.dumps(response_data))
+        responses.append(response_data)
+    return responses
+
+
+def apply(state, message):
+    if message.get("k"):
+        state.clear()
+    for key, value in message.items():
+        if value is None and key in FRAME_KEYS:
+            state.pop(key, None)
+        else:
+            state[key] = value
+    state.pop("k", None)
+
+
+def check_reconstruction(responses, full_every):
+    encoder = CompactEncoder(full_every)
+    state = {}
+    expected = {}
+    for i, response in enumerate(responses):
+        apply(state, json.loads(encoder.encode(response)))
+        # What the client should hold: everything seen so far, with this frame's error or none
+        for key in FRAME_KEYS:
+            expected.pop(key, None)
+        expected.update(compact_response(response))
+        if state != expected:
+            return {"match": False, "first_mismatch": i, "state": state, "expected": expected}
+    return {"match": True}
+
+
+def measure(encode, responses, repeats=20):
+    sizes = [len(encode(response).encode()) for response in responses]
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for response in responses:
+            encode(response)
+    seconds = (time.perf_counter() - started) / repeats / len(responses)
+    return {"bytes_per_frame": round(sum(sizes) / len(sizes), 1), "serialise_us": round(seconds * 1e6, 2)}
+
+
+def main():
+    responses = server_responses(load_landmarks())
+
+    formats = {
+        "send_json": measure(json.dumps, responses),
+        "full_fast": measure(dumps, responses),
+        "compact_full_every_30": measure(lambda r, e=CompactEncoder(30): e.encode(r), responses),
+        "compact_on_changes": measure(lambda r, e=CompactEncoder(0): e.encode(r), responses),
+    }
+    baseline = formats["send_json"]["bytes_per_frame"]
+    for result in formats.values():
+        result["bytes_vs_send_json"] = round(result["bytes_per_frame"] / baseline, 3)
+
+    report = {
+        "frames": len(responses),
+        "fast_encoder": "orjson" if orjson is not None else "json",
+        "formats": formats,
+        "reconstruction": {
+            "full_every_30": check_reconstruction(responses, 30),
+            "on_changes": check_reconstruction(responses, 0),
+        },
+    }
+    print(json.dumps(report, indent=2))
+    if not all(result["match"] for result in report["reconstruction"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Check that ROI-cropped, downscaled inference leaves rep counts unchanged.
+
+Run from the repository root:
+
+    python -m benchmarks.roi_check
+    python -m benchmarks.roi_check --video recordings/curls.mp4 --input-size 480
+
+Both are off in the server unless POSE_INPUT_SIZE and POSE_ROI_CROP are
+set; this script turns them on with --input-size, 480 by default.
+
+Three checks, each comparing rep counts:
+
+- mapping: the checked-in landmark stream, with the person shrunk to half
+  size in a 1280x960 camera frame, goes through PosePreprocessor's crop
+  tracking and coordinate mapping with no model involved. Counts are
+  compared with benchmarks/fixtures/expected.json.
+- rendered: the fixture stream is rendered as 640x480 frames centred on
+  a plain 1280x960 background, JPEG encoded and run through MediaPipe
+  twice. Once full frame at full scale, as the app first did. Once the way
+  a session does it: decoded at PosePreprocessor.decode_size(), cropped
+  and downscaled. Both passes are compared with expected.json.
+- video: the same two passes over every frame of --video, if given. There
+  is nothing to expect here, so the passes are compared with each other.
+
+The MediaPipe checks report landmark and angle differences, the size
+frames were decoded at and pose time per frame. Exits 1 when counts
+differ.
+"""
+import argparse
+import json
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from benchmarks.fixtures import _BACKGROUND, load_camera_landmarks, load_expected, load_landmarks, render_frame, score_stream
+from benchmarks.pipeline import new_analyzers
+from bicep.angles import NUM_LANDMARKS, arm_angles, landmarks_to_array
+from bicep.app import mp_pose
+from bicep.frames import decode_jpeg
+from bicep.preprocess import PosePreprocessor
+
+INPUT_SIZE = 480
+# 4:3 like the rendered person, so normalised-coordinate angles match the fixture stream
+CAMERA_FRAME = np.zeros((960, 1280, 3), np.uint8)
+# Person size relative to the fixture stream; uniform scaling keeps every angle
+FIXTURE_SCALE = 0.5
+# The rendered check's person, drawn at this size into the middle of CAMERA_FRAME
+RENDER_SIZE = (640, 480)
+
+
+def check_fixture(input_size):
+    points = load_landmarks()
+    points[..., :2] = 0.5 + (points[..., :2] - 0.5) * FIXTURE_SCALE
+    preprocessor = PosePreprocessor(input_size, roi_crop=True)
+    restored = np.full_like(points, np.nan)
+    crops = 0
+
+    for i, frame_points in enumerate(points):
+        preprocessor.prepare(CAMERA_FRAME)
+        if np.isnan(frame_points[0, 0]):
+            preprocessor.lost()
+            continue
+        x0, y0, sx, sy = preprocessor.transform
+        crops += (sx, sy) != (1.0, 1.0)
+        # What MediaPipe would report inside the crop
+        cropped = frame_points.copy()
+        cropped[:, 0] = (cropped[:, 0] - x0) / sx
+        cropped[:, 1] = (cropped[:, 1] - y0) / sy
+        cropped[:, 2] /= sx
+        restored[i] = preprocessor.restore(cropped)
+
+    expected = load_expected()["scores"]
+    scores = score_stream(restored)
+    return {
+        "frames": len(points),
+        "cropped_frames": crops,
+        "max_coordinate_error": float(np.nanmax(np.abs(restored[..., :3] - points[..., :3]))),
+        "expected": expected,
+        "scores": scores,
+        "match": scores == expected,
+    }
+
+
+def rendered_jpegs():
+    """JPEG camera frames of the fixture stream, the person in the middle of CAMERA_FRAME.
+
+    The border is plain background; a reflected one would mirror the person
+    into it.
+    """
+    height, width = CAMERA_FRAME.shape[:2]
+    top, left = (height - RENDER_SIZE[1]) // 2, (width - RENDER_SIZE[0]) // 2
+    for i, frame_points in enumerate(load_camera_landmarks()):
+        frame = cv2.copyMakeBorder(render_frame(frame_points, RENDER_SIZE, seed=i), top, height - RENDER_SIZE[1] - top,
+                                   left, width - RENDER_SIZE[0] - left, cv2.BORDER_CONSTANT, value=_BACKGROUND)
+        yield cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+
+
+def video_jpegs(path):
+    """Every frame of a video, JPEG encoded as VideoStreamer.jsx sends it."""
+    cap = cv2.VideoCapture(path)
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        yield cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, 80])[1].tobytes()
+    cap.release()
+
+
+def score_frames(jpegs, preprocessor):
+    analyzers = new_analyzers()
+    angles, landmarks = [], []
+    pose_seconds = 0.0
+    frames = 0
+    decoded_sides = []
+    points = np.empty((NUM_LANDMARKS, 4), np.float32)
+
+    with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
+        for jpeg in jpegs:
+            frames += 1
+            min_side = preprocessor.decode_size() if preprocessor else 0
+            image = cv2.cvtColor(decode_jpeg(np.frombuffer(jpeg, np.uint8), min_side), cv2.COLOR_BGR2RGB)
+            decoded_sides.append(max(image.shape[:2]))
+
+            started = time.perf_counter()
+            results = pose.process(preprocessor.prepare(image) if preprocessor else image)
+            pose_seconds += time.perf_counter() - started
+
+            if not results.pose_landmarks:
+                if preprocessor:
+                    preprocessor.lost()
+                angles.append(None)
+                landmarks.append(None)
+                continue
+            landmarks_to_array(results.pose_landmarks.landmark, out=points)
+            if preprocessor:
+                preprocessor.restore(points)
+            frame_angles = arm_angles(points)
+            angles.append(np.stack(frame_angles))
+            landmarks.append(points.copy())
+            for analysis in analyzers:
+                analysis.analyze_angles(frame_angles, None)
+
+    return {
+        "counts": {analysis.side: {"counter": analysis.counter, "errors": dict(analysis.detected_errors)}
+                   for analysis in analyzers},
+        "detected_frames": sum(a is not None for a in angles),
+        "decoded_side": {"min": min(decoded_sides, default=0), "max": max(decoded_sides, default=0)},
+        "pose_ms_per_frame": round(pose_seconds / max(frames, 1) * 1000, 2),
+    }, angles, landmarks
+
+
+def compare(jpegs, input_size, expected=None):
+    """Full-frame inference against a session's decode, crop and downscale, over the same frames.
+
+    With `expected` both passes must score it; without, they must agree.
+    """
+    jpegs = list(jpegs)
+    full, full_angles, full_landmarks = score_frames(jpegs, None)
+    reduced, reduced_angles, reduced_landmarks = score_frames(jpegs, PosePreprocessor(input_size, roi_crop=True))
+
+    offsets = [np.abs(a[:, :2] - b[:, :2])[(a[:, 3] > 0.5) & (b[:, 3] > 0.5)]
+               for a, b in zip(full_landmarks, reduced_landmarks) if a is not None and b is not None]
+    offsets = np.concatenate(offsets).ravel() if offsets else np.zeros(0)
+
+    differences = [np.abs(a[1:] - b[1:])[a[:1].repeat(2, 0) > 0.65]
+                   for a, b in zip(full_angles, reduced_angles) if a is not None and b is not None]
+    differences = np.concatenate(differences) if differences else np.zeros(0)
+    return {
+        "frames": len(jpegs),
+        "full_frame": full,
+        "preprocessed": reduced,
+        "landmark_diff": {
+            "mean": round(float(offsets.mean()), 4) if offsets.size else None,
+            "p95": round(float(np.percentile(offsets, 95)), 4) if offsets.size else None,
+        },
+        "angle_diff_deg": {
+            "mean": round(float(differences.mean()), 2) if differences.size else None,
+            "p95": round(float(np.percentile(differences, 95)), 2) if differences.size else None,
+        },
+        "expected": expected,
+        "match": (full["counts"] == reduced["counts"] if expected is None
+                  else full["counts"] == expected and reduced["counts"] == expected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare rep counts with and without ROI-cropped inference")
+    parser.add_argument("--video", help="recorded curl video to run through MediaPipe both ways")
+    parser.add_argument("--input-size", type=int, default=INPUT_SIZE)
+    args = parser.parse_args()
+
+    report = {"mapping": check_fixture(args.input_size), "rendered": compare(rendered_jpegs(), args.input_size, load_expected()["scores"])}
+    if args.video:
+        report["video"] = {"video": args.video, **compare(video_jpegs(args.video), args.input_size)}
+    print(json.dumps(report, indent=2))
+
+    if not all(section["match"] for section in report.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Check that sessions resumed from a snapshot count exactly like uninterrupted ones, and time the stores.
+
+Run from the repository root:
+
+    python -m benchmarks.session_resume
+    python -m benchmarks.session_resume --sessions 5000
+
+Replays the fixture landmark stream through a landmarks-protocol session,
+dropping the connection every --reconnect-every frames: the session is
+snapshotted through each store, thrown away and a fresh one restored from
+the store carries on. Final counts must match benchmarks/fixtures/expected.json.
+Then reports the snapshot size, the time to take and encode one, and the
+time for one batched write of --sessions snapshots and for single reads,
+for the in-memory and SQLite stores. Exits 1 on a count mismatch.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fixtures import load_expected, load_landmarks
+from benchmarks.pipeline import new_analyzers
+from bicep.exercises import EXERCISES, ExerciseState
+from bicep.frames import PROTOCOL_LANDMARKS, encode_landmark_frame
+from bicep.session import CurlSession
+from bicep.store import MemoryStore, SQLiteStore, decode_snapshot, encode_snapshot
+
+
+def new_session():
+    left, right = new_analyzers()
+    extra = [ExerciseState(EXERCISES[name](side)) for name in ("squat", "lateral_raise") for side in ("left", "right")]
+    return CurlSession(None, left, right, PROTOCOL_LANDMARKS, exercises=extra)
+
+
+def scores(session):
+    return {analysis.side: {"counter": analysis.counter, "errors": dict(analysis.detected_errors)}
+            for analysis in (session.left_arm_analysis, session.right_arm_analysis)}
+
+
+def check_resume(store, frames, reconnect_every):
+    session = new_session()
+    reference = new_session()
+    reconnects = 0
+    for i, frame in enumerate(frames):
+        if i and i % reconnect_every == 0:
+            store.put_many({"fixture": encode_snapshot(session.snapshot())})
+            session = new_session()
+            session.restore(decode_snapshot(store.get("fixture")))
+            reconnects += 1
+        session.process(frame)
+        reference.process(frame)
+
+    expected = load_expected()["scores"]
+    resumed = scores(session)
+    return {
+        "reconnects": reconnects,
+        "scores": resumed,
+        "expected": expected,
+        "match": resumed == expected and session.snapshot() == reference.snapshot(),
+    }
+
+
+def time_store(store, session, sessions):
+    snapshot = encode_snapshot(session.snapshot())
+    batch = {f"session-{i}": snapshot for i in range(sessions)}
+
+    started = time.perf_counter()
+    store.put_many(batch)
+    write_seconds = time.perf_counter() - started
+
+    ids = list(batch)[:1000]
+    started = time.perf_counter()
+    for session_id in ids:
+        store.get(session_id)
+    read_seconds = time.perf_counter() - started
+    return {
+        "batch_write_ms": round(write_seconds * 1000, 2),
+        "write_us_per_session": round(write_seconds / sessions * 1e6, 2),
+        "read_us": round(read_seconds / len(ids) * 1e6, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check session resume from snapshots and time the stores")
+    parser.add_argument("--reconnect-every", type=int, default=37, help="frames between dropped connections")
+    parser.add_argument("--sessions", type=int, default=1000, help="snapshots per timed batch write")
+    args = parser.parse_args()
+
+    points = load_landmarks()
+    frames = [encode_landmark_frame(None if np.isnan(p[0, 0]) else p, seq=i) for i, p in enumerate(points)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = {
+            "memory": MemoryStore(),
+            "sqlite": SQLiteStore(os.path.join(directory, "sessions.sqlite3")),
+        }
+        report = {"resume": {name: check_resume(store, frames, args.reconnect_every) for name, store in stores.items()}}
+
+        session = new_session()
+        for frame in frames[:300]:
+            session.process(frame)
+        iterations = 10000
+        started = time.perf_counter()
+        for _ in range(iterations):
+            snapshot = encode_snapshot(session.snapshot())
+        report["snapshot"] = {
+            "bytes": len(snapshot),
+            "states": len(session.engine.states),
+            "snapshot_and_encode_us": round((time.perf_counter() - started) / iterations * 1e6, 2),
+        }
+        report["stores"] = {name: time_store(store, session, args.sessions) for name, store in stores.items()}
+        for store in stores.values():
+            store.close()
+
+    print(json.dumps(report, indent=2))
+    if not all(result["match"] for result in report["resume"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
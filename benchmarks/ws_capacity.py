@@ -0,0 +1,331 @@
+"""Capacity of one server.py instance: how many /ws sessions it holds within a p99 target.
+
+Run from the repository root:
+
+    python -m benchmarks.ws_capacity --output capacity.json
+    python -m benchmarks.ws_capacity --fps 15 --p99-ms 150
+    python -m benchmarks.ws_capacity --source synthetic --max-no-human-rate 1
+    python -m benchmarks.ws_capacity --source recordings/frames/ --server inprocess
+
+Starts server.py under uvicorn, in a subprocess by default or on a thread of
+this process with --server inprocess, and ramps the number of concurrent
+/ws clients: --start sessions, then --factor times more each level, for
+--duration seconds per level. Each client behaves like VideoStreamer.jsx.
+It sends `{"image": "data:image/jpeg;base64,..."}` text messages at --fps
+without waiting for replies, plus a `seq` field that the server echoes so
+each reply can be matched to its frame. Frames are the checked-in fixture
+JPEGs, which show a person MediaPipe finds, synthetic noisy gradients
+(--source synthetic) or every .jpg in a directory. Synthetic frames have no
+person in them, so they only time the short "No human found" path.
+
+A level passes when:
+- the p99 round trip is within --p99-ms;
+- at most --max-error-rate of replies are errors other than "No human
+  found";
+- at most --max-no-human-rate of replies are "No human found", so a source
+  without a person can't pass for capacity;
+- at least --min-answered of the frames sent get a reply (the server
+  drops frames that arrive while one is in progress);
+- no client fails.
+
+After the first failing level, the gap to the last passing one is bisected
+--refine times. The JSON report holds every level and the capacity found.
+It is printed and written to --output. Exits 1 when even the first level
+fails. The clients share the machine with the server, and with
+--server inprocess share its interpreter too, so treat the numbers as a
+lower bound.
+"""
+import argparse
+import asyncio
+import base64
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+import websockets
+
+from benchmarks.fixtures import MIN_PERSON_FOUND, load_jpeg_frames
+from benchmarks.frame_protocol import synthetic_frame
+from benchmarks.landmark_load import cpu_seconds, free_port, start_server
+
+NO_HUMAN = "No human found"
+SYNTHETIC_FRAMES = 30
+
+
+def load_images(source, width, height):
+    """JPEG bytes to replay, from the fixtures, synthetic frames or a directory."""
+    if source == "fixtures":
+        return load_jpeg_frames()
+    if source == "synthetic":
+        return [cv2.imencode(".jpg", synthetic_frame(width, height, seed=i))[1].tobytes()
+                for i in range(SYNTHETIC_FRAMES)]
+    names = sorted(name for name in os.listdir(source) if name.lower().endswith((".jpg", ".jpeg")))
+    if not names:
+        raise SystemExit(f"No .jpg files in {source}")
+    images = []
+    for name in names:
+        with open(os.path.join(source, name), "rb") as f:
+            images.append(f.read())
+    return images
+
+
+def message_builder(images):
+    """seq -> the JSON text message for frame seq, as VideoStreamer.jsx sends it plus `seq`."""
+    encoded = [base64.b64encode(image).decode() for image in images]
+    return lambda seq: f'{{"seq":{seq},"image":"data:image/jpeg;base64,{encoded[seq % len(encoded)]}"}}'
+
+
+class InProcessServer:
+    """server.py's app under uvicorn on a thread of this process."""
+
+    def __init__(self, port):
+        import uvicorn
+        import server as server_module
+
+        self.server = uvicorn.Server(uvicorn.Config(server_module.app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.pid = None
+
+    def start(self):
+        self.thread.start()
+        deadline = time.monotonic() + 120
+        while not self.server.started:
+            if time.monotonic() > deadline or not self.thread.is_alive():
+                raise RuntimeError("server did not start")
+            time.sleep(0.1)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+class SubprocessServer:
+    def __init__(self, port):
+        self.port = port
+        self.process = None
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def start(self):
+        self.process = start_server(self.port)
+        return self
+
+    def stop(self):
+        self.process.terminate()
+        self.process.wait()
+
+
+class LevelStats:
+    def __init__(self):
+        self.sent = 0
+        self.latencies = []
+        self.no_human = 0
+        self.errors = 0
+        self.unanswered = 0
+
+
+async def client(uri, message, fps, clock, stats, grace):
+    interval = 1 / fps
+    async with websockets.connect(uri, max_size=None, compression=None) as ws:
+        sent_at = {}
+
+        async def receive():
+            async for reply in ws:
+                received = time.perf_counter()
+                data = json.loads(reply)
+                started = sent_at.pop(data.get("seq"), None)
+                if started is None:
+                    continue
+                stats.latencies.append(received - started)
+                if data.get("error") == NO_HUMAN:
+                    stats.no_human += 1
+                elif "error" in data:
+                    stats.errors += 1
+
+        receiver = asyncio.create_task(receive())
+        await clock["start"].wait()
+        seq = 0
+        next_send = time.perf_counter()
+        while time.perf_counter() < clock["stop_at"]:
+            sent_at[seq] = time.perf_counter()
+            await ws.send(message(seq))
+            stats.sent += 1
+            seq += 1
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                next_send = time.perf_counter()
+
+        # Replies still in flight get a moment to arrive; the rest were dropped
+        deadline = time.perf_counter() + grace
+        while sent_at and time.perf_counter() < deadline and not receiver.done():
+            await asyncio.sleep(0.02)
+        receiver.cancel()
+        stats.unanswered += len(sent_at)
+
+
+async def run_level(port, pid, message, sessions, duration, args):
+    uri = f"ws://127.0.0.1:{port}/ws"
+    stats = LevelStats()
+    clock = {"start": asyncio.Event(), "stop_at": float("inf")}
+    tasks = [asyncio.create_task(client(uri, message, args.fps, clock, stats, args.grace)) for _ in range(sessions)]
+    # Let every client connect, and its pose graph be checked out, before the clock starts
+    await asyncio.sleep(1 + sessions * 0.05)
+
+    cpu_before = cpu_seconds(pid) if pid else None
+    started = time.perf_counter()
+    clock["stop_at"] = started + duration
+    clock["start"].set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+    server_cpu = None if cpu_before is None else cpu_seconds(pid) - cpu_before
+
+    failures = [repr(result) for result in results if isinstance(result, Exception)]
+    replies = len(stats.latencies)
+    samples = np.array(stats.latencies) * 1000 if replies else np.full(1, np.inf)
+    p99 = float(np.percentile(samples, 99))
+    error_rate = stats.errors / replies if replies else 1.0
+    no_human_rate = stats.no_human / replies if replies else None
+    answered = replies / stats.sent if stats.sent else 0.0
+
+    violations = []
+    if p99 > args.p99_ms:
+        violations.append("p99")
+    if error_rate > args.max_error_rate:
+        violations.append("errors")
+    if no_human_rate is not None and no_human_rate > args.max_no_human_rate:
+        violations.append("no_human")
+    if answered < args.min_answered:
+        violations.append("answered")
+    if failures:
+        violations.append("client_failures")
+    return {
+        "sessions": sessions,
+        "sent": stats.sent,
+        "replies": replies,
+        "sent_per_s": round(stats.sent / duration, 1),
+        "replies_per_s": round(replies / duration, 1),
+        "replies_per_s_per_session": round(replies / duration / sessions, 2),
+        "answered": round(answered, 3),
+        "unanswered": stats.unanswered,
+        "latency_ms": {name: round(float(np.percentile(samples, q)), 2)
+                       for name, q in (("p50", 50), ("p95", 95), ("p99", 99), ("max", 100))},
+        "no_human_rate": None if no_human_rate is None else round(no_human_rate, 3),
+        "error_rate": round(error_rate, 4),
+        "client_failures": failures[:5],
+        "server_cpu_utilisation": None if server_cpu is None else round(server_cpu / elapsed, 3),
+        "passed": not violations,
+        "violations": violations,
+    }
+
+
+async def ramp(port, pid, message, args):
+    levels = []
+
+    async def level(sessions):
+        result = await run_level(port, pid, message, sessions, args.duration, args)
+        levels.append(result)
+        print(json.dumps(result), file=sys.stderr)
+        return result["passed"]
+
+    # Warm the pose pool and the server's code paths; not reported
+    if args.warmup > 0:
+        await run_level(port, pid, message, 1, args.warmup, args)
+
+    passed, failed = 0, None
+    sessions = args.start
+    while sessions <= args.max_sessions:
+        if not await level(sessions):
+            failed = sessions
+            break
+        passed = sessions
+        sessions = max(sessions + 1, int(sessions * args.factor))
+
+    for _ in range(args.refine if failed is not None else 0):
+        if failed - passed <= 1:
+            break
+        middle = (passed + failed) // 2
+        if await level(middle):
+            passed = middle
+        else:
+            failed = middle
+    return levels, passed, failed
+
+
+async def run(args):
+    images = load_images(args.source, args.width, args.height)
+    message = message_builder(images)
+    port = free_port()
+    server = (InProcessServer(port) if args.server == "inprocess" else SubprocessServer(port)).start()
+    try:
+        levels, passed, failed = await ramp(port, server.pid, message, args)
+    finally:
+        server.stop()
+
+    limit = next((level["violations"] for level in levels if level["sessions"] == failed), None)
+    return {
+        "server": args.server,
+        "cpu_count": os.cpu_count(),
+        "source": args.source,
+        "frames": len(images),
+        "mean_frame_bytes": round(float(np.mean([len(image) for image in images]))),
+        "fps_per_session": args.fps,
+        "duration_s": args.duration,
+        "targets": {"p99_ms": args.p99_ms, "max_error_rate": args.max_error_rate,
+                    "max_no_human_rate": args.max_no_human_rate, "min_answered": args.min_answered},
+        "capacity": {
+            "sessions": passed,
+            "first_failing": failed,
+            "limited_by": limit,
+            "frames_per_s": next((level["replies_per_s"] for level in levels if level["sessions"] == passed), 0),
+        },
+        "levels": sorted(levels, key=lambda level: level["sessions"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp /ws clients until a p99 latency target is violated")
+    parser.add_argument("--server", choices=("subprocess", "inprocess"), default="subprocess")
+    parser.add_argument("--source", default="fixtures", help="fixtures, synthetic or a directory of .jpg files")
+    parser.add_argument("--width", type=int, default=320, help="synthetic frame width")
+    parser.add_argument("--height", type=int, default=240, help="synthetic frame height")
+    parser.add_argument("--fps", type=float, default=10, help="frames each client sends per second")
+    parser.add_argument("--p99-ms", type=float, default=250)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--max-no-human-rate", type=float, default=round(1 - MIN_PERSON_FOUND, 3),
+                        help='fraction of replies that may be "No human found"')
+    parser.add_argument("--min-answered", type=float, default=0.9, help="fraction of frames that must get a reply")
+    parser.add_argument("--start", type=int, default=1)
+    parser.add_argument("--factor", type=float, default=2)
+    parser.add_argument("--max-sessions", type=int, default=512)
+    parser.add_argument("--refine", type=int, default=3, help="bisection steps after the first failing level")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per level")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of one client before the ramp")
+    parser.add_argument("--grace", type=float, default=1, help="seconds to wait for in-flight replies after a level")
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    # An in-process server prints to this process's stdout; keep it for the report
+    with contextlib.redirect_stdout(sys.stderr):
+        report = asyncio.run(run(args))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if report["capacity"]["sessions"] == 0:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
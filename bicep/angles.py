@@ -0,0 +1,194 @@
+import operator
+from collections import namedtuple
+
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+# MediaPipe PoseLandmark indices of (shoulder, elbow, wrist) for each side
+ARM_JOINTS = {
+    "left": (11, 13, 15),
+    "right": (12, 14, 16),
+}
+SIDES = ("left", "right")
+SIDE_INDEX = {side: i for i, side in enumerate(SIDES)}
+
+# The landmarks arm_angles reads, for callers that copy only those
+ARM_LANDMARKS = tuple(sorted(i for side in SIDES for i in ARM_JOINTS[side]))
+# Stands in for the point straight below a joint, (joint.x, 1), in an angle
+VERTICAL = None
+
+_LANDMARK_FIELDS = operator.attrgetter("x", "y", "z", "visibility")
+
+
+class FeatureSet:
+    """Joint angles and lowest visibilities of landmark groups, computed in one pass.
+
+    `angles` are (a, b, c) landmark triples, the angle at b between the rays
+    to a and c as `calculate_angle(a, b, c)` gives it; c may be VERTICAL.
+    Angles are computed exactly as `calculate_angle` does: with the required
+    landmarks flattened to (x, y) pairs, every difference vector is one matrix
+    product with 0 and +/-1 coefficients, which is exact in float64.
+    """
+
+    def __init__(self, angles: list, groups: list):
+        self.angles = [tuple(angle) for angle in angles]
+        self.groups = [tuple(group) for group in groups]
+
+        used = {i for a, b, c in self.angles for i in (a, b, c) if i is not VERTICAL}
+        used.update(i for group in self.groups for i in group)
+        self.landmarks = np.array(sorted(used))
+        position = {landmark: i for i, landmark in enumerate(self.landmarks)}
+
+        transform = np.zeros((2 * len(self.landmarks), 4 * len(self.angles)))
+        bias = np.zeros(4 * len(self.angles))
+        for k, (a, b, c) in enumerate(self.angles):
+            # Columns 2k, 2k+1 hold c - b; the second half holds a - b
+            for column, head in ((2 * k, c), (2 * (len(self.angles) + k), a)):
+                tail = position[b]
+                if head is VERTICAL:
+                    bias[column + 1] = 1
+                    transform[2 * tail + 1, column + 1] = -1
+                    continue
+                for axis in range(2):
+                    transform[2 * position[head] + axis, column + axis] = 1
+                    transform[2 * tail + axis, column + axis] = -1
+        self.transform = transform
+        self.bias = bias
+
+        # Pad groups to the same length by repeating a member, which leaves the minimum unchanged
+        width = max((len(group) for group in self.groups), default=1)
+        self.group_index = np.array([[position[i] for i in group + group[-1:] * (width - len(group))]
+                                     for group in self.groups], dtype=np.intp).reshape(len(self.groups), width)
+
+        # The same vectors as (head, tail) positions, for `frame`
+        self._vectors = [(None if c is VERTICAL else position[c], position[b]) for a, b, c in self.angles]
+        self._vectors += [(position[a], position[b]) for a, b, c in self.angles]
+        self._group_positions = [[position[i] for i in group] for group in self.groups]
+
+    def __call__(self, points: np.ndarray):
+        """Return `(angles, visibility)` shaped (..., n_angles) and (..., n_groups)."""
+        joints = np.asarray(points).take(self.landmarks, axis=-2)
+        xy = joints[..., :2].reshape(joints.shape[:-2] + (2 * len(self.landmarks),))
+
+        vectors = (xy @ self.transform + self.bias).reshape(xy.shape[:-1] + (2 * len(self.angles), 2))
+        directions = np.arctan2(vectors[..., 1], vectors[..., 0])
+        n = len(self.angles)
+        angle_in_deg = np.abs((directions[..., :n] - directions[..., n:]) * 180.0 / np.pi)
+        angles = np.minimum(angle_in_deg, 360 - angle_in_deg)
+
+        visibility = joints[..., 3].take(self.group_index, axis=-1).min(axis=-1)
+        return angles, visibility
+
+    def frame(self, points: np.ndarray):
+        """`self(points)` for one (33, 4) frame, as lists of floats.
+
+        The vectors are built in Python around a single arctan2 call, which
+        at this size is several times faster than the array path and gives
+        identical values.
+        """
+        joints = points.take(self.landmarks, axis=0).tolist()
+        dx, dy = [], []
+        for head, tail in self._vectors:
+            tail_x, tail_y = joints[tail][0], joints[tail][1]
+            if head is None:
+                dx.append(0.0)
+                dy.append(1 - tail_y)
+            else:
+                dx.append(joints[head][0] - tail_x)
+                dy.append(joints[head][1] - tail_y)
+        # np.arctan2, not math.atan2: the two differ in the last bit for some inputs
+        dy, dx = np.array((dy, dx))
+        directions = np.arctan2(dy, dx).tolist()
+
+        n = len(self.angles)
+        pi = np.pi
+        angles = []
+        for first, second in zip(directions[:n], directions[n:]):
+            angle_in_deg = abs((first - second) * 180.0 / pi)
+            angles.append(angle_in_deg if angle_in_deg <= 180 else 360 - angle_in_deg)
+        visibility = [min([joints[i][3] for i in group]) for group in self._group_positions]
+        return angles, visibility
+
+
+# Both curl angles, then both upper-arm angles, left arm first
+_ARM_FEATURES = FeatureSet(
+    [ARM_JOINTS[side] for side in SIDES]
+    + [(elbow, shoulder, VERTICAL) for shoulder, elbow, _ in (ARM_JOINTS[side] for side in SIDES)],
+    [ARM_JOINTS[side] for side in SIDES],
+)
+
+
+Landmark = namedtuple("Landmark", ["x", "y", "z", "visibility"])
+
+
+class LandmarkArray:
+    """A (33, 4) landmark array behind MediaPipe's `landmarks[i].x` interface.
+
+    Lets code written against `results.pose_landmarks.landmark` run on
+    landmarks that arrive as plain arrays, e.g. from on-device pose estimation.
+    """
+
+    __slots__ = ("points",)
+
+    def __init__(self, points: np.ndarray):
+        self.points = points
+
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Landmark(*row) for row in self.points[index].tolist()]
+        return Landmark(*self.points[index].tolist())
+
+    def __iter__(self):
+        return (Landmark(*row) for row in self.points.tolist())
+
+    def __array__(self, dtype=None):
+        return self.points if dtype is None else self.points.astype(dtype)
+
+
+def landmarks_to_array(landmarks, out: np.ndarray = None, indices=None) -> np.ndarray:
+    """Copy MediaPipe landmarks into a contiguous float32 (33, 4) array of x, y, z, visibility.
+
+    With `indices`, only those landmarks are copied; the other rows are left
+    as they were, or NaN in a new array. Each landmark read from a MediaPipe
+    result costs a few protobuf attribute lookups, so live frames copy only
+    the ones they use.
+    """
+    if indices is not None:
+        if out is None:
+            out = np.full((NUM_LANDMARKS, 4), np.nan, np.float32)
+        if isinstance(landmarks, LandmarkArray):
+            out[indices, :] = landmarks.points[indices, :]
+        else:
+            out[indices, :] = [_LANDMARK_FIELDS(landmarks[i]) for i in indices]
+        return out
+    if isinstance(landmarks, LandmarkArray):
+        if out is None:
+            return np.array(landmarks.points, np.float32)
+        out[:] = landmarks.points
+        return out
+    values = list(map(_LANDMARK_FIELDS, landmarks))
+    if out is None:
+        return np.array(values, np.float32)
+    out[:] = values
+    return out
+
+
+def arm_angles(points: np.ndarray):
+    """Compute both arms' joint angles from (33, 4) or (N, 33, 4) landmark arrays.
+
+    Returns `(visibility, curl, upper_arm)`, each shaped (..., 2) with the
+    left arm first: the lowest shoulder/elbow/wrist visibility, the
+    shoulder-elbow-wrist angle and the angle between the upper arm and the
+    vertical through the shoulder, as computed by a FeatureSet. A single
+    frame gives tuples of floats instead of arrays.
+    """
+    points = np.asarray(points)
+    if points.ndim == 2:
+        angles, visibility = _ARM_FEATURES.frame(points)
+        return tuple(visibility), tuple(angles[:2]), tuple(angles[2:])
+    angles, visibility = _ARM_FEATURES(points)
+    return visibility, angles[..., :2], angles[..., 2:]
@@ -1,24 +1,21 @@
-import mediapipe as mp
+from bicep.startup import import_mediapipe
 import cv2
 import numpy as np
-import pandas as pd
-import pickle
 import warnings
 import os
 warnings.filterwarnings('ignore')
-from tensorflow.keras.models import load_model
+import argparse
 import json
+from bicep.angles import ARM_LANDMARKS, SIDE_INDEX, arm_angles, landmarks_to_array
+from bicep.posture import IMPORTANT_LM_INDICES, get_classifier, posture_features, update_posture
+from bicep.exercises import ExerciseState, bicep_curl
+from bicep.live import APP_STATS_SECONDS, FramePipeline, is_camera, open_capture
+
+mp = import_mediapipe()
 
 # Get the absolute path of the current directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# Try to load model, but don't fail if not found
-try:
-    DL_model = load_model(os.path.join(BASE_DIR, 'models', 'bicep_dp.keras'))
-except Exception as e:
-    print(f"Warning: Could not load bicep model: {e}")
-    DL_model = None
-
 # Drawing helpers
 mp_drawing = mp.solutions.drawing_utils
 mp_pose = mp.solutions.pose
@@ -64,194 +61,174 @@ def extract_important_keypoints(results, important_landmarks: list) -> list:
         data.append([keypoint.x, keypoint.y, keypoint.z, keypoint.visibility])
     return np.array(data).flatten().tolist()
 
-class BicepPoseAnalysis:
+class BicepPoseAnalysis(ExerciseState):
+    """One arm's bicep curl, run by the exercise engine's `bicep_curl` definition.
+
+    Keeps the original constructor and `analyze_pose` / `analyze_angles`
+    interface; sessions that track several exercises hand these to an
+    `ExerciseEngine` instead.
+    """
+
     def __init__(self, side: str, stage_down_threshold: float, stage_up_threshold: float, peak_contraction_threshold: float, loose_upper_arm_angle_threshold: float, visibility_threshold: float):
+        super().__init__(bicep_curl(side, stage_down_threshold, stage_up_threshold, peak_contraction_threshold,
+                                    loose_upper_arm_angle_threshold, visibility_threshold))
         self.stage_down_threshold = stage_down_threshold
         self.stage_up_threshold = stage_up_threshold
         self.peak_contraction_threshold = peak_contraction_threshold
         self.loose_upper_arm_angle_threshold = loose_upper_arm_angle_threshold
-        self.visibility_threshold = visibility_threshold
-
-        self.side = side
-        self.counter = 0
-        self.stage = "down"
-        self.is_visible = True
-        self.detected_errors = {
-            "LOOSE_UPPER_ARM": 0,
-            "PEAK_CONTRACTION": 0,
-        }
 
-        self.loose_upper_arm = False
-        self.peak_contraction_angle = 1000
-        self.peak_contraction_frame = None
-
-    def get_joints(self, landmarks) -> bool:
-        side = self.side.upper()
-        joints_visibility = [
-            landmarks[mp_pose.PoseLandmark[f"{side}_SHOULDER"].value].visibility,
-            landmarks[mp_pose.PoseLandmark[f"{side}_ELBOW"].value].visibility,
-            landmarks[mp_pose.PoseLandmark[f"{side}_WRIST"].value].visibility
-        ]
-        
-        is_visible = all([vis > self.visibility_threshold for vis in joints_visibility])
-        self.is_visible = is_visible
-
-        if not is_visible:
-            return self.is_visible
-        
-        self.shoulder = [landmarks[mp_pose.PoseLandmark[f"{side}_SHOULDER"].value].x, landmarks[mp_pose.PoseLandmark[f"{side}_SHOULDER"].value].y]
-        self.elbow = [landmarks[mp_pose.PoseLandmark[f"{side}_ELBOW"].value].x, landmarks[mp_pose.PoseLandmark[f"{side}_ELBOW"].value].y]
-        self.wrist = [landmarks[mp_pose.PoseLandmark[f"{side}_WRIST"].value].x, landmarks[mp_pose.PoseLandmark[f"{side}_WRIST"].value].y]
-
-        return self.is_visible
+        self.side_index = SIDE_INDEX[side]
 
-    def analyze_pose(self, landmarks, frame):
-        self.get_joints(landmarks)
+    @property
+    def loose_upper_arm(self) -> bool:
+        return self.crossed["LOOSE_UPPER_ARM"]
 
-        if not self.is_visible:
+    @property
+    def peak_contraction_angle(self) -> int:
+        return 1000 if self.extreme is None else self.extreme
+
+    def analyze_pose(self, landmarks, frame):
+        if not isinstance(landmarks, np.ndarray):
+            landmarks = landmarks_to_array(landmarks, indices=ARM_LANDMARKS)
+        return self.analyze_angles(arm_angles(landmarks), frame)
+
+    def analyze_angles(self, angles, frame, timestamp: float = None):
+        """Advance the rep state machine from the output of `arm_angles` for one frame.
+
+        Callers analysing both arms should compute `arm_angles` once and pass
+        it to each side. `frame` is only read to make a rep thumbnail.
+        """
+        visibility, curl, upper_arm = angles
+        if not float(visibility[self.side_index]) > self.visibility_threshold:
+            self.is_visible = False
             return (None, None)
 
-        bicep_curl_angle = int(calculate_angle(self.shoulder, self.elbow, self.wrist))
-        if bicep_curl_angle > self.stage_down_threshold:
-            self.stage = "down"
-        elif bicep_curl_angle < self.stage_up_threshold and self.stage == "down":
-            self.stage = "up"
-            self.counter += 1
-        
-        shoulder_projection = [self.shoulder[0], 1]
-        ground_upper_arm_angle = int(calculate_angle(self.elbow, self.shoulder, shoulder_projection))
-
-        if ground_upper_arm_angle > self.loose_upper_arm_angle_threshold:
-            if not self.loose_upper_arm:
-                self.loose_upper_arm = True
-                self.detected_errors["LOOSE_UPPER_ARM"] += 1
-        else:
-            self.loose_upper_arm = False
-        
-        if self.stage == "up" and bicep_curl_angle < self.peak_contraction_angle:
-            self.peak_contraction_angle = bicep_curl_angle
-            self.peak_contraction_frame = frame
-        elif self.stage == "down":
-            if self.peak_contraction_angle != 1000 and self.peak_contraction_angle >= self.peak_contraction_threshold:
-                self.detected_errors["PEAK_CONTRACTION"] += 1
-            
-            self.peak_contraction_angle = 1000
-            self.peak_contraction_frame = None
-        
-        return (bicep_curl_angle, ground_upper_arm_angle)
-
-def main():
-    if DL_model is None:
-        print("Error: Bicep model not loaded. Please ensure model file exists.")
+        values = (int(curl[self.side_index]), int(upper_arm[self.side_index]))
+        return tuple(self.update(True, values, frame, timestamp))
+
+# Parameters of the local app
+VISIBILITY_THRESHOLD = 0.65
+STAGE_UP_THRESHOLD = 90
+STAGE_DOWN_THRESHOLD = 120
+PEAK_CONTRACTION_THRESHOLD = 60
+LOOSE_UPPER_ARM_ANGLE_THRESHOLD = 40
+# Display size as a percentage of the camera frame
+DISPLAY_SCALE = 75
+
+APP_HEADLESS = os.environ.get("APP_HEADLESS", "0") == "1"
+
+
+class CurlTracker:
+    """The local app's inference stage: pose, both arms and posture for one frame at a time."""
+
+    def __init__(self, pose, posture_classifier):
+        self.pose = pose
+        self.posture_classifier = posture_classifier
+        self.posture = 0
+        # Only these landmarks are copied out of each result
+        self.landmarks = sorted(set(ARM_LANDMARKS).union(IMPORTANT_LM_INDICES.tolist() if posture_classifier is not None else ()))
+        self.left_arm_analysis = BicepPoseAnalysis("right", STAGE_DOWN_THRESHOLD, STAGE_UP_THRESHOLD,
+                                                   PEAK_CONTRACTION_THRESHOLD, LOOSE_UPPER_ARM_ANGLE_THRESHOLD,
+                                                   VISIBILITY_THRESHOLD)
+        self.right_arm_analysis = BicepPoseAnalysis("left", STAGE_DOWN_THRESHOLD, STAGE_UP_THRESHOLD,
+                                                    PEAK_CONTRACTION_THRESHOLD, LOOSE_UPPER_ARM_ANGLE_THRESHOLD,
+                                                    VISIBILITY_THRESHOLD)
+
+    def process(self, image):
+        """(pose landmarks, output JSON) for a BGR frame; landmarks are None when no human is found."""
+        results = self.pose.process(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
+        if not results.pose_landmarks:
+            return None, None
+
+        points = landmarks_to_array(results.pose_landmarks.landmark, indices=self.landmarks)
+        angles = arm_angles(points)
+        self.left_arm_analysis.analyze_angles(angles, image)
+        self.right_arm_analysis.analyze_angles(angles, image)
+
+        if self.posture_classifier is not None:
+            prediction = self.posture_classifier.predict(posture_features(points))
+            self.posture = update_posture(self.posture, prediction[0])
+
+        output_data = {
+            "right_counter": self.right_arm_analysis.counter,
+            "left_counter": self.left_arm_analysis.counter,
+            "posture": "Correct" if self.posture == 0 else "Leaning",
+            "right_errors": dict(self.right_arm_analysis.detected_errors),
+            "left_errors": dict(self.left_arm_analysis.detected_errors),
+        }
+        return results.pose_landmarks, output_data
+
+
+def draw_output(image, pose_landmarks, output_data):
+    mp_drawing.draw_landmarks(
+        image, pose_landmarks, mp_pose.POSE_CONNECTIONS,
+        mp_drawing.DrawingSpec(color=(244, 117, 66), thickness=2, circle_radius=2),
+        mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=1)
+    )
+    if output_data is None:
         return
 
+    # Make status box larger and wider
+    cv2.rectangle(image, (0, 0), (1200, 80), (245, 117, 16), -1)
+
+    # Display counters and errors with adjusted positioning
+    cv2.putText(image, f"Left: {output_data['right_counter']}", (20, 50),
+                cv2.FONT_HERSHEY_COMPLEX, 1.0, (255, 255, 255), 2)
+    cv2.putText(image, f"Right: {output_data['left_counter']}", (250, 50),
+                cv2.FONT_HERSHEY_COMPLEX, 1.0, (255, 255, 255), 2)
+
+    # Display posture prominently
+    cv2.putText(image, f"Posture: {output_data['posture']}", (600, 50),
+                cv2.FONT_HERSHEY_COMPLEX, 1.2, (255, 255, 255), 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Count bicep curls from a webcam or video file")
+    parser.add_argument("--source", default="0", help="camera index or video path")
+    parser.add_argument("--headless", action="store_true", default=APP_HEADLESS,
+                        help="no window or drawing, one compact JSON line per result (APP_HEADLESS=1)")
+    parser.add_argument("--stats-seconds", type=float, default=APP_STATS_SECONDS,
+                        help="seconds between per-stage FPS and latency reports, 0 to turn them off")
+    args = parser.parse_args(argv)
+
     # Load models
-    with open("input_scaler.pkl", "rb") as f:
-        input_scaler = pickle.load(f)
-    
-    # with open("./model/bicep_dp.pkl", "rb") as f:
-    #     DL_model = pickle.load(f)
-
-    cap = cv2.VideoCapture(0)  # Use 0 for webcam or provide video path
-
-    # Initialize parameters
-    VISIBILITY_THRESHOLD = 0.65
-    STAGE_UP_THRESHOLD = 90
-    STAGE_DOWN_THRESHOLD = 120
-    PEAK_CONTRACTION_THRESHOLD = 60
-    LOOSE_UPPER_ARM_ANGLE_THRESHOLD = 40
-    POSTURE_ERROR_THRESHOLD = 0.95
-    posture = 0
-
-    # Initialize analyzers
-    left_arm_analysis = BicepPoseAnalysis("right", STAGE_DOWN_THRESHOLD, STAGE_UP_THRESHOLD, 
-                                         PEAK_CONTRACTION_THRESHOLD, LOOSE_UPPER_ARM_ANGLE_THRESHOLD, 
-                                         VISIBILITY_THRESHOLD)
-    
-    right_arm_analysis = BicepPoseAnalysis("left", STAGE_DOWN_THRESHOLD, STAGE_UP_THRESHOLD,
-                                          PEAK_CONTRACTION_THRESHOLD, LOOSE_UPPER_ARM_ANGLE_THRESHOLD,
-                                          VISIBILITY_THRESHOLD)
+    try:
+        posture_classifier = get_classifier()
+    except Exception as e:
+        print(f"Error: Bicep model not loaded. Please ensure model file exists. ({e})")
+        return
+
+    cap = open_capture(args.source)
+    indent = None if args.headless else 2
+
+    def render(image, result):
+        # None when processing raised; the pipeline has already printed the error
+        pose_landmarks, output_data = result or (None, None)
+        if result is not None and pose_landmarks is None:
+            print("No human found")
+        elif output_data is not None:
+            print(json.dumps(output_data, indent=indent))
+
+        if args.headless:
+            return True
+        if pose_landmarks is not None:
+            draw_output(image, pose_landmarks, output_data)
+        cv2.imshow("Bicep Curl Analysis", image)
+        return idle()
+
+    def idle():
+        return args.headless or cv2.waitKey(1) & 0xFF != ord('q')
 
     with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
-        while cap.isOpened():
-            ret, image = cap.read()
-            if not ret:
-                break
-
-            # Change display size from 40 to 75 percent
-            image = rescale_frame(image, 75)
-            video_dimensions = [image.shape[1], image.shape[0]]
-
-            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-            image.flags.writeable = False
-            results = pose.process(image)
-
-            if not results.pose_landmarks:
-                print("No human found")
-                continue
-
-            image.flags.writeable = True
-            image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-
-            mp_drawing.draw_landmarks(
-                image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-                mp_drawing.DrawingSpec(color=(244, 117, 66), thickness=2, circle_radius=2),
-                mp_drawing.DrawingSpec(color=(245, 66, 230), thickness=2, circle_radius=1)
-            )
-
-            try:
-                landmarks = results.pose_landmarks.landmark
-                
-                left_angles = left_arm_analysis.analyze_pose(landmarks, image)
-                right_angles = right_arm_analysis.analyze_pose(landmarks, image)
-
-                row = extract_important_keypoints(results, IMPORTANT_LMS)
-                X = pd.DataFrame([row], columns=HEADERS[1:])
-                X = pd.DataFrame(input_scaler.transform(X))
-
-                prediction = DL_model.predict(X)
-                predicted_class = np.argmax(prediction, axis=1)[0]
-                prediction_probability = round(max(prediction.tolist()[0]), 2)
-
-                if prediction_probability >= POSTURE_ERROR_THRESHOLD:
-                    posture = predicted_class
-
-                # Make status box larger and wider
-                cv2.rectangle(image, (0, 0), (1200, 80), (245, 117, 16), -1)
-
-                # Display counters and errors with adjusted positioning
-                cv2.putText(image, f"Left: {right_arm_analysis.counter}", (20, 50), 
-                            cv2.FONT_HERSHEY_COMPLEX, 1.0, (255, 255, 255), 2)
-                cv2.putText(image, f"Right: {left_arm_analysis.counter}", (250, 50), 
-                            cv2.FONT_HERSHEY_COMPLEX, 1.0, (255, 255, 255), 2)
-                
-                # Display posture prominently
-                posture_text = "Correct" if posture == 0 else "Leaning"
-                cv2.putText(image, f"Posture: {posture_text}", (600, 50),
-                            cv2.FONT_HERSHEY_COMPLEX, 1.2, (255, 255, 255), 2)
-
-                # Create output JSON
-                output_data = {
-                    "right_counter": right_arm_analysis.counter,
-                    "left_counter": left_arm_analysis.counter,
-                    "posture": posture_text,
-                    "right_errors": right_arm_analysis.detected_errors,
-                    "left_errors": left_arm_analysis.detected_errors
-                }
-                
-                # Optional: Print JSON output
-                print(json.dumps(output_data, indent=2))
-
-            except Exception as e:
-                print(f"Error: {e}")
-
-            cv2.imshow("Bicep Curl Analysis", image)
-
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
-
-        cap.release()
-        cv2.destroyAllWindows()
+        tracker = CurlTracker(pose, posture_classifier)
+        pipeline = FramePipeline(cap, tracker.process, render, prepare=lambda frame: rescale_frame(frame, DISPLAY_SCALE),
+                                 idle=idle, drop_frames=is_camera(args.source), stats_seconds=args.stats_seconds)
+        try:
+            stats = pipeline.run()
+        finally:
+            cap.release()
+            cv2.destroyAllWindows()
+    print(f"Stats: {json.dumps(stats)}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,332 @@
+"""Declarative exercise definitions and the engine that steps them.
+
+An exercise is data: the joint angles it needs, which landmarks must be
+visible, a stage rule that counts reps and error rules. `ExerciseEngine`
+computes the union of every active exercise's angles in one pass per frame,
+with the same FeatureSet that `arm_angles` runs on, and then steps each
+exercise's state machine from that shared feature vector, so adding
+exercises adds a few Python comparisons per frame rather than another round
+of landmark lookups and angle maths.
+"""
+import operator
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from bicep.angles import VERTICAL, FeatureSet
+from bicep.reps import RepEvent, make_thumbnail
+
+LEFT_SHOULDER, RIGHT_SHOULDER = 11, 12
+LEFT_ELBOW, RIGHT_ELBOW = 13, 14
+LEFT_WRIST, RIGHT_WRIST = 15, 16
+LEFT_HIP, RIGHT_HIP = 23, 24
+LEFT_KNEE, RIGHT_KNEE = 25, 26
+LEFT_ANKLE, RIGHT_ANKLE = 27, 28
+
+_SIDE_JOINTS = {
+    "left": {"shoulder": LEFT_SHOULDER, "elbow": LEFT_ELBOW, "wrist": LEFT_WRIST,
+             "hip": LEFT_HIP, "knee": LEFT_KNEE, "ankle": LEFT_ANKLE},
+    "right": {"shoulder": RIGHT_SHOULDER, "elbow": RIGHT_ELBOW, "wrist": RIGHT_WRIST,
+              "hip": RIGHT_HIP, "knee": RIGHT_KNEE, "ankle": RIGHT_ANKLE},
+}
+
+_COMPARE = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge}
+
+# Angle at landmark b between the rays to a and c, as calculate_angle(a, b, c)
+Angle = namedtuple("Angle", ["a", "b", "c"])
+
+
+class StageRule:
+    """Counts a rep each time `angle` moves from the rest stage into the active stage.
+
+    `rest_when` and `active_when` are `(op, threshold)` pairs on the angle in
+    whole degrees, e.g. the bicep curl rests at `(">", 120)` and is active at
+    `("<", 90)`. The active stage's extreme angle is tracked for the rep log.
+    """
+
+    def __init__(self, angle: str, rest_when, active_when, rest: str = "down", active: str = "up"):
+        self.angle = angle
+        self.rest_when = (_COMPARE[rest_when[0]], rest_when[1])
+        self.active_when = (_COMPARE[active_when[0]], active_when[1])
+        self.rest = rest
+        self.active = active
+        # Reps head towards smaller angles when the active stage is entered from above
+        self.better = operator.lt if active_when[0] in ("<", "<=") else operator.gt
+
+
+class ThresholdError:
+    """Counts one error each time `angle` crosses `threshold` in the direction of `op`."""
+
+    def __init__(self, name: str, angle: str, op: str, threshold: float):
+        self.name = name
+        self.angle = angle
+        self.compare = _COMPARE[op]
+        self.threshold = threshold
+
+
+class PeakError:
+    """Counts one error for a rep whose most extreme angle never satisfied `op threshold`.
+
+    The extreme is the minimum for "<" / "<=" targets and the maximum otherwise,
+    tracked while the exercise is in its active stage.
+    """
+
+    def __init__(self, name: str, angle: str, op: str, threshold: float):
+        self.name = name
+        self.angle = angle
+        self.compare = _COMPARE[op]
+        self.threshold = threshold
+        self.better = operator.lt if op in ("<", "<=") else operator.gt
+
+
+class Exercise:
+    def __init__(self, name: str, side: str, angles: dict, visible: tuple, stage: StageRule,
+                 errors: list = (), visibility_threshold: float = 0.65):
+        self.name = name
+        self.side = side
+        self.angles = dict(angles)
+        self.angle_names = list(self.angles)
+        self.visible = tuple(visible)
+        self.stage = stage
+        self.errors = list(errors)
+        self.visibility_threshold = visibility_threshold
+
+    @property
+    def key(self) -> str:
+        return f"{self.name}_{self.side}" if self.side else self.name
+
+
+def bicep_curl(side: str, stage_down_threshold: float = 120, stage_up_threshold: float = 90,
+               peak_contraction_threshold: float = 60, loose_upper_arm_angle_threshold: float = 40,
+               visibility_threshold: float = 0.65) -> Exercise:
+    joints = _SIDE_JOINTS[side]
+    return Exercise(
+        "bicep_curl", side,
+        angles={
+            "curl": Angle(joints["shoulder"], joints["elbow"], joints["wrist"]),
+            "upper_arm": Angle(joints["elbow"], joints["shoulder"], VERTICAL),
+        },
+        visible=(joints["shoulder"], joints["elbow"], joints["wrist"]),
+        stage=StageRule("curl", rest_when=(">", stage_down_threshold), active_when=("<", stage_up_threshold)),
+        errors=[
+            ThresholdError("LOOSE_UPPER_ARM", "upper_arm", ">", loose_upper_arm_angle_threshold),
+            PeakError("PEAK_CONTRACTION", "curl", "<", peak_contraction_threshold),
+        ],
+        visibility_threshold=visibility_threshold,
+    )
+
+
+def squat(side: str, visibility_threshold: float = 0.65) -> Exercise:
+    joints = _SIDE_JOINTS[side]
+    return Exercise(
+        "squat", side,
+        angles={
+            "knee": Angle(joints["hip"], joints["knee"], joints["ankle"]),
+            "hip": Angle(joints["shoulder"], joints["hip"], joints["knee"]),
+        },
+        visible=(joints["hip"], joints["knee"], joints["ankle"]),
+        stage=StageRule("knee", rest_when=(">", 160), active_when=("<", 110)),
+        errors=[
+            PeakError("SHALLOW_DEPTH", "knee", "<", 90),
+            ThresholdError("FORWARD_LEAN", "hip", "<", 60),
+        ],
+        visibility_threshold=visibility_threshold,
+    )
+
+
+def lateral_raise(side: str, visibility_threshold: float = 0.65) -> Exercise:
+    joints = _SIDE_JOINTS[side]
+    return Exercise(
+        "lateral_raise", side,
+        angles={
+            "raise": Angle(joints["hip"], joints["shoulder"], joints["elbow"]),
+            "elbow": Angle(joints["shoulder"], joints["elbow"], joints["wrist"]),
+        },
+        visible=(joints["hip"], joints["shoulder"], joints["elbow"], joints["wrist"]),
+        stage=StageRule("raise", rest_when=("<", 30), active_when=(">", 75)),
+        errors=[
+            ThresholdError("BENT_ELBOW", "elbow", "<", 140),
+            ThresholdError("OVER_RAISE", "raise", ">", 110),
+        ],
+        visibility_threshold=visibility_threshold,
+    )
+
+
+EXERCISES = {
+    "bicep_curl": bicep_curl,
+    "squat": squat,
+    "lateral_raise": lateral_raise,
+}
+
+
+class ExerciseState:
+    """Rep counter and error state for one exercise on one side of one person."""
+
+    def __init__(self, exercise: Exercise):
+        self.exercise = exercise
+        self.side = exercise.side
+        self.visibility_threshold = exercise.visibility_threshold
+        self.counter = 0
+        self.stage = exercise.stage.rest
+        self.is_visible = True
+        self.detected_errors = {rule.name: 0 for rule in exercise.errors}
+
+        stage = exercise.stage
+        self._stage_angle = exercise.angle_names.index(stage.angle)
+        self._thresholds = [(rule, exercise.angle_names.index(rule.angle))
+                            for rule in exercise.errors if isinstance(rule, ThresholdError)]
+        self._peaks = [(rule, exercise.angle_names.index(rule.angle))
+                       for rule in exercise.errors if isinstance(rule, PeakError)]
+        # Threshold rules count on the frame an angle crosses, not every frame past it
+        self.crossed = {rule.name: False for rule, _ in self._thresholds}
+        self.extreme = None
+        self.peaks = {rule.name: None for rule, _ in self._peaks}
+
+        # Completed reps go to rep_log when one is attached, with an optional
+        # small JPEG of the active stage's extreme
+        self.rep_log = None
+        self.current_rep = None
+        self.thumbnail_width = 0
+        self.frame_is_rgb = False
+
+    def update(self, visible: bool, values, frame=None, timestamp: float = None):
+        """Advance the state machine by one frame of whole-degree angle values.
+
+        `values` follows the order of `exercise.angles`. Returns `values`, or
+        None when the exercise's joints aren't visible.
+        """
+        self.is_visible = visible
+        if not visible:
+            return None
+
+        stage = self.exercise.stage
+        angle = values[self._stage_angle]
+        if stage.rest_when[0](angle, stage.rest_when[1]):
+            self.stage = stage.rest
+        elif stage.active_when[0](angle, stage.active_when[1]) and self.stage == stage.rest:
+            self.stage = stage.active
+            self.counter += 1
+            if self.rep_log is not None:
+                self.current_rep = RepEvent(self.counter, self.side, timestamp or time.time(), angle,
+                                            self.detected_errors, self.exercise.name)
+
+        for rule, index in self._thresholds:
+            if rule.compare(values[index], rule.threshold):
+                if not self.crossed[rule.name]:
+                    self.crossed[rule.name] = True
+                    self.detected_errors[rule.name] += 1
+                    if self.current_rep is not None:
+                        self.current_rep.errors[rule.name] = True
+            else:
+                self.crossed[rule.name] = False
+
+        if self.stage == stage.active:
+            if self.extreme is None or stage.better(angle, self.extreme):
+                self.extreme = angle
+                if self.current_rep is not None:
+                    self.current_rep.peak_angle = angle
+                    if self.thumbnail_width and frame is not None:
+                        self.current_rep.thumbnail = make_thumbnail(frame, self.thumbnail_width, self.frame_is_rgb)
+            for rule, index in self._peaks:
+                peak = self.peaks[rule.name]
+                if peak is None or rule.better(values[index], peak):
+                    self.peaks[rule.name] = values[index]
+        elif self.stage == stage.rest:
+            for rule, _ in self._peaks:
+                peak = self.peaks[rule.name]
+                if peak is not None and not rule.compare(peak, rule.threshold):
+                    self.detected_errors[rule.name] += 1
+                    if self.current_rep is not None:
+                        self.current_rep.errors[rule.name] = True
+                self.peaks[rule.name] = None
+
+            if self.current_rep is not None:
+                self.current_rep.ended_at = timestamp or time.time()
+                self.rep_log.append(self.current_rep)
+                self.current_rep = None
+            self.extreme = None
+
+        return values
+
+    def summary(self) -> dict:
+        return {"counter": self.counter, "stage": self.stage, "errors": self.detected_errors}
+
+    def snapshot(self) -> list:
+        """JSON-safe copy of the counting state, small enough to write every second.
+
+        [counter, stage, error counts, crossed flags, active-stage extreme,
+        peaks], each list in `exercise.errors` order. A rep under way is not
+        kept; after `restore` it still counts but isn't added to the rep log.
+        """
+        return [
+            self.counter,
+            self.stage,
+            [self.detected_errors[rule.name] for rule in self.exercise.errors],
+            [int(self.crossed[rule.name]) for rule, _ in self._thresholds],
+            self.extreme,
+            [self.peaks[rule.name] for rule, _ in self._peaks],
+        ]
+
+    def restore(self, snapshot: list):
+        counter, stage, errors, crossed, extreme, peaks = snapshot
+        self.counter = counter
+        self.stage = stage
+        # Update in place: responses and rep events hold on to this dict
+        for rule, count in zip(self.exercise.errors, errors):
+            self.detected_errors[rule.name] = count
+        for (rule, _), flag in zip(self._thresholds, crossed):
+            self.crossed[rule.name] = bool(flag)
+        self.extreme = extreme
+        for (rule, _), peak in zip(self._peaks, peaks):
+            self.peaks[rule.name] = peak
+        self.current_rep = None
+
+
+class ExerciseEngine:
+    """Steps a set of exercise states from one shared feature pass per frame."""
+
+    def __init__(self, states: list):
+        self.states = list(states)
+
+        angles, groups = [], []
+        self._angle_index, self._group_index = [], []
+        for state in self.states:
+            exercise = state.exercise
+            indices = []
+            for name in exercise.angle_names:
+                spec = tuple(exercise.angles[name])
+                if spec not in angles:
+                    angles.append(spec)
+                indices.append(angles.index(spec))
+            self._angle_index.append(indices)
+            if exercise.visible not in groups:
+                groups.append(exercise.visible)
+            self._group_index.append(groups.index(exercise.visible))
+
+        self.features = FeatureSet(angles, groups)
+        self._steps = [(state, group, state.visibility_threshold, indices)
+                       for state, group, indices in zip(self.states, self._group_index, self._angle_index)]
+
+    def thresholds(self) -> list:
+        """(feature angle index, threshold) for every stage and error rule of every exercise."""
+        pairs = []
+        for state, indices in zip(self.states, self._angle_index):
+            exercise = state.exercise
+            index = dict(zip(exercise.angle_names, indices))
+            stage = exercise.stage
+            pairs += [(index[stage.angle], stage.rest_when[1]), (index[stage.angle], stage.active_when[1])]
+            pairs += [(index[rule.angle], rule.threshold) for rule in exercise.errors]
+        return sorted(set(pairs))
+
+    def step(self, points: np.ndarray, frame=None, timestamp: float = None) -> list:
+        """Advance every state by one frame of (33, 4) landmarks; returns each state's angle values or None."""
+        angles, visibility = self.features.frame(points)
+        values = []
+        for state, group, threshold, indices in self._steps:
+            # Whole degrees, truncated as the original analysis did, for visible exercises only
+            if visibility[group] > threshold:
+                values.append(state.update(True, [int(angles[i]) for i in indices], frame, timestamp))
+            else:
+                values.append(state.update(False, None, frame, timestamp))
+        return values
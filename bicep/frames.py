@@ -0,0 +1,195 @@
+import base64
+import json
+import math
+import struct
+
+import cv2
+import numpy as np
+
+# Binary frame header: version, pixel format, width, height, sequence number.
+# Version 2 appends the client capture timestamp in milliseconds.
+FRAME_HEADER = struct.Struct("<BBHHI")
+FRAME_HEADER_V2 = struct.Struct("<BBHHId")
+FRAME_VERSION = 1
+FRAME_VERSION_TIMESTAMPED = 2
+
+FORMAT_JPEG = 0
+FORMAT_RGB = 1
+FORMAT_BGR = 2
+FORMAT_I420 = 3
+# 33 x (x, y, z, visibility) little-endian float32 from on-device pose
+# estimation; an empty payload means no person was found
+FORMAT_LANDMARKS = 4
+LANDMARKS_DTYPE = np.dtype("<f4")
+LANDMARKS_SHAPE = (33, 4)
+LANDMARKS_PAYLOAD_SIZE = 33 * 4 * LANDMARKS_DTYPE.itemsize
+
+PROTOCOL_JSON = "json"
+PROTOCOL_BINARY = "binary"
+PROTOCOL_LANDMARKS = "landmarks"
+
+
+# libjpeg can decode straight to 1/2, 1/4 or 1/8 scale, skipping most of the IDCT work
+_REDUCED_DECODE = ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2))
+# Start-of-frame markers carry the image size; C4, C8 and CC are other segments
+_JPEG_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+class FrameError(ValueError):
+    pass
+
+
+def jpeg_size(data):
+    """(width, height) from a JPEG's start-of-frame segment, or None if it can't be found."""
+    if len(data) < 4 or data[0] != 0xFF or data[1] != 0xD8:
+        return None
+    i = 2
+    while i + 9 <= len(data):
+        if data[i] != 0xFF:
+            return None
+        marker = data[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            height, width = struct.unpack_from(">HH", data, i + 5)
+            return width, height
+        i += 2 + struct.unpack_from(">H", data, i + 2)[0]
+    return None
+
+
+def decode_jpeg(data, min_side: int = 0):
+    """Decode JPEG bytes to BGR, at the smallest libjpeg scale whose longer side is still at least `min_side`."""
+    if len(data) == 0:
+        raise FrameError("Empty JPEG frame")
+    flag = cv2.IMREAD_COLOR
+    if min_side:
+        size = jpeg_size(data)
+        if size is not None:
+            for factor, reduced in _REDUCED_DECODE:
+                if max(size) // factor >= min_side:
+                    flag = reduced
+                    break
+    frame = cv2.imdecode(data, flag)
+    if frame is None:
+        raise FrameError("Could not decode JPEG frame")
+    return frame
+
+
+def encode_binary_frame(payload: bytes, fmt: int = FORMAT_JPEG, width: int = 0, height: int = 0, seq: int = 0, ts: float = None) -> bytes:
+    if ts is None:
+        return FRAME_HEADER.pack(FRAME_VERSION, fmt, width, height, seq & 0xFFFFFFFF) + payload
+    return FRAME_HEADER_V2.pack(FRAME_VERSION_TIMESTAMPED, fmt, width, height, seq & 0xFFFFFFFF, ts) + payload
+
+
+def encode_landmark_frame(points, seq: int = 0, ts: float = None) -> bytes:
+    payload = b"" if points is None else np.asarray(points, LANDMARKS_DTYPE).tobytes()
+    return encode_binary_frame(payload, FORMAT_LANDMARKS, 0, 0, seq, ts)
+
+
+def _client_ts(ts):
+    """The client timestamp if it is a finite number of ms, else None, so it is ignored."""
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool) and math.isfinite(ts):
+        return ts
+    return None
+
+
+def _unpack_header(message: bytes):
+    if len(message) < FRAME_HEADER.size:
+        raise FrameError("Frame shorter than header")
+
+    version = message[0]
+    if version == FRAME_VERSION:
+        _, fmt, width, height, seq = FRAME_HEADER.unpack_from(message)
+        return fmt, width, height, seq, None, FRAME_HEADER.size
+    if version == FRAME_VERSION_TIMESTAMPED and len(message) >= FRAME_HEADER_V2.size:
+        _, fmt, width, height, seq, ts = FRAME_HEADER_V2.unpack_from(message)
+        return fmt, width, height, seq, _client_ts(ts), FRAME_HEADER_V2.size
+    raise FrameError(f"Unsupported frame version {version}")
+
+
+def decode_landmark_frame(message: bytes):
+    """Decode a FORMAT_LANDMARKS message into a read-only (33, 4) float32 view, sequence number and timestamp.
+
+    The landmarks are None when the client found no person.
+    """
+    fmt, _, _, seq, ts, offset = _unpack_header(message)
+    if fmt != FORMAT_LANDMARKS:
+        raise FrameError(f"Expected a landmark frame, got pixel format {fmt}")
+
+    size = len(message) - offset
+    if size == 0:
+        return None, seq, ts
+    if size != LANDMARKS_PAYLOAD_SIZE:
+        raise FrameError("Landmark payload must be 33 x 4 float32 values")
+    points = np.frombuffer(message, LANDMARKS_DTYPE, offset=offset).reshape(LANDMARKS_SHAPE)
+    if not np.isfinite(points).all():
+        raise FrameError("Landmark payload has non-finite values")
+    return points, seq, ts
+
+
+def decode_binary_frame(message: bytes, min_side: int = 0):
+    """Decode a binary frame message into an RGB image, sequence number and client timestamp.
+
+    Pixel data is viewed straight out of the received buffer, so raw RGB frames
+    reach MediaPipe without any copy and JPEG frames are decoded in one pass.
+    JPEG frames are decoded at reduced scale when `min_side` allows it.
+    """
+    fmt, width, height, seq, ts, offset = _unpack_header(message)
+    pixels = np.frombuffer(message, np.uint8, offset=offset)
+
+    if fmt == FORMAT_JPEG:
+        return cv2.cvtColor(decode_jpeg(pixels, min_side), cv2.COLOR_BGR2RGB), seq, ts
+
+    if fmt not in (FORMAT_RGB, FORMAT_BGR, FORMAT_I420):
+        raise FrameError(f"Unknown pixel format {fmt}")
+    # JPEG carries its own size; raw pixels are only as big as the header says
+    if width == 0 or height == 0:
+        raise FrameError(f"Invalid frame size {width}x{height}")
+
+    if fmt == FORMAT_RGB:
+        if pixels.size != width * height * 3:
+            raise FrameError("RGB payload does not match frame size")
+        return pixels.reshape(height, width, 3), seq, ts
+
+    if fmt == FORMAT_BGR:
+        if pixels.size != width * height * 3:
+            raise FrameError("BGR payload does not match frame size")
+        return cv2.cvtColor(pixels.reshape(height, width, 3), cv2.COLOR_BGR2RGB), seq, ts
+
+    if width % 2 or height % 2:
+        raise FrameError(f"I420 frame size {width}x{height} must be even")
+    if pixels.size != width * height * 3 // 2:
+        raise FrameError("I420 payload does not match frame size")
+    return cv2.cvtColor(pixels.reshape(height * 3 // 2, width), cv2.COLOR_YUV2RGB_I420), seq, ts
+
+
+def parse_json_frame(message: str) -> dict:
+    """The object of a JSON frame, which frame_meta and decode_json_frame take in place of the text."""
+    try:
+        image_data = json.loads(message)
+    except ValueError as e:
+        raise FrameError(f"Invalid JSON frame: {e}")
+    if not isinstance(image_data, dict):
+        raise FrameError("JSON frame must be an object")
+    return image_data
+
+
+def frame_meta(message, protocol: str):
+    """Sequence number and client timestamp of a binary or JSON frame, without decoding its pixels."""
+    if protocol == PROTOCOL_BINARY:
+        _, _, _, seq, ts, _ = _unpack_header(message)
+        return seq, ts
+    image_data = message if isinstance(message, dict) else parse_json_frame(message)
+    return image_data.get('seq'), _client_ts(image_data.get('ts'))
+
+
+def decode_json_frame(message, min_side: int = 0):
+    """Decode the legacy `{"image": "data:image/jpeg;base64,..."}` message, as text or parsed."""
+    image_data = message if isinstance(message, dict) else parse_json_frame(message)
+    try:
+        image_bytes = base64.b64decode(image_data['image'].split(',')[1])
+    except (KeyError, IndexError, AttributeError, TypeError, ValueError) as e:
+        raise FrameError(f"Invalid JSON frame image: {e}")
+    frame = decode_jpeg(np.frombuffer(image_bytes, np.uint8), min_side)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), image_data.get('seq'), _client_ts(image_data.get('ts'))
@@ -0,0 +1,75 @@
+import os
+
+import cv2
+import numpy as np
+
+# Skip pose inference on frames that look the same as the last inferred one
+POSE_GATE = os.environ.get("POSE_GATE", "1") == "1"
+# Width of the grayscale thumbnail frames are compared on; height follows the aspect ratio
+POSE_GATE_SIZE = int(os.environ.get("POSE_GATE_SIZE", 48))
+# A thumbnail pixel has changed when its gray level moved by more than this
+POSE_GATE_PIXEL_DIFF = int(os.environ.get("POSE_GATE_PIXEL_DIFF", 8))
+# A frame has changed when more than this many thumbnail pixels have
+POSE_GATE_MIN_CHANGED = int(os.environ.get("POSE_GATE_MIN_CHANGED", 1))
+# Unchanged frames are still inferred after this many seconds, doubling up to the maximum
+POSE_GATE_PROBE_SECONDS = float(os.environ.get("POSE_GATE_PROBE_SECONDS", 0.5))
+POSE_GATE_MAX_PROBE_SECONDS = float(os.environ.get("POSE_GATE_MAX_PROBE_SECONDS", 4))
+
+
+class FrameGate:
+    """Decides from a tiny grayscale thumbnail whether a frame needs pose inference.
+
+    Each frame is shrunk to `size` pixels wide and compared with the
+    thumbnail of the last frame that was inferred. Counting changed pixels
+    rather than averaging the difference keeps a moving forearm from being
+    lost in an otherwise still frame. Unchanged frames reuse the last result,
+    except for probes: the first unchanged frame `probe_seconds` after the
+    last inference is inferred anyway, and each probe that finds the scene
+    still unchanged doubles the wait, up to `max_probe_seconds`. Any change
+    resets the wait.
+    """
+
+    def __init__(self, size: int = POSE_GATE_SIZE, pixel_diff: int = POSE_GATE_PIXEL_DIFF,
+                 min_changed: int = POSE_GATE_MIN_CHANGED, probe_seconds: float = POSE_GATE_PROBE_SECONDS,
+                 max_probe_seconds: float = POSE_GATE_MAX_PROBE_SECONDS):
+        self.size = size
+        self.pixel_diff = pixel_diff
+        self.min_changed = min_changed
+        self.probe_seconds = probe_seconds
+        self.max_probe_seconds = max_probe_seconds
+
+        self.reference = None
+        self.inferred_at = 0.0
+        self.probe_interval = probe_seconds
+
+    def thumbnail(self, image: np.ndarray) -> np.ndarray:
+        height, width = image.shape[:2]
+        size = (self.size, max(1, round(height * self.size / width)))
+        small = cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_RGB2GRAY) if small.ndim == 3 else small
+
+    def check(self, image: np.ndarray, now: float) -> bool:
+        """True when `image` should be inferred; the gate then takes it as the new reference.
+
+        An empty image has no thumbnail, so it is passed on ungated and left
+        for the decoder or the pose model to reject.
+        """
+        if image.size == 0:
+            return True
+        thumbnail = self.thumbnail(image)
+        reference = self.reference
+        if reference is None or reference.shape != thumbnail.shape:
+            changed = True
+        else:
+            changed = np.count_nonzero(cv2.absdiff(thumbnail, reference) > self.pixel_diff) > self.min_changed
+
+        if changed:
+            self.probe_interval = self.probe_seconds
+        elif now - self.inferred_at >= self.probe_interval:
+            self.probe_interval = min(self.probe_interval * 2, self.max_probe_seconds)
+        else:
+            return False
+
+        self.reference = thumbnail
+        self.inferred_at = now
+        return True
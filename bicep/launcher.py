@@ -0,0 +1,228 @@
+"""Pre-forking launcher that runs server.py on every core.
+
+Run from the repository root:
+
+    python -m bicep.launcher --workers 8 --port 8000
+
+The parent process sets per-worker thread limits, imports the app (mediapipe,
+OpenCV, NumPy and FastAPI, which is most of a cold start) and binds one
+listening socket, then forks the workers. They share the imported modules
+copy-on-write and all accept from the same socket. MediaPipe graphs and the
+posture model are not built before the fork: both start native threads,
+which don't survive it, so each worker warms its own PosePool at startup.
+
+Each worker is pinned to its own CPUs. On SIGTERM or Ctrl+C the workers stop
+accepting and call the app's `app.state.drain()` coroutine, which lets live
+sessions finish their current set, for up to --drain-seconds before closing
+whatever is left. Workers that die unexpectedly are restarted. With more
+than one worker, session snapshots default to the SQLite store so a
+reconnecting client resumes on whichever worker accepts it.
+"""
+import argparse
+import asyncio
+import gc
+import importlib
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+
+LAUNCHER_WORKERS = int(os.environ.get("LAUNCHER_WORKERS", 0))  # 0: one per available CPU
+LAUNCHER_THREADS = int(os.environ.get("LAUNCHER_THREADS", 0))  # 0: available CPUs / workers
+LAUNCHER_PIN_CPUS = os.environ.get("LAUNCHER_PIN_CPUS", "1") == "1"
+LAUNCHER_DRAIN_SECONDS = float(os.environ.get("LAUNCHER_DRAIN_SECONDS", 60))
+
+# Read when each library starts its thread pools, so they must be set before
+# the first import. POSE_WORKERS sizes each worker's PoseWorkerPool.
+THREAD_LIMIT_VARS = (
+    "OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS", "POSE_WORKERS",
+)
+# Time a worker has to exit after the drain before it is killed
+KILL_GRACE_SECONDS = 10
+RESTART_DELAY_SECONDS = 1
+
+
+def available_cpus() -> list:
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def worker_cpus(index: int, threads: int, cpus: list) -> set:
+    # Consecutive blocks of `threads` CPUs, wrapping when there are more workers than CPUs
+    return {cpus[(index * threads + i) % len(cpus)] for i in range(threads)}
+
+
+def limit_threads(threads: int):
+    for name in THREAD_LIMIT_VARS:
+        os.environ.setdefault(name, str(threads))
+
+
+def preload(app_path: str):
+    """Import the app in the parent so every worker inherits it."""
+    module_name, _, attr = app_path.partition(":")
+    sys.path.insert(0, os.getcwd())
+    app = getattr(importlib.import_module(module_name), attr or "app")
+
+    if threading.active_count() > 1:
+        print(f"Warning: {threading.active_count()} threads running before fork; workers will not inherit them")
+    # Keep the garbage collector from touching, and so copying, every preloaded object in every worker
+    gc.collect()
+    gc.freeze()
+    return app
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def draining_server_class():
+    import uvicorn
+
+    class DrainingServer(uvicorn.Server):
+        """uvicorn.Server that drains sessions before closing connections."""
+
+        def __init__(self, config, app, drain_seconds: float):
+            super().__init__(config)
+            self.app = app
+            self.drain_seconds = drain_seconds
+            self.parent = os.getppid()
+
+        async def on_tick(self, counter: int) -> bool:
+            # Exit with the launcher instead of being left behind by it
+            if counter % 10 == 0 and os.getppid() != self.parent:
+                self.should_exit = True
+            return await super().on_tick(counter)
+
+        async def shutdown(self, sockets=None):
+            for server in self.servers:
+                server.close()
+            for sock in sockets or []:
+                sock.close()
+
+            drain = getattr(self.app.state, "drain", None)
+            if drain is not None and not self.force_exit:
+                print(f"Worker {os.getpid()}: draining sessions for up to {self.drain_seconds:.0f}s")
+                task = asyncio.ensure_future(drain())
+                deadline = time.monotonic() + self.drain_seconds
+                # A second signal sets force_exit and skips the rest of the drain
+                while not task.done() and not self.force_exit and time.monotonic() < deadline:
+                    await asyncio.sleep(0.1)
+                task.cancel()
+            await super().shutdown(sockets=sockets)
+
+    return DrainingServer
+
+
+def run_worker(app, sock: socket.socket, cpus: set, threads: int, args):
+    # Signals go to the launcher, which forwards one SIGTERM, so Ctrl+C on the
+    # terminal doesn't reach the workers twice and skip the drain
+    os.setpgid(0, 0)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+
+    import cv2
+    import uvicorn
+    cv2.setNumThreads(threads)
+
+    config = uvicorn.Config(app, log_level=args.log_level, timeout_keep_alive=5)
+    server = draining_server_class()(config, app, args.drain_seconds)
+    server.run(sockets=[sock])
+
+
+def spawn(index: int, app, sock: socket.socket, threads: int, cpus: list, args) -> int:
+    assigned = worker_cpus(index, threads, cpus) if args.pin_cpus else None
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            run_worker(app, sock, assigned, threads, args)
+        except BaseException as e:
+            print(f"Error: worker {index}: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    print(f"Started worker {index} [{pid}]" + (f" on CPUs {sorted(assigned)}" if assigned else ""))
+    return pid
+
+
+def supervise(app, sock: socket.socket, workers: int, threads: int, cpus: list, args):
+    stopping = []
+
+    def stop(signum, frame):
+        if not stopping:
+            stopping.append(time.monotonic())
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+        elif signum == signal.SIGINT:
+            # Ctrl+C again: skip the drain
+            for pid in children:
+                os.kill(pid, signal.SIGTERM)
+
+    children = {}
+    for index in range(workers):
+        children[spawn(index, app, sock, threads, cpus, args)] = index
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            break
+        if pid == 0:
+            if stopping and time.monotonic() - stopping[0] > args.drain_seconds + KILL_GRACE_SECONDS:
+                for pid in children:
+                    os.kill(pid, signal.SIGKILL)
+            time.sleep(0.2)
+            continue
+
+        index = children.pop(pid)
+        if not stopping:
+            print(f"Warning: worker {index} [{pid}] exited with status {status}; restarting")
+            time.sleep(RESTART_DELAY_SECONDS)
+            children[spawn(index, app, sock, threads, cpus, args)] = index
+    sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the /ws server in several pre-forked worker processes")
+    parser.add_argument("--app", default="server:app", help="module:attribute of the ASGI app")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=LAUNCHER_WORKERS, help="worker processes, 0 for one per CPU")
+    parser.add_argument("--threads", type=int, default=LAUNCHER_THREADS, help="threads per worker, 0 to split the CPUs")
+    parser.add_argument("--no-pin", dest="pin_cpus", action="store_false", default=LAUNCHER_PIN_CPUS,
+                        help="leave CPU placement to the scheduler")
+    parser.add_argument("--drain-seconds", type=float, default=LAUNCHER_DRAIN_SECONDS)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    cpus = available_cpus()
+    workers = args.workers or len(cpus)
+    threads = args.threads or max(1, len(cpus) // workers)
+    limit_threads(threads)
+    if workers > 1:
+        # Reconnecting clients can land on any worker, so share session snapshots between them
+        os.environ.setdefault("SESSION_STORE", "sqlite")
+
+    started = time.perf_counter()
+    app = preload(args.app)
+    print(f"Preloaded {args.app} in {(time.perf_counter() - started) * 1000:.0f} ms")
+    sock = bind_socket(args.host, args.port)
+    print(f"Listening on {args.host}:{args.port} with {workers} workers, {threads} threads each")
+    supervise(app, sock, workers, threads, cpus, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Threaded capture / inference / render pipeline for the local webcam app.
+
+A capture thread reads the camera, an inference thread runs whatever
+`process` is given, and the caller's thread renders results. Each hand-off
+is a one-slot buffer: a stage that falls behind skips to the newest item
+instead of working through a queue, so every stage runs at its own rate and
+a frame is never more than one item old at each hand-off.
+"""
+import json
+import os
+import threading
+import time
+
+import cv2
+
+# Seconds between per-stage FPS and latency reports; 0 turns them off
+APP_STATS_SECONDS = float(os.environ.get("APP_STATS_SECONDS", 5))
+
+
+class LatestSlot:
+    """Thread-safe one-slot buffer that keeps only the newest item.
+
+    `put` replaces an item that has not been taken yet and counts it in
+    `dropped`, unless `wait` is set, in which case it blocks until the slot
+    is free; video files are read that way so no frame is skipped.
+    """
+
+    def __init__(self):
+        self.item = None
+        self.closed = False
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def put(self, item, wait: bool = False) -> bool:
+        """False once the slot is closed, telling the producer to stop."""
+        with self.condition:
+            if wait:
+                self.condition.wait_for(lambda: self.item is None or self.closed)
+            if self.closed:
+                return False
+            if self.item is not None:
+                self.dropped += 1
+            self.item = item
+            self.condition.notify_all()
+            return True
+
+    def get(self, timeout: float = None):
+        """The newest item, or None on timeout or once the slot is closed and empty."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.item is not None or self.closed, timeout)
+            item, self.item = self.item, None
+            self.condition.notify_all()
+            return item
+
+    @property
+    def finished(self) -> bool:
+        return self.closed and self.item is None
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+
+class StageMeter:
+    """Running totals for one stage: items, time spent on them and frame age when done.
+
+    Only the stage's own thread records; `report` reads the totals without
+    locking and diffs them against the previous report.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.frames = 0
+        self.busy = 0.0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        self.last = (0, 0.0, 0.0)
+
+    def record(self, started: float, captured_at: float):
+        finished = time.perf_counter()
+        self.frames += 1
+        self.busy += finished - started
+        age = finished - captured_at
+        self.latency += age
+        if age > self.max_latency:
+            self.max_latency = age
+
+    def report(self, seconds: float) -> dict:
+        frames, busy, latency = self.frames, self.busy, self.latency
+        last_frames, last_busy, last_latency = self.last
+        self.last = (frames, busy, latency)
+        count = frames - last_frames
+        return {
+            "fps": round(count / seconds, 1) if seconds > 0 else None,
+            "busy_ms": round((busy - last_busy) / count * 1000, 1) if count else None,
+            "latency_ms": round((latency - last_latency) / count * 1000, 1) if count else None,
+        }
+
+
+class FramePipeline:
+    """Runs `process(frame)` on a thread fed by a capture thread reading `cap`.
+
+    `prepare` runs on the inference thread just before `process`, e.g. to
+    rescale the frame, so frames that are dropped never pay for it. `run`
+    renders on the calling thread, which OpenCV windows need, by calling
+    `render(frame, result)` for the newest result until the stream ends or
+    `render` returns False; `idle` is called while waiting for one and may
+    stop the run the same way. Meters: capture counts frames retrieved, with
+    time spent including waiting on the camera, inference frames processed
+    and render frames shown, with latency measured from the moment
+    `cap.retrieve` returned each frame.
+    """
+
+    def __init__(self, cap, process, render, prepare=None, idle=None, drop_frames: bool = True,
+                 stats_seconds: float = APP_STATS_SECONDS):
+        self.cap = cap
+        self.process = process
+        self.render = render
+        self.prepare = prepare
+        self.idle = idle
+        self.drop_frames = drop_frames
+        self.stats_seconds = stats_seconds
+
+        self.frames = LatestSlot()
+        self.results = LatestSlot()
+        self.meters = {name: StageMeter(name) for name in ("capture", "inference", "render")}
+        self.started_at = None
+
+    def capture(self):
+        meter = self.meters["capture"]
+        try:
+            while True:
+                started = time.perf_counter()
+                if not self.cap.grab():
+                    break
+                # While inference hasn't taken the last frame, newer ones are only grabbed, which keeps
+                # the camera's buffer drained without paying to decode frames that would be dropped
+                if self.drop_frames and self.frames.item is not None:
+                    continue
+                ok, frame = self.cap.retrieve()
+                if not ok:
+                    break
+                captured_at = time.perf_counter()
+                meter.record(started, captured_at)
+                if not self.frames.put((frame, captured_at), wait=not self.drop_frames):
+                    break
+        finally:
+            self.frames.close()
+
+    def infer(self):
+        meter = self.meters["inference"]
+        try:
+            while True:
+                item = self.frames.get()
+                if item is None:
+                    break
+                frame, captured_at = item
+                started = time.perf_counter()
+                try:
+                    if self.prepare is not None:
+                        frame = self.prepare(frame)
+                    result = self.process(frame)
+                except Exception as e:
+                    print(f"Error: {e}")
+                    result = None
+                meter.record(started, captured_at)
+                if not self.results.put((frame, captured_at, result)):
+                    break
+        finally:
+            self.results.close()
+            # Unblocks a capture thread waiting on a full slot
+            self.frames.close()
+
+    def stats(self, now: float, reported_at: float) -> dict:
+        seconds = now - reported_at
+        report = {name: meter.report(seconds) for name, meter in self.meters.items()}
+        report["capture"]["dropped"] = self.frames.dropped
+        report["inference"]["dropped"] = self.results.dropped
+        return report
+
+    def run(self) -> dict:
+        """Run until the stream ends or rendering stops it; returns whole-run stats."""
+        threads = [threading.Thread(target=self.capture, name="capture", daemon=True),
+                   threading.Thread(target=self.infer, name="inference", daemon=True)]
+        self.started_at = reported_at = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        meter = self.meters["render"]
+        try:
+            while not self.results.finished:
+                # A short timeout keeps an OpenCV window responsive between results
+                item = self.results.get(timeout=0.01)
+                if item is not None:
+                    frame, captured_at, result = item
+                    started = time.perf_counter()
+                    keep_going = self.render(frame, result)
+                    meter.record(started, captured_at)
+                    if keep_going is False:
+                        break
+                elif self.idle is not None and self.idle() is False:
+                    break
+
+                now = time.perf_counter()
+                if self.stats_seconds and now - reported_at >= self.stats_seconds:
+                    print(f"Stats: {json.dumps(self.stats(now, reported_at))}")
+                    reported_at = now
+        finally:
+            self.frames.close()
+            self.results.close()
+            for thread in threads:
+                thread.join()
+
+        for meter in self.meters.values():
+            meter.last = (0, 0.0, 0.0)
+        report = self.stats(time.perf_counter(), self.started_at)
+        for name, meter in self.meters.items():
+            report[name]["max_latency_ms"] = round(meter.max_latency * 1000, 1)
+        return report
+
+
+def is_camera(source) -> bool:
+    return isinstance(source, int) or str(source).isdigit()
+
+
+def open_capture(source):
+    return cv2.VideoCapture(int(source) if is_camera(source) else source)
@@ -0,0 +1,39 @@
+import asyncio
+import time
+
+
+class FrameMailbox:
+    """One-slot mailbox between a session's receive task and its processing loop.
+
+    A new frame replaces any frame that has not been picked up yet, so the
+    processing loop always works on the newest frame and latency stays bounded
+    when a client sends faster than the server can keep up.
+    """
+
+    def __init__(self):
+        self.message = None
+        self.received_at = 0.0
+        self.dropped = 0
+        self.error = None
+        self.event = asyncio.Event()
+
+    def put(self, message):
+        if self.message is not None:
+            self.dropped += 1
+        self.message = message
+        self.received_at = time.perf_counter()
+        self.event.set()
+
+    def close(self, error: Exception):
+        self.error = error
+        self.event.set()
+
+    async def get(self):
+        while self.message is None:
+            if self.error is not None:
+                raise self.error
+            self.event.clear()
+            await self.event.wait()
+
+        message, self.message = self.message, None
+        return message, self.received_at
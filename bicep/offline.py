@@ -0,0 +1,297 @@
+"""Headless bicep curl scoring for recorded videos.
+
+    python -m bicep.offline recordings/ --output-dir scores/ --workers 8
+
+Videos are split into chunks of frames that run on a process pool, each
+worker with its own Pose graph. Workers only return landmarks; the arm state
+machines then run once over the stitched landmark stream in the parent, so
+a rep that spans a chunk boundary is still counted once. The landmarks are
+not those of a single pass: each chunk starts MediaPipe from a blank frame,
+warmed up on the CHUNK_OVERLAP frames before it, so tracking and smoothing
+can differ from one pass near the boundaries.
+"""
+import argparse
+import collections
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from bicep.angles import NUM_LANDMARKS, arm_angles, landmarks_to_array
+from bicep.app import BicepPoseAnalysis, mp_pose
+from bicep.pose_pool import BLANK_FRAME
+
+VIDEO_EXTENSIONS = {".mp4", ".mov", ".avi", ".mkv", ".webm", ".m4v"}
+
+# Constants from bicep/app.py
+VISIBILITY_THRESHOLD = 0.65
+STAGE_UP_THRESHOLD = 90
+STAGE_DOWN_THRESHOLD = 120
+PEAK_CONTRACTION_THRESHOLD = 60
+LOOSE_UPPER_ARM_ANGLE_THRESHOLD = 40
+
+# Column types for Parquet output; nested values are stored as JSON strings
+FRAME_COLUMNS = {"video": "string", "frame": "int64", "time_s": "float64", "detected": "bool"}
+for _side in ("left", "right"):
+    FRAME_COLUMNS.update({f"{_side}_angles": "json", f"{_side}_counter": "int64",
+                          f"{_side}_stage": "string", f"{_side}_errors": "json"})
+REP_COLUMNS = {"video": "string", "side": "string", "rep": "int64", "start_frame": "int64",
+               "min_angle": "int64", "end_frame": "int64", "start_s": "float64", "end_s": "float64",
+               "errors": "json"}
+
+CHUNK_FRAMES = 900
+# Frames decoded before a chunk starts so tracking has settled at its first frame
+CHUNK_OVERLAP = 15
+
+_pose = None
+
+
+def find_videos(paths):
+    videos = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                videos += [os.path.join(root, name) for name in sorted(files)
+                           if os.path.splitext(name)[1].lower() in VIDEO_EXTENSIONS]
+        else:
+            videos.append(path)
+    return videos
+
+
+def plan_chunks(path, chunk_frames):
+    cap = cv2.VideoCapture(path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+
+    # Containers that don't report a frame count are scored as one stream
+    if frame_count <= 0:
+        return fps, [(0, None)]
+    return fps, [(start, min(start + chunk_frames, frame_count)) for start in range(0, frame_count, chunk_frames)]
+
+
+def _init_worker():
+    global _pose
+    cv2.setNumThreads(1)
+    _pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
+
+
+def score_chunk(path, start, end, overlap=CHUNK_OVERLAP):
+    """Run pose inference over frames [start, end) and return their landmarks.
+
+    Frames without a person are NaN. Returns `(start, landmarks, cpu_seconds)`.
+    """
+    cpu_started = time.process_time()
+
+    # Clear tracking left over from this worker's previous chunk
+    _pose.process(BLANK_FRAME)
+
+    cap = cv2.VideoCapture(path)
+    first = max(0, start - overlap)
+    if first:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, first)
+
+    landmarks = []
+    index = first
+    while end is None or index < end:
+        ok, frame = cap.read()
+        if not ok:
+            break
+
+        results = _pose.process(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+        if index >= start:
+            if results.pose_landmarks:
+                landmarks.append(landmarks_to_array(results.pose_landmarks.landmark))
+            else:
+                landmarks.append(np.full((NUM_LANDMARKS, 4), np.nan, np.float32))
+        index += 1
+    cap.release()
+
+    points = np.stack(landmarks) if landmarks else np.empty((0, NUM_LANDMARKS, 4), np.float32)
+    return start, points, time.process_time() - cpu_started
+
+
+class RecordingScorer:
+    """Steps both arm analyzers over a video's landmark stream, chunk by chunk."""
+
+    def __init__(self, video, fps):
+        self.video = video
+        self.fps = fps
+        self.frame = 0
+        self.analyses = {
+            side: BicepPoseAnalysis(side, STAGE_DOWN_THRESHOLD, STAGE_UP_THRESHOLD,
+                                    PEAK_CONTRACTION_THRESHOLD, LOOSE_UPPER_ARM_ANGLE_THRESHOLD,
+                                    VISIBILITY_THRESHOLD)
+            for side in ("left", "right")
+        }
+        self.open_reps = {}
+
+    def feed(self, points):
+        frames, reps = [], []
+        visibility, curl, upper_arm = arm_angles(points)
+        detected = ~np.isnan(points[:, 0, 0])
+
+        for i in range(len(points)):
+            row = dict.fromkeys(FRAME_COLUMNS)
+            row.update(video=self.video, frame=self.frame, time_s=round(self.frame / self.fps, 3),
+                       detected=bool(detected[i]))
+            if detected[i]:
+                angles = (visibility[i], curl[i], upper_arm[i])
+                for side, analysis in self.analyses.items():
+                    previous_count = analysis.counter
+                    row[f"{side}_angles"] = analysis.analyze_angles(angles, None)
+                    row[f"{side}_counter"] = analysis.counter
+                    row[f"{side}_stage"] = analysis.stage
+                    row[f"{side}_errors"] = dict(analysis.detected_errors)
+                    reps += self.track_rep(side, analysis, previous_count, row[f"{side}_angles"][0])
+            frames.append(row)
+            self.frame += 1
+        return frames, reps
+
+    def track_rep(self, side, analysis, previous_count, curl_angle):
+        finished = []
+        rep = self.open_reps.get(side)
+        if rep is not None and (analysis.stage == "down" or analysis.counter != previous_count):
+            finished.append(self.close_rep(side, analysis))
+            rep = None
+        if analysis.counter != previous_count:
+            rep = self.open_reps[side] = {
+                "video": self.video, "side": side, "rep": analysis.counter,
+                "start_frame": self.frame, "min_angle": curl_angle,
+                "errors_before": dict(analysis.detected_errors),
+            }
+        if rep is not None and curl_angle is not None:
+            rep["min_angle"] = min(rep["min_angle"], curl_angle)
+        return finished
+
+    def close_rep(self, side, analysis):
+        rep = self.open_reps.pop(side)
+        errors_before = rep.pop("errors_before")
+        rep["end_frame"] = self.frame
+        rep["start_s"] = round(rep["start_frame"] / self.fps, 3)
+        rep["end_s"] = round(self.frame / self.fps, 3)
+        rep["errors"] = {name: count - errors_before[name] for name, count in analysis.detected_errors.items()}
+        return rep
+
+    def finish(self):
+        return [self.close_rep(side, self.analyses[side]) for side in list(self.open_reps)]
+
+
+class JsonlWriter:
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(row) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetWriter:
+    def __init__(self, path, columns):
+        import pyarrow
+        import pyarrow.parquet
+        types = {"string": pyarrow.string(), "int64": pyarrow.int64(), "float64": pyarrow.float64(),
+                 "bool": pyarrow.bool_(), "json": pyarrow.string()}
+        self.pyarrow = pyarrow
+        self.columns = columns
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in columns.items()])
+        self.writer = pyarrow.parquet.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        if not rows:
+            return
+        data = {
+            name: [json.dumps(row.get(name)) if kind == "json" else row.get(name) for row in rows]
+            for name, kind in self.columns.items()
+        }
+        self.writer.write_table(self.pyarrow.Table.from_pydict(data, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score recorded bicep curl videos without a display")
+    parser.add_argument("inputs", nargs="+", help="video files or directories")
+    parser.add_argument("--output-dir", default="bicep_scores")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-frames", type=int, default=CHUNK_FRAMES)
+    parser.add_argument("--no-frames", action="store_true", help="only write per-rep records")
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    def open_writer(name, columns):
+        path = os.path.join(args.output_dir, f"{name}.{args.format}")
+        return ParquetWriter(path, columns) if args.format == "parquet" else JsonlWriter(path)
+
+    rep_writer = open_writer("reps", REP_COLUMNS)
+    frame_writer = None if args.no_frames else open_writer("frames", FRAME_COLUMNS)
+
+    videos = find_videos(args.inputs)
+    jobs = []
+    for video in videos:
+        fps, chunks = plan_chunks(video, args.chunk_frames)
+        jobs += [(video, fps, start, end) for start, end in chunks]
+
+    started = time.perf_counter()
+    total_frames = 0
+    cpu_seconds = 0.0
+    scorers = {}
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        # Results are consumed in submission order with a bounded number in
+        # flight, so landmarks for a long video never pile up in memory
+        pending = collections.deque()
+        jobs = iter(jobs)
+        for video, fps, start, end in jobs:
+            pending.append((video, fps, pool.submit(score_chunk, video, start, end)))
+            if len(pending) < args.workers * 2:
+                continue
+            total_frames, cpu_seconds = _drain(pending.popleft(), scorers, frame_writer, rep_writer, total_frames, cpu_seconds)
+        while pending:
+            total_frames, cpu_seconds = _drain(pending.popleft(), scorers, frame_writer, rep_writer, total_frames, cpu_seconds)
+
+    for scorer in scorers.values():
+        rep_writer.write(scorer.finish())
+    rep_writer.close()
+    if frame_writer is not None:
+        frame_writer.close()
+
+    elapsed = time.perf_counter() - started
+    print(json.dumps({
+        "videos": len(videos),
+        "frames": total_frames,
+        "wall_seconds": round(elapsed, 2),
+        "workers": args.workers,
+        "fps": round(total_frames / elapsed, 2) if elapsed else 0.0,
+        "fps_per_core": round(total_frames / cpu_seconds, 2) if cpu_seconds else 0.0,
+    }, indent=2))
+
+
+def _drain(job, scorers, frame_writer, rep_writer, total_frames, cpu_seconds):
+    video, fps, future = job
+    _, points, chunk_cpu = future.result()
+
+    scorer = scorers.get(video)
+    if scorer is None:
+        # Videos are submitted one after another, so a new video means the previous one is done
+        for finished in list(scorers):
+            rep_writer.write(scorers.pop(finished).finish())
+        scorer = scorers[video] = RecordingScorer(video, fps)
+
+    frames, reps = scorer.feed(points)
+    rep_writer.write(reps)
+    if frame_writer is not None:
+        frame_writer.write(frames)
+    return total_frames + len(points), cpu_seconds + chunk_cpu
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+
+import numpy as np
+
+POSE_POOL_SIZE = int(os.environ.get("POSE_POOL_SIZE", 4))
+POSE_POOL_MAX = int(os.environ.get("POSE_POOL_MAX", 32))
+POSE_POOL_IDLE_SECONDS = float(os.environ.get("POSE_POOL_IDLE_SECONDS", 300))
+# How long a new session waits for a graph when all POSE_POOL_MAX are in use
+POSE_CHECKOUT_TIMEOUT_SECONDS = float(os.environ.get("POSE_CHECKOUT_TIMEOUT_SECONDS", 10))
+
+# MediaPipe loads its models on the first processed frame, not in the
+# constructor. Pushing a blank frame through warms a new graph and, because
+# nothing is detected, also clears tracking and smoothing state left over
+# from the previous session without paying for Pose.reset() and a cold start.
+BLANK_FRAME = np.zeros((64, 64, 3), np.uint8)
+
+
+class PoseTimeout(Exception):
+    pass
+
+
+class PosePool:
+    """Bounded pool of warm MediaPipe Pose graphs shared by all sessions.
+
+    `size` graphs are built by `warm()` and kept for the life of the process.
+    Demand beyond that grows the pool up to `max_size`; those extra graphs are
+    closed by `evict_idle()` once unused for `idle_seconds`.
+    """
+
+    def __init__(self, factory, size: int = POSE_POOL_SIZE, max_size: int = POSE_POOL_MAX,
+                 idle_seconds: float = POSE_POOL_IDLE_SECONDS):
+        self.factory = factory
+        self.size = size
+        self.max_size = max(size, max_size)
+        self.idle_seconds = idle_seconds
+
+        self.condition = threading.Condition()
+        self.idle = []
+        self.total = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.evicted = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+
+    def create(self):
+        pose = self.factory()
+        pose.process(BLANK_FRAME)
+        return pose
+
+    def warm(self):
+        while True:
+            with self.condition:
+                if self.total >= self.size:
+                    return
+                self.total += 1
+            self.checkin(self.create(), reset=False)
+
+    def checkout(self, timeout: float = None):
+        started = time.perf_counter()
+        pose = None
+        waited = False
+
+        with self.condition:
+            while True:
+                if self.idle:
+                    pose = self.idle.pop()[0]
+                    self.hits += 1
+                    break
+                if self.total < self.max_size:
+                    self.total += 1
+                    self.misses += 1
+                    break
+                waited = True
+                remaining = None if timeout is None else timeout - (time.perf_counter() - started)
+                if remaining is not None and remaining <= 0:
+                    raise PoseTimeout("No Pose graph available")
+                self.condition.wait(remaining)
+
+        if pose is None:
+            try:
+                pose = self.create()
+            except Exception:
+                with self.condition:
+                    self.total -= 1
+                    self.condition.notify()
+                raise
+
+        wait_ms = (time.perf_counter() - started) * 1000
+        with self.condition:
+            self.waits += waited
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+        return pose
+
+    def checkin(self, pose, reset: bool = True):
+        if reset:
+            try:
+                pose.process(BLANK_FRAME)
+            except Exception:
+                self.discard(pose)
+                return
+
+        with self.condition:
+            # Most recently used graphs go on top so the cold tail is what gets evicted
+            self.idle.append((pose, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, pose):
+        with self.condition:
+            self.total -= 1
+            self.condition.notify()
+        pose.close()
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        evicted = []
+        with self.condition:
+            while self.idle and self.total > self.size and self.idle[0][1] < cutoff:
+                evicted.append(self.idle.pop(0)[0])
+                self.total -= 1
+            self.evicted += len(evicted)
+
+        for pose in evicted:
+            pose.close()
+        return len(evicted)
+
+    def stats(self) -> dict:
+        with self.condition:
+            checkouts = self.hits + self.misses
+            return {
+                "size": self.total,
+                "idle": len(self.idle),
+                "hits": self.hits,
+                "misses": self.misses,
+                "waits": self.waits,
+                "evicted": self.evicted,
+                "wait_ms_avg": round(self.wait_ms_total / checkouts, 3) if checkouts else 0.0,
+                "wait_ms_max": round(self.wait_ms_max, 3),
+            }
+
+    def close(self):
+        with self.condition:
+            idle, self.idle = self.idle, []
+            self.total -= len(idle)
+        for pose, _ in idle:
+            pose.close()
@@ -0,0 +1,237 @@
+import asyncio
+import os
+import pickle
+import threading
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from bicep.startup import timed
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+MODEL_PATHS = [
+    os.path.join(BASE_DIR, 'models', 'bicep_dp.keras'),
+    os.path.join(BASE_DIR, 'bicep_dp.keras'),
+]
+TFLITE_PATHS = [
+    os.path.join(BASE_DIR, 'models', 'bicep_dp.tflite'),
+    os.path.join(BASE_DIR, 'bicep_dp.tflite'),
+]
+SCALER_PATHS = [
+    os.path.join(BASE_DIR, 'models', 'input_scaler.pkl'),
+    os.path.join(BASE_DIR, 'input_scaler.pkl'),
+]
+
+POSTURE_ERROR_THRESHOLD = 0.95
+POSTURE_LABELS = ["Correct", "Leaning"]
+
+POSTURE_BATCH_SIZE = int(os.environ.get("POSTURE_BATCH_SIZE", 32))
+POSTURE_BATCH_WAIT_MS = float(os.environ.get("POSTURE_BATCH_WAIT_MS", 2))
+
+# MediaPipe PoseLandmark indices of IMPORTANT_LMS in bicep/app.py, in the same order:
+# NOSE, LEFT_SHOULDER, RIGHT_SHOULDER, RIGHT_ELBOW, LEFT_ELBOW, RIGHT_WRIST, LEFT_WRIST, LEFT_HIP, RIGHT_HIP
+IMPORTANT_LM_INDICES = np.array([0, 11, 12, 14, 13, 16, 15, 23, 24])
+NUM_FEATURES = len(IMPORTANT_LM_INDICES) * 4
+
+
+def _first_existing(paths):
+    for path in paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def posture_features(points: np.ndarray) -> np.ndarray:
+    """Model input rows from (33, 4) or (N, 33, 4) landmarks, matching `extract_important_keypoints`."""
+    points = np.asarray(points, np.float32)
+    return points[..., IMPORTANT_LM_INDICES, :].reshape(points.shape[:-2] + (NUM_FEATURES,))
+
+
+def fold_scaler(scaler):
+    """Reduce a fitted per-feature sklearn scaler to `x * scale + offset`.
+
+    StandardScaler, MinMaxScaler and friends are all per-feature affine maps,
+    so transforming zeros and ones recovers the coefficients exactly.
+    """
+    with warnings.catch_warnings():
+        # Scalers fitted on a DataFrame warn about missing feature names
+        warnings.simplefilter("ignore")
+        offset = scaler.transform(np.zeros((1, NUM_FEATURES)))[0]
+        scale = scaler.transform(np.ones((1, NUM_FEATURES)))[0] - offset
+    return scale.astype(np.float32), offset.astype(np.float32)
+
+
+class TFLiteModel:
+    def __init__(self, path):
+        with timed("import tflite runtime"):
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        with timed("load bicep_dp.tflite"):
+            self.interpreter = Interpreter(model_path=path)
+        self.input_index = self.interpreter.get_input_details()[0]["index"]
+        self.output_index = self.interpreter.get_output_details()[0]["index"]
+        self.batch_size = None
+
+    def __call__(self, rows: np.ndarray) -> np.ndarray:
+        if rows.shape[0] != self.batch_size:
+            self.interpreter.resize_tensor_input(self.input_index, rows.shape)
+            self.interpreter.allocate_tensors()
+            self.batch_size = rows.shape[0]
+        self.interpreter.set_tensor(self.input_index, rows)
+        self.interpreter.invoke()
+        return self.interpreter.get_tensor(self.output_index)
+
+
+class KerasModel:
+    def __init__(self, path):
+        with timed("import tensorflow"):
+            import tensorflow as tf
+            from tensorflow.keras.models import load_model
+
+        with timed("load bicep_dp.keras"):
+            self.model = load_model(path)
+        # A traced function skips Model.predict's per-call batching machinery
+        self.function = tf.function(
+            lambda rows: self.model(rows, training=False),
+            input_signature=[tf.TensorSpec([None, NUM_FEATURES], tf.float32)],
+        )
+
+    def __call__(self, rows: np.ndarray) -> np.ndarray:
+        return self.function(rows).numpy()
+
+
+class PostureClassifier:
+    """The bicep posture model with the input scaler folded into a NumPy affine map."""
+
+    def __init__(self, model, scale: np.ndarray, offset: np.ndarray):
+        self.model = model
+        self.scale = scale
+        self.offset = offset
+
+    @classmethod
+    def load(cls, model_path: str = None, scaler_path: str = None, prefer_tflite: bool = True):
+        scaler_path = scaler_path or _first_existing(SCALER_PATHS)
+        if scaler_path is None:
+            raise FileNotFoundError("input_scaler.pkl not found")
+        with timed("load input_scaler.pkl"), open(scaler_path, "rb") as f:
+            scale, offset = fold_scaler(pickle.load(f))
+
+        tflite_path = _first_existing(TFLITE_PATHS) if prefer_tflite and model_path is None else None
+        if tflite_path is not None:
+            return cls(TFLiteModel(tflite_path), scale, offset)
+
+        model_path = model_path or _first_existing(MODEL_PATHS)
+        if model_path is None:
+            raise FileNotFoundError("bicep_dp.keras not found")
+        return cls(KerasModel(model_path), scale, offset)
+
+    def predict(self, rows: np.ndarray) -> np.ndarray:
+        """Class probabilities for (N, 36) feature rows."""
+        rows = np.asarray(rows, np.float32).reshape(-1, NUM_FEATURES)
+        return self.model(rows * self.scale + self.offset)
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier() -> PostureClassifier:
+    """The process-wide classifier, loaded on first use."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = PostureClassifier.load()
+        return _classifier
+
+
+def warm_up() -> PostureClassifier:
+    """Load the classifier and run one prediction so no session pays for the first trace."""
+    classifier = get_classifier()
+    with timed("posture first inference"):
+        classifier.predict(np.zeros((1, NUM_FEATURES), np.float32))
+    return classifier
+
+
+def update_posture(posture: int, probabilities: np.ndarray) -> int:
+    """Only switch the reported posture on a confident prediction, as `main()` does."""
+    predicted_class = int(np.argmax(probabilities))
+    if round(float(probabilities[predicted_class]), 2) >= POSTURE_ERROR_THRESHOLD:
+        return predicted_class
+    return posture
+
+
+class PostureBatcher:
+    """Groups posture rows from concurrent sessions into one model call.
+
+    Rows wait at most `max_wait_ms` for company. All model calls run on one
+    dedicated thread, so rows that arrive while a batch is running simply form
+    the next batch.
+    """
+
+    def __init__(self, classifier: PostureClassifier, max_batch: int = POSTURE_BATCH_SIZE,
+                 max_wait_ms: float = POSTURE_BATCH_WAIT_MS):
+        self.classifier = classifier
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="posture")
+        self.pending = []
+        self.flush_handle = None
+
+    async def classify(self, row: np.ndarray) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((row, future))
+
+        if len(self.pending) >= self.max_batch:
+            self.flush()
+        elif self.flush_handle is None:
+            self.flush_handle = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        batch, self.pending = self.pending, []
+        if batch:
+            asyncio.ensure_future(self.run(batch))
+
+    async def run(self, batch):
+        rows = np.stack([row for row, _ in batch])
+        try:
+            loop = asyncio.get_running_loop()
+            probabilities = await loop.run_in_executor(self.executor, self.classifier.predict, rows)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future), row_probabilities in zip(batch, probabilities):
+            if not future.done():
+                future.set_result(row_probabilities)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def export_tflite(model_path: str = None, output_path: str = None):
+    """Convert the Keras posture model to TFLite for the lightweight runtime."""
+    import tensorflow as tf
+    from tensorflow.keras.models import load_model
+
+    model_path = model_path or _first_existing(MODEL_PATHS)
+    output_path = output_path or os.path.join(os.path.dirname(model_path), "bicep_dp.tflite")
+    converter = tf.lite.TFLiteConverter.from_keras_model(load_model(model_path))
+    with open(output_path, "wb") as f:
+        f.write(converter.convert())
+    return output_path
+
+
+if __name__ == "__main__":
+    print(export_tflite())
@@ -0,0 +1,114 @@
+import os
+
+import numpy as np
+
+# Predict landmarks on some frames instead of running pose.process on all of them
+POSE_PREDICT = os.environ.get("POSE_PREDICT", "0") == "1"
+# Most frames in a row that may be predicted between two inferences
+POSE_PREDICT_MAX_SKIP = int(os.environ.get("POSE_PREDICT_MAX_SKIP", 3))
+# Degrees any exercise angle may move from the last inferred frame before the next frame is inferred
+POSE_PREDICT_ANGLE_BUDGET = float(os.environ.get("POSE_PREDICT_ANGLE_BUDGET", 12))
+# How far, in normalised image units, the constant-velocity guess for an
+# inferred frame may miss a landmark before prediction stops
+POSE_PREDICT_TOLERANCE = float(os.environ.get("POSE_PREDICT_TOLERANCE", 0.02))
+# Degrees that guess may miss any exercise angle by before prediction stops
+POSE_PREDICT_ANGLE_TOLERANCE = float(os.environ.get("POSE_PREDICT_ANGLE_TOLERANCE", 5))
+
+# Frames are inferred while an angle is this close to, or crossing, a rule threshold
+THRESHOLD_MARGIN = 5
+# Smoothing of the per-landmark velocity between inferred frames
+VELOCITY_SMOOTHING = 0.5
+MIN_VISIBILITY = 0.5
+
+
+class LandmarkPredictor:
+    """Constant-velocity landmark prediction between pose inferences.
+
+    Every inferred frame goes to `observe`, which updates each landmark's
+    velocity and checks how far the previous velocity would have missed it.
+    `predict` extrapolates the last inferred landmarks for frames that can
+    skip inference. A frame is inferred when the skip limit is used up, when
+    the extrapolated exercise angles (from `features`, the session's
+    FeatureSet) have moved more than `angle_budget` degrees, so fast reps get
+    inferred every frame, or when an angle is near one of `thresholds`, the
+    engine's (angle index, threshold) pairs, so every stage change, error
+    and peak decision is made on inferred landmarks.
+
+    Each inferred frame also checks the guess the velocity would have made
+    for it. The skip limit grows by one after every accurate guess and drops
+    to zero after a miss: a landmark off by more than `tolerance` or an
+    exercise angle by more than `angle_tolerance` degrees. Nothing bounds
+    the error of a predicted frame itself. `angle_budget` only limits how
+    far predictions stray from the last inferred frame, and a limb that
+    starts moving while frames are predicted is missed until the next
+    inference. Times are in seconds; sessions use the client's frame
+    timestamps when the frames carry them.
+    """
+
+    def __init__(self, features, thresholds=(), max_skip: int = POSE_PREDICT_MAX_SKIP,
+                 angle_budget: float = POSE_PREDICT_ANGLE_BUDGET, tolerance: float = POSE_PREDICT_TOLERANCE,
+                 angle_tolerance: float = POSE_PREDICT_ANGLE_TOLERANCE):
+        self.features = features
+        self.threshold_index = np.array([index for index, _ in thresholds], dtype=np.intp)
+        self.threshold_value = np.array([value for _, value in thresholds], dtype=np.float64)
+        self.max_skip = max_skip
+        self.angle_budget = angle_budget
+        self.tolerance = tolerance
+        self.angle_tolerance = angle_tolerance
+
+        self.points = None
+        self.velocity = None
+        self.angles = None
+        self.observed_at = 0.0
+        self.skip_limit = 0
+        self.skipped = 0
+        # Prediction error of the last inferred frame, in normalised image
+        # units over the landmarks and in degrees over the exercise angles
+        self.error = None
+        self.angle_error = None
+
+    def predict(self, now: float):
+        """Landmarks extrapolated to `now`, or None when this frame should be inferred."""
+        if self.velocity is None or self.skipped >= self.skip_limit or now <= self.observed_at:
+            return None
+        predicted = self.points.copy()
+        predicted[:, :3] += self.velocity * (now - self.observed_at)
+        angles, _ = self.features(predicted)
+        if np.abs(angles - self.angles).max(initial=0) > self.angle_budget:
+            return None
+        before, after = self.angles[self.threshold_index], angles[self.threshold_index]
+        near = ((np.minimum(before, after) - THRESHOLD_MARGIN <= self.threshold_value)
+                & (self.threshold_value <= np.maximum(before, after) + THRESHOLD_MARGIN))
+        if near.any():
+            return None
+        self.skipped += 1
+        return predicted
+
+    def observe(self, points: np.ndarray, now: float):
+        dt = now - self.observed_at
+        angles, _ = self.features(points)
+        if self.points is not None and dt > 0:
+            visible = (points[:, 3] > MIN_VISIBILITY) & (self.points[:, 3] > MIN_VISIBILITY)
+            if self.velocity is not None:
+                guess = self.points.copy()
+                guess[:, :3] += self.velocity * dt
+                self.error = float(np.abs(guess[:, :2] - points[:, :2])[visible].max(initial=0))
+                self.angle_error = float(np.abs(self.features(guess)[0] - angles).max(initial=0))
+                if self.error > self.tolerance or self.angle_error > self.angle_tolerance:
+                    self.skip_limit = 0
+                else:
+                    self.skip_limit = min(self.max_skip, self.skip_limit + 1)
+                velocity = (points[:, :3] - self.points[:, :3]) / dt
+                self.velocity += VELOCITY_SMOOTHING * (velocity - self.velocity)
+            else:
+                self.velocity = (points[:, :3] - self.points[:, :3]) / dt
+
+        self.points = points.copy()
+        self.angles = angles
+        self.observed_at = now
+        self.skipped = 0
+
+    def reset(self):
+        """Forget the motion, e.g. when the person is lost."""
+        self.points = self.velocity = self.angles = self.error = self.angle_error = None
+        self.skip_limit = self.skipped = 0
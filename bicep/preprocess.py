@@ -0,0 +1,102 @@
+import math
+import os
+
+import cv2
+import numpy as np
+
+# Longer side of the image handed to pose.process; 0, the default, keeps the client's resolution
+POSE_INPUT_SIZE = int(os.environ.get("POSE_INPUT_SIZE", 0))
+# Crop to the person found in the previous frame; off unless POSE_ROI_CROP=1
+POSE_ROI_CROP = os.environ.get("POSE_ROI_CROP", "0") == "1"
+# Padding around the landmark bounding box, as a fraction of its longer side
+ROI_MARGIN = 0.35
+ROI_MIN_VISIBILITY = 0.5
+ROI_MIN_LANDMARKS = 8
+
+FULL_FRAME = (0.0, 0.0, 1.0, 1.0)
+
+
+class PosePreprocessor:
+    """Shrinks each frame before pose inference and maps the landmarks back.
+
+    Frames are cropped to the region around the previous frame's landmarks and
+    downscaled so their longer side is at most `input_size`. The crop only
+    moves once the person nears its edge, so MediaPipe's own tracking sees a
+    steady image; when the person is lost the next frame is searched in full.
+    Landmarks are mapped back to full-frame normalised coordinates, so the
+    angles fed to BicepPoseAnalysis are the ones a full-frame pass would give.
+    """
+
+    def __init__(self, input_size: int = POSE_INPUT_SIZE, roi_crop: bool = POSE_ROI_CROP, margin: float = ROI_MARGIN):
+        self.input_size = input_size
+        self.roi_crop = roi_crop
+        self.margin = margin
+        self.roi = FULL_FRAME
+        # (x offset, y offset, x scale, y scale) of the last prepared image within the full frame
+        self.transform = FULL_FRAME
+
+    def decode_size(self) -> int:
+        """Longer side a frame must be decoded at for the crop to still reach `input_size`.
+
+        The crop is a fraction of the frame, so a frame decoded at
+        `input_size` would leave it smaller than that; 0 means full scale.
+        """
+        if not self.input_size or self.roi == FULL_FRAME:
+            return self.input_size
+        x0, y0, x1, y1 = self.roi
+        return math.ceil(self.input_size / min(x1 - x0, y1 - y0))
+
+    def prepare(self, image: np.ndarray) -> np.ndarray:
+        height, width = image.shape[:2]
+        if self.roi != FULL_FRAME:
+            x0, y0, x1, y1 = self.roi
+            left, top = int(x0 * width), int(y0 * height)
+            right, bottom = math.ceil(x1 * width), math.ceil(y1 * height)
+            image = image[top:bottom, left:right]
+            self.transform = (left / width, top / height, (right - left) / width, (bottom - top) / height)
+        else:
+            self.transform = FULL_FRAME
+
+        longer = max(image.shape[:2])
+        if self.input_size and longer > self.input_size:
+            scale = self.input_size / longer
+            size = (max(1, round(image.shape[1] * scale)), max(1, round(image.shape[0] * scale)))
+            return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+        return np.ascontiguousarray(image)
+
+    def restore(self, points: np.ndarray) -> np.ndarray:
+        """Map (33, 4) landmarks from the prepared image to the full frame, in place."""
+        x0, y0, sx, sy = self.transform
+        points[:, 0] = points[:, 0] * sx + x0
+        points[:, 1] = points[:, 1] * sy + y0
+        # MediaPipe scales z like x
+        points[:, 2] *= sx
+        if self.roi_crop:
+            self.track(points)
+        return points
+
+    def lost(self):
+        self.roi = FULL_FRAME
+
+    def track(self, points: np.ndarray):
+        visible = points[:, 3] > ROI_MIN_VISIBILITY
+        if np.count_nonzero(visible) < ROI_MIN_LANDMARKS:
+            self.roi = FULL_FRAME
+            return
+
+        xs, ys = points[visible, 0], points[visible, 1]
+        box = (float(xs.min()), float(ys.min()), float(xs.max()), float(ys.max()))
+        pad = self.margin * max(box[2] - box[0], box[3] - box[1])
+
+        # Keep the current crop while the box plus half the padding still fits
+        if self.roi != FULL_FRAME and _contains(self.roi, box, pad / 2):
+            return
+        roi = (max(0.0, box[0] - pad), max(0.0, box[1] - pad), min(1.0, box[2] + pad), min(1.0, box[3] + pad))
+        # Not worth cropping when the person fills most of the frame
+        self.roi = FULL_FRAME if (roi[2] - roi[0]) * (roi[3] - roi[1]) > 0.8 else roi
+
+
+def _contains(roi, box, pad):
+    x0, y0, x1, y1 = roi
+    return ((x0 == 0.0 or box[0] - pad >= x0) and (y0 == 0.0 or box[1] - pad >= y0)
+            and (x1 == 1.0 or box[2] + pad <= x1) and (y1 == 1.0 or box[3] + pad <= y1))
@@ -0,0 +1,66 @@
+import base64
+import collections
+import os
+
+import cv2
+
+REP_LOG_SIZE = int(os.environ.get("REP_LOG_SIZE", 50))
+# Width in pixels of the JPEG thumbnail kept for each rep's peak contraction; 0 disables it
+REP_THUMBNAIL_WIDTH = int(os.environ.get("REP_THUMBNAIL_WIDTH", 0))
+
+
+class RepEvent:
+    """One completed rep of one exercise on one side.
+
+    `peak_angle` is the most extreme angle of the rep, e.g. the tightest
+    elbow angle of a curl, and `errors` flags which error rules fired.
+    """
+
+    __slots__ = ("rep", "exercise", "side", "started_at", "ended_at", "peak_angle", "errors", "thumbnail")
+
+    def __init__(self, rep: int, side: str, started_at: float, peak_angle: int, error_names=(), exercise: str = "bicep_curl"):
+        self.rep = rep
+        self.exercise = exercise
+        self.side = side
+        self.started_at = started_at
+        self.ended_at = None
+        self.peak_angle = peak_angle
+        self.errors = dict.fromkeys(error_names, False)
+        self.thumbnail = None
+
+    def to_dict(self) -> dict:
+        return {
+            "rep": self.rep,
+            "exercise": self.exercise,
+            "side": self.side,
+            "started_at": self.started_at,
+            "ended_at": self.ended_at,
+            "peak_angle": self.peak_angle,
+            "errors": dict(self.errors),
+            "thumbnail": base64.b64encode(self.thumbnail).decode() if self.thumbnail else None,
+        }
+
+
+class RepLog:
+    """Fixed-size ring buffer of the most recent reps in a session."""
+
+    def __init__(self, size: int = REP_LOG_SIZE):
+        self.events = collections.deque(maxlen=size)
+
+    def append(self, event: RepEvent):
+        self.events.append(event)
+
+    def recent(self, limit: int = None) -> list:
+        events = list(self.events)
+        if limit is not None:
+            events = events[-limit:] if limit > 0 else []
+        return [event.to_dict() for event in events]
+
+
+def make_thumbnail(frame, width: int, rgb: bool = False) -> bytes:
+    height = max(1, int(frame.shape[0] * width / frame.shape[1]))
+    small = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+    if rgb:
+        small = cv2.cvtColor(small, cv2.COLOR_RGB2BGR)
+    ok, encoded = cv2.imencode(".jpg", small, [cv2.IMWRITE_JPEG_QUALITY, 70])
+    return encoded.tobytes() if ok else None
@@ -0,0 +1,113 @@
+import json
+
+# orjson is optional; it serialises /ws responses several times faster than the stdlib
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Clients pick the response format with ?response=compact; the default stays
+# the full dict every frame
+RESPONSE_COMPACT = "compact"
+# Compact sessions get a full snapshot every this many frames, or with
+# ?full_every=0 only when a counter or error count changes
+COMPACT_FULL_EVERY = 30
+
+# Short keys for compact responses. Angles keep their [curl, upper arm] pairs.
+COMPACT_KEYS = {
+    "left_counter": "lc",
+    "right_counter": "rc",
+    "left_errors": "le",
+    "right_errors": "re",
+    "left_angles": "la",
+    "right_angles": "ra",
+    "stage": "s",
+    "posture": "p",
+    "exercises": "x",
+    "error": "e",
+    "seq": "q",
+    "ts": "t",
+    "dropped_frames": "d",
+    "server_ms": "ms",
+    "max_fps": "f",
+    "latency_ms": "l",
+    "timings_ms": "tm",
+    "session_id": "id",
+    "resumed": "r",
+    "draining": "dr",
+    "predicted": "pr",
+}
+# Keys whose change makes the next compact message a full snapshot with ?full_every=0
+STATE_KEYS = ("lc", "rc", "le", "re", "x")
+# Keys that only hold for the frame that carries them; the rest stay until changed
+FRAME_KEYS = ("e", "pr")
+_LONG_KEYS = {short: key for key, short in COMPACT_KEYS.items()}
+_MISSING = object()
+
+if orjson is not None:
+    _orjson_dumps = orjson.dumps
+    _orjson_options = orjson.OPT_SERIALIZE_NUMPY
+
+    def dumps(obj) -> str:
+        return _orjson_dumps(obj, option=_orjson_options).decode()
+else:
+    dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def _copy_summaries(summaries: dict) -> dict:
+    return {name: {"counter": summary["counter"], "stage": summary["stage"], "errors": dict(summary["errors"])}
+            for name, summary in summaries.items()}
+
+
+_NESTED_COPIES = {"le": dict, "re": dict, "x": _copy_summaries}
+
+
+def compact_response(response: dict) -> dict:
+    """Short-key form of a whole /ws response."""
+    return {COMPACT_KEYS.get(key, key): value for key, value in response.items()}
+
+
+class CompactEncoder:
+    """Delta-encodes one session's responses for ?response=compact.
+
+    A full snapshot carries every key sent so far, at its latest value,
+    plus "k": 1. Every other message only carries the keys whose value
+    changed since the previous message; keys it leaves out keep their last
+    value, except "e" and "pr", which are sent as null once they no longer
+    apply.
+    Nested values such as the error dicts are replaced whole. The first
+    message is always a full snapshot.
+    """
+
+    def __init__(self, full_every: int = COMPACT_FULL_EVERY):
+        self.full_every = full_every
+        self.last = {}
+        self.frames = 0
+
+    def encode(self, response: dict) -> str:
+        last = self.last
+        # One pass: short keys for the values that changed, copying nested
+        # dicts the session keeps updating in place
+        changed = {}
+        for key, value in response.items():
+            key = COMPACT_KEYS.get(key, key)
+            if last.get(key, _MISSING) != value:
+                changed[key] = _NESTED_COPIES[key](value) if key in _NESTED_COPIES else value
+        for key in FRAME_KEYS:
+            if key in last and key not in changed and _LONG_KEYS[key] not in response:
+                changed[key] = None
+
+        if self.frames == 0:
+            full = True
+        elif self.full_every:
+            full = self.frames % self.full_every == 0
+        else:
+            full = any(key in changed for key in STATE_KEYS)
+        self.frames += 1
+
+        last.update(changed)
+        for key in FRAME_KEYS:
+            if last.get(key, 0) is None:
+                del last[key]
+        # A full snapshot is the client's whole state, including values from earlier frames
+        return dumps(dict(last, k=1) if full else changed)
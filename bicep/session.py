@@ -0,0 +1,258 @@
+import time
+
+import numpy as np
+
+from bicep.angles import NUM_LANDMARKS, landmarks_to_array
+from bicep.exercises import ExerciseEngine
+from bicep.frames import (
+    FrameError, PROTOCOL_BINARY, PROTOCOL_LANDMARKS, decode_binary_frame, decode_json_frame, decode_landmark_frame,
+    frame_meta, parse_json_frame,
+)
+from bicep.gate import POSE_GATE, FrameGate
+from bicep.predict import POSE_PREDICT, LandmarkPredictor
+from bicep.posture import IMPORTANT_LM_INDICES, POSTURE_LABELS, posture_features, update_posture
+from bicep.preprocess import PosePreprocessor
+from bicep.reps import REP_THUMBNAIL_WIDTH, RepLog
+
+
+class CurlSession:
+    """Per-connection state for /ws: the Pose graph and both arm analyzers.
+
+    `process` is called from the session's pose worker thread and does every
+    CPU-bound stage of a frame, so the event loop only receives and sends.
+    It returns the response and, when a person was found, the posture model
+    input row for that frame. Sessions on the landmarks protocol get their
+    landmarks from the client and have no Pose graph. `exercises` are extra
+    ExerciseStates stepped alongside the two arms' curls. With `predict`,
+    frames the LandmarkPredictor can extrapolate skip decoding and inference.
+    With `gate`, frames the FrameGate finds unchanged skip inference and
+    reuse the last result.
+    """
+
+    def __init__(self, pose, left_arm_analysis, right_arm_analysis, protocol, stage_timings=False, exercises=(),
+                 predict=POSE_PREDICT, gate=POSE_GATE):
+        self.pose = pose
+        self.left_arm_analysis = left_arm_analysis
+        self.right_arm_analysis = right_arm_analysis
+        self.exercises = list(exercises)
+        # All exercises share one feature pass per frame
+        self.engine = ExerciseEngine([left_arm_analysis, right_arm_analysis] + self.exercises)
+        self.protocol = protocol
+        self.stage_timings = stage_timings
+        # (decode, pose, analysis) seconds for the last frame, None if it failed to decode.
+        # pose is None for landmark frames.
+        self.timings = None
+        self.points = np.full((NUM_LANDMARKS, 4), np.nan, np.float32)
+        # The last inferred landmarks; predicted frames overwrite self.points
+        self.inferred_points = np.full((NUM_LANDMARKS, 4), np.nan, np.float32)
+        self.preprocessor = PosePreprocessor()
+        # Landmarks copied out of each pose result, the rest staying NaN: the
+        # exercises' and posture's, or all of them for the crop to box
+        self.landmarks = None if self.preprocessor.roi_crop else np.union1d(self.engine.features.landmarks,
+                                                                            IMPORTANT_LM_INDICES).tolist()
+        self.predictor = LandmarkPredictor(self.engine.features, self.engine.thresholds()) if predict and protocol != PROTOCOL_LANDMARKS else None
+        # Whether the last frame's landmarks were predicted rather than inferred
+        self.predicted = False
+        # Whether the predictor runs on the client's frame timestamps rather than server time
+        self.client_clock = False
+        self.gate = FrameGate() if gate and protocol != PROTOCOL_LANDMARKS else None
+        # Whether the last frame skipped inference because it hadn't changed
+        self.gated = False
+        # Whether the last inferred frame had a person in it
+        self.person_found = False
+        self.posture = 0
+        # time.time() of the last frame with a person in it
+        self.seen_at = 0.0
+
+        # Every exercise records completed reps into one ring buffer
+        self.rep_log = RepLog()
+        for analysis in self.engine.states:
+            analysis.rep_log = self.rep_log
+            analysis.thumbnail_width = REP_THUMBNAIL_WIDTH
+            analysis.frame_is_rgb = True
+
+    def process(self, message):
+        if self.protocol == PROTOCOL_LANDMARKS:
+            return self.process_landmarks(message)
+        started = time.perf_counter()
+        self.predicted = self.gated = False
+
+        now = started
+        if self.predictor is not None:
+            try:
+                if self.protocol != PROTOCOL_BINARY:
+                    # Parsed once, for the timestamp here and the pixels below
+                    message = parse_json_frame(message)
+                seq, ts = frame_meta(message, self.protocol)
+            except FrameError as e:
+                self.timings = None
+                return {"error": str(e)}, None
+            now = self.predictor_time(ts, started)
+            predicted = self.predictor.predict(now)
+            self.predicted = predicted is not None
+            if self.predicted:
+                return self.process_predicted(message, predicted, seq, ts, started)
+
+        try:
+            if self.protocol == PROTOCOL_BINARY:
+                image, seq, ts = decode_binary_frame(message, self.preprocessor.decode_size())
+            else:
+                image, seq, ts = decode_json_frame(message, self.preprocessor.decode_size())
+        except FrameError as e:
+            self.timings = None
+            return {"error": str(e)}, None
+        decoded = time.perf_counter()
+
+        self.gated = self.gate is not None and not self.gate.check(image, started)
+        if self.gated:
+            return self.process_unchanged(image, seq, ts, started, decoded, now)
+
+        results = self.pose.process(self.preprocessor.prepare(image))
+        inferred = time.perf_counter()
+
+        features = None
+        self.person_found = bool(results.pose_landmarks)
+        if not self.person_found:
+            self.preprocessor.lost()
+            if self.predictor is not None:
+                self.predictor.reset()
+            response_data = {"error": "No human found"}
+        else:
+            # Landmarks come back relative to the crop; put them in full-frame
+            # coordinates before the analysis
+            landmarks_to_array(results.pose_landmarks.landmark, out=self.points, indices=self.landmarks)
+            self.preprocessor.restore(self.points)
+            self.inferred_points[:] = self.points
+            if self.predictor is not None:
+                self.predictor.observe(self.points, now)
+            response_data, features = self.analyze(image)
+        analyzed = time.perf_counter()
+        self.timings = (decoded - started, inferred - decoded, analyzed - inferred)
+        return self.finish(response_data, seq, ts), features
+
+    def process_unchanged(self, image, seq, ts, started, decoded, now):
+        # The last inferred landmarks still hold, not any predicted since;
+        # a still person has zero velocity
+        features = None
+        if self.person_found:
+            self.points[:] = self.inferred_points
+            if self.predictor is not None:
+                self.predictor.observe(self.points, now)
+            response_data, features = self.analyze(image)
+        else:
+            response_data = {"error": "No human found"}
+        analyzed = time.perf_counter()
+        self.timings = (decoded - started, None, analyzed - decoded)
+        return self.finish(response_data, seq, ts), features
+
+    def process_predicted(self, message, points, seq, ts, started):
+        # Rep thumbnails need the pixels; otherwise only the header was read
+        image = None
+        if self.engine.states[0].thumbnail_width:
+            decode = decode_binary_frame if self.protocol == PROTOCOL_BINARY else decode_json_frame
+            try:
+                image, _, _ = decode(message, self.preprocessor.input_size)
+            except FrameError as e:
+                self.timings = None
+                return {"error": str(e)}, None
+        decoded = time.perf_counter()
+
+        self.points[:] = points
+        response_data, features = self.analyze(image)
+        response_data["predicted"] = True
+        analyzed = time.perf_counter()
+        self.timings = (decoded - started, None, analyzed - decoded)
+        return self.finish(response_data, seq, ts), features
+
+    def predictor_time(self, ts, started: float) -> float:
+        """Seconds on the predictor's clock: the client's capture time when the frame carries one.
+
+        The predictor starts over when frames start or stop carrying timestamps.
+        """
+        client_clock = ts is not None
+        if client_clock != self.client_clock:
+            self.client_clock = client_clock
+            self.predictor.reset()
+        return ts / 1000 if client_clock else started
+
+    def process_landmarks(self, message):
+        started = time.perf_counter()
+
+        try:
+            points, seq, ts = decode_landmark_frame(message)
+        except FrameError as e:
+            self.timings = None
+            return {"error": str(e)}, None
+        decoded = time.perf_counter()
+
+        features = None
+        if points is None:
+            response_data = {"error": "No human found"}
+        else:
+            self.points[:] = points
+            response_data, features = self.analyze(None)
+        analyzed = time.perf_counter()
+        self.timings = (decoded - started, None, analyzed - decoded)
+        return self.finish(response_data, seq, ts), features
+
+    def analyze(self, image):
+        self.seen_at = time.time()
+        left_angles, right_angles = (
+            (None, None) if values is None else tuple(values) for values in self.engine.step(self.points, image)[:2]
+        )
+
+        response_data = {
+            "left_counter": self.left_arm_analysis.counter,
+            "right_counter": self.right_arm_analysis.counter,
+            "left_errors": self.left_arm_analysis.detected_errors,
+            "right_errors": self.right_arm_analysis.detected_errors,
+            "left_angles": left_angles,
+            "right_angles": right_angles,
+            "stage": self.left_arm_analysis.stage  # Using left arm as primary reference
+        }
+        if self.exercises:
+            response_data["exercises"] = {state.exercise.key: state.summary() for state in self.exercises}
+        return response_data, posture_features(self.points)
+
+    def finish(self, response_data, seq, ts):
+        if seq is not None:
+            response_data["seq"] = seq
+        if ts is not None:
+            response_data["ts"] = ts
+        if self.stage_timings:
+            response_data["timings_ms"] = {
+                stage: round(seconds * 1000, 3)
+                for stage, seconds in zip(("decode", "pose", "analysis"), self.timings) if seconds is not None
+            }
+        return response_data
+
+    def resting(self, seconds: float) -> bool:
+        """True between sets: no rep finished in the last `seconds` and none under way.
+
+        A rep left unfinished by a person who has been out of frame for
+        `seconds` doesn't count as under way.
+        """
+        now = time.time()
+        if now - self.seen_at < seconds and any(state.current_rep is not None for state in self.engine.states):
+            return False
+        events = self.rep_log.events
+        return not events or now - events[-1].ended_at >= seconds
+
+    def snapshot(self) -> dict:
+        """Counting state of every exercise, to resume the session on another connection."""
+        return {
+            "states": {state.exercise.key: state.snapshot() for state in self.engine.states},
+            "posture": self.posture,
+        }
+
+    def restore(self, snapshot: dict):
+        # Exercises the old connection didn't run start from zero; ones it ran that this one doesn't are ignored
+        states = snapshot["states"]
+        for state in self.engine.states:
+            if state.exercise.key in states:
+                state.restore(states[state.exercise.key])
+        self.posture = snapshot["posture"]
+
+    def update_posture(self, probabilities) -> str:
+        self.posture = update_posture(self.posture, probabilities)
+        return POSTURE_LABELS[self.posture]
@@ -0,0 +1,52 @@
+import contextlib
+import sys
+import threading
+import time
+
+# Milliseconds spent on each heavy import and model load in this process
+STARTUP_TIMINGS = {}
+_timings_lock = threading.Lock()
+_process_started = time.perf_counter()
+
+
+@contextlib.contextmanager
+def timed(name: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        with _timings_lock:
+            STARTUP_TIMINGS[name] = round((time.perf_counter() - started) * 1000, 1)
+
+
+def import_mediapipe():
+    """Import mediapipe without letting it drag in TensorFlow.
+
+    mediapipe.tasks imports `tensorflow.tools.docs` purely for API doc
+    generation whenever TensorFlow is installed, which costs seconds on every
+    cold start. Hiding TensorFlow for the duration of the import makes it
+    fall back to its no-op stub; TensorFlow stays importable afterwards for
+    the posture model.
+    """
+    if "mediapipe" in sys.modules:
+        return sys.modules["mediapipe"]
+
+    with timed("import mediapipe"):
+        hidden = "tensorflow" not in sys.modules
+        if hidden:
+            sys.modules["tensorflow"] = None
+        try:
+            import mediapipe
+        finally:
+            if hidden and sys.modules.get("tensorflow", 0) is None:
+                del sys.modules["tensorflow"]
+    return mediapipe
+
+
+def startup_report() -> dict:
+    with _timings_lock:
+        timings = dict(STARTUP_TIMINGS)
+    return {
+        "timings_ms": timings,
+        "uptime_ms": round((time.perf_counter() - _process_started) * 1000, 1),
+    }
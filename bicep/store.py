@@ -0,0 +1,179 @@
+import asyncio
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# "memory" keeps snapshots in this process only; "sqlite" shares them between
+# every worker on the host through SESSION_STORE_PATH, standing in for a
+# shared cache such as Redis
+SESSION_STORE = os.environ.get("SESSION_STORE", "memory")
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", "sessions.sqlite3")
+SESSION_STORE_SIZE = int(os.environ.get("SESSION_STORE_SIZE", 10000))
+SESSION_TTL_SECONDS = float(os.environ.get("SESSION_TTL_SECONDS", 3600))
+# Each session is written at most once per interval, all due sessions in one batch
+SESSION_FLUSH_SECONDS = float(os.environ.get("SESSION_FLUSH_SECONDS", 1))
+
+SESSION_ID_MAX_LENGTH = 64
+EXPIRE_INTERVAL_SECONDS = 60
+
+
+class MemoryStore:
+    """LRU of encoded snapshots with a time-to-live, local to one process."""
+
+    def __init__(self, max_entries: int = SESSION_STORE_SIZE, ttl: float = SESSION_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id: str):
+        with self.lock:
+            entry = self.entries.get(session_id)
+            if entry is None:
+                return None
+            snapshot, written_at = entry
+            if time.time() - written_at > self.ttl:
+                del self.entries[session_id]
+                return None
+            self.entries.move_to_end(session_id)
+            return snapshot
+
+    def put_many(self, snapshots: dict):
+        now = time.time()
+        with self.lock:
+            for session_id, snapshot in snapshots.items():
+                self.entries[session_id] = (snapshot, now)
+                self.entries.move_to_end(session_id)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def close(self):
+        pass
+
+
+class SQLiteStore:
+    """Snapshots in an SQLite file that every worker process on the host opens.
+
+    WAL mode lets readers in one worker proceed while another writes. Each
+    batch is one transaction; expired rows are deleted at most once a minute.
+    """
+
+    def __init__(self, path: str = SESSION_STORE_PATH, ttl: float = SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, snapshot BLOB NOT NULL, written_at REAL NOT NULL)")
+        self.expired_at = 0.0
+
+    def get(self, session_id: str):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT snapshot FROM sessions WHERE id = ? AND written_at > ?", (session_id, time.time() - self.ttl),
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_many(self, snapshots: dict):
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN")
+            try:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO sessions (id, snapshot, written_at) VALUES (?, ?, ?)",
+                    [(session_id, snapshot, now) for session_id, snapshot in snapshots.items()],
+                )
+                if now - self.expired_at > EXPIRE_INTERVAL_SECONDS:
+                    self.db.execute("DELETE FROM sessions WHERE written_at < ?", (now - self.ttl,))
+                    self.expired_at = now
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def open_store(kind: str = SESSION_STORE):
+    if kind == "sqlite":
+        return SQLiteStore()
+    if kind != "memory":
+        print(f"Warning: Unknown SESSION_STORE {kind!r}, using memory")
+    return MemoryStore()
+
+
+def encode_snapshot(snapshot: dict) -> bytes:
+    return json.dumps(snapshot, separators=(",", ":")).encode()
+
+
+def decode_snapshot(data) -> dict:
+    return json.loads(data)
+
+
+class SnapshotWriter:
+    """Batches and rate-limits session snapshot writes to a store.
+
+    `offer` is called after every frame but only takes a snapshot when the
+    session's last one is at least `interval` old, and only queues it when it
+    changed. `run` writes everything queued once per interval, in one
+    `put_many` on an executor thread. `write_now` is for a closing session,
+    so a client reconnecting straight away finds its latest state. Writes go
+    one at a time, so a batch taken before a `write_now` cannot land after it
+    and overwrite the newer snapshot.
+    """
+
+    def __init__(self, store, interval: float = SESSION_FLUSH_SECONDS):
+        self.store = store
+        self.interval = interval
+        self.pending = {}
+        self.offered_at = {}
+        # Last snapshot queued per session, to skip unchanged ones
+        self.latest = {}
+        self.write_lock = asyncio.Lock()
+
+    def offer(self, session_id: str, session):
+        now = time.monotonic()
+        if now - self.offered_at.get(session_id, -self.interval) < self.interval:
+            return
+        self.offered_at[session_id] = now
+        snapshot = encode_snapshot(session.snapshot())
+        if snapshot != self.latest.get(session_id):
+            self.latest[session_id] = snapshot
+            self.pending[session_id] = snapshot
+
+    async def write_now(self, session_id: str, session):
+        snapshot = encode_snapshot(session.snapshot())
+        unwritten = self.pending.pop(session_id, None)
+        queued = self.latest.pop(session_id, None)
+        self.offered_at.pop(session_id, None)
+        if unwritten is not None or queued != snapshot:
+            await self.write({session_id: snapshot})
+
+    async def write(self, batch: dict):
+        async with self.write_lock:
+            await asyncio.get_running_loop().run_in_executor(None, self.store.put_many, batch)
+
+    async def load(self, session_id: str):
+        data = await asyncio.get_running_loop().run_in_executor(None, self.store.get, session_id)
+        return None if data is None else decode_snapshot(data)
+
+    def flush(self):
+        batch, self.pending = self.pending, {}
+        if batch:
+            self.store.put_many(batch)
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            batch, self.pending = self.pending, {}
+            if batch:
+                try:
+                    await self.write(batch)
+                except Exception as e:
+                    print(f"Warning: Session snapshot write failed: {e}")
@@ -0,0 +1,41 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+POSE_WORKERS = int(os.environ.get("POSE_WORKERS", os.cpu_count() or 1))
+POSE_QUEUE_DEPTH = int(os.environ.get("POSE_QUEUE_DEPTH", 4))
+
+
+class PoseWorkerPool:
+    """Single-threaded executors that run the CPU-bound stages of /ws.
+
+    Every session is pinned to one worker for its whole life so its MediaPipe
+    graph is only ever driven from one thread, in frame order. Each worker
+    accepts at most `queue_depth` outstanding jobs; further submissions wait
+    on the event loop instead of piling up behind a slow client.
+    """
+
+    def __init__(self, workers: int = POSE_WORKERS, queue_depth: int = POSE_QUEUE_DEPTH):
+        self.executors = [
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"pose-worker-{i}")
+            for i in range(workers)
+        ]
+        self.slots = [asyncio.Semaphore(queue_depth) for _ in range(workers)]
+        self.sessions = [0] * workers
+
+    def assign(self) -> int:
+        worker = self.sessions.index(min(self.sessions))
+        self.sessions[worker] += 1
+        return worker
+
+    def release(self, worker: int):
+        self.sessions[worker] -= 1
+
+    async def run(self, worker: int, fn, *args):
+        async with self.slots[worker]:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executors[worker], fn, *args)
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False)
@@ -1,11 +1,24 @@
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 import json
-import mediapipe as mp
-import cv2
-import numpy as np
-from bicep.app import BicepPoseAnalysis, calculate_angle, mp_pose
-import base64
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bicep import metrics
+from bicep.app import BicepPoseAnalysis, mp_pose
+from bicep.exercises import EXERCISES, ExerciseState
+from bicep.frames import PROTOCOL_BINARY, PROTOCOL_JSON, PROTOCOL_LANDMARKS
+from bicep.mailbox import FrameMailbox
+from bicep.pose_pool import POSE_CHECKOUT_TIMEOUT_SECONDS, POSE_POOL_MAX, PosePool, PoseTimeout
+from bicep.predict import POSE_PREDICT
+from bicep.responses import COMPACT_FULL_EVERY, RESPONSE_COMPACT, CompactEncoder, dumps
+from bicep.posture import PostureBatcher, warm_up
+from bicep.startup import startup_report, timed
+from bicep.session import CurlSession
+from bicep.store import SESSION_ID_MAX_LENGTH, SnapshotWriter, open_store
+from bicep.workers import PoseWorkerPool
 
 app = FastAPI()
 
@@ -18,9 +31,6 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
-# Initialize pose detection
-mp_drawing = mp.solutions.drawing_utils
-
 # Constants from bicep/app.py
 VISIBILITY_THRESHOLD = 0.65
 STAGE_UP_THRESHOLD = 90
@@ -28,72 +38,340 @@ STAGE_DOWN_THRESHOLD = 120
 PEAK_CONTRACTION_THRESHOLD = 60
 LOOSE_UPPER_ARM_ANGLE_THRESHOLD = 40
 
-@app.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    
-    # Initialize pose detection
-    pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
-    
+# Decode, MediaPipe and arm analysis run on these workers, never on the event loop.
+# Pool size and queue depth come from POSE_WORKERS / POSE_QUEUE_DEPTH.
+POSE_STAGE_TIMINGS = os.environ.get("POSE_STAGE_TIMINGS", "0") == "1"
+pose_workers = None
+
+# Warm Pose graphs are checked out per session and handed back afterwards.
+# Sizing and idle eviction come from POSE_POOL_SIZE / POSE_POOL_MAX / POSE_POOL_IDLE_SECONDS;
+# a session waits at most POSE_CHECKOUT_TIMEOUT_SECONDS for a graph.
+POSE_POOL_EVICT_INTERVAL = 30
+pose_pool = PosePool(lambda: mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5))
+# Checkouts block a thread while they wait, so they get their own threads,
+# enough for every session that could be waiting, instead of the default executor's
+pose_checkout_executor = ThreadPoolExecutor(POSE_POOL_MAX, thread_name_prefix="pose-checkout")
+
+def return_unclaimed_pose(future):
+    # The graph was never used, so it needs no reset
+    if not future.cancelled() and future.exception() is None:
+        pose_pool.checkin(future.result(), reset=False)
+
+async def checkout_pose():
+    future = pose_checkout_executor.submit(pose_pool.checkout, POSE_CHECKOUT_TIMEOUT_SECONDS)
+    try:
+        return await asyncio.wrap_future(future)
+    except asyncio.CancelledError:
+        # The wait itself can't be interrupted; hand the graph back once it arrives
+        future.add_done_callback(return_unclaimed_pose)
+        raise
+
+async def evict_idle_poses():
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(POSE_POOL_EVICT_INTERVAL)
+        await loop.run_in_executor(None, pose_pool.evict_idle)
+
+# Posture rows from all sessions are micro-batched into one model call.
+# Batch size and wait come from POSTURE_BATCH_SIZE / POSTURE_BATCH_WAIT_MS.
+# POSTURE_WARMUP picks when TensorFlow and the model load: "startup" blocks
+# startup on it, "background" loads it right after startup and "lazy" waits
+# for the first frame that needs it. Responses carry no posture until loaded.
+POSTURE_WARMUP = os.environ.get("POSTURE_WARMUP", "background")
+posture_batcher = None
+posture_loading = None
+
+async def load_posture_batcher():
+    global posture_batcher
+    try:
+        classifier = await asyncio.get_running_loop().run_in_executor(None, warm_up)
+        posture_batcher = PostureBatcher(classifier)
+    except Exception as e:
+        print(f"Warning: Posture classifier unavailable: {e}")
+
+def ensure_posture_loading():
+    global posture_loading
+    if posture_loading is None:
+        posture_loading = asyncio.create_task(load_posture_batcher())
+    return posture_loading
+
+# Counters are snapshotted to a store so a client reconnecting with
+# ?session_id= resumes where it left off, on any worker when the store is
+# shared. SESSION_STORE, SESSION_TTL_SECONDS and SESSION_FLUSH_SECONDS
+# configure it; the store is opened per worker, after the launcher forks.
+session_snapshots = None
+
+async def resume_session(session: CurlSession, session_id: str) -> bool:
+    try:
+        snapshot = await session_snapshots.load(session_id)
+        if snapshot is None:
+            return False
+        session.restore(snapshot)
+        return True
+    except Exception as e:
+        print(f"Warning: Could not resume session: {e}")
+        return False
+
+# Graceful drain, started by bicep/launcher.py on shutdown. Responses carry
+# "draining": true and each session is closed with 1012 (service restart) once
+# it is between sets, i.e. DRAIN_REST_SECONDS after its last rep, so clients
+# reconnect to another worker without cutting a set short.
+DRAIN_REST_SECONDS = float(os.environ.get("DRAIN_REST_SECONDS", 5))
+draining = False
+
+async def drain_sessions():
+    global draining
+    draining = True
+    while metrics.active_sessions.value > 0:
+        await asyncio.sleep(0.1)
+
+app.state.drain = drain_sessions
+
+@app.on_event("startup")
+async def start_pose_workers():
+    global pose_workers, session_snapshots
+    loop = asyncio.get_running_loop()
+    pose_workers = PoseWorkerPool()
+    session_snapshots = SnapshotWriter(open_store())
+    app.state.snapshot_writer = asyncio.create_task(session_snapshots.run())
+    with timed("pose pool warm-up"):
+        await loop.run_in_executor(None, pose_pool.warm)
+    if POSTURE_WARMUP == "startup":
+        await ensure_posture_loading()
+    elif POSTURE_WARMUP == "background":
+        ensure_posture_loading()
+    app.state.pose_pool_evictor = asyncio.create_task(evict_idle_poses())
+    print(f"Startup: {startup_report()}")
+
+@app.on_event("shutdown")
+def shutdown_pose_workers():
+    global posture_batcher, posture_loading
+    app.state.pose_pool_evictor.cancel()
+    app.state.snapshot_writer.cancel()
+    session_snapshots.flush()
+    session_snapshots.store.close()
+    pose_workers.shutdown()
+    pose_checkout_executor.shutdown(wait=False, cancel_futures=True)
+    pose_pool.close()
+    if posture_loading is not None and not posture_loading.done():
+        posture_loading.cancel()
+    if posture_batcher is not None:
+        posture_batcher.shutdown()
+    posture_batcher = posture_loading = None
+
+@app.get("/startup")
+def startup_timings():
+    return startup_report()
+
+@app.get("/pose-pool")
+def pose_pool_stats():
+    return pose_pool.stats()
+
+@app.get("/metrics")
+def prometheus_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
+def create_session(pose, protocol: str, debug: bool = False, exercises: list = (), predict: bool = POSE_PREDICT) -> CurlSession:
     # Initialize analyzers for both arms
     left_arm_analysis = BicepPoseAnalysis(
         "left", STAGE_DOWN_THRESHOLD, STAGE_UP_THRESHOLD,
         PEAK_CONTRACTION_THRESHOLD, LOOSE_UPPER_ARM_ANGLE_THRESHOLD,
         VISIBILITY_THRESHOLD
     )
-    
+
     right_arm_analysis = BicepPoseAnalysis(
         "right", STAGE_DOWN_THRESHOLD, STAGE_UP_THRESHOLD,
         PEAK_CONTRACTION_THRESHOLD, LOOSE_UPPER_ARM_ANGLE_THRESHOLD,
         VISIBILITY_THRESHOLD
     )
 
+    # Other exercises run on both sides next to the curls, e.g. ?exercises=squat,lateral_raise
+    extra = [ExerciseState(EXERCISES[name](side, visibility_threshold=VISIBILITY_THRESHOLD))
+             for name in exercises if name in EXERCISES and name != "bicep_curl" for side in ("left", "right")]
+
+    return CurlSession(pose, left_arm_analysis, right_arm_analysis, protocol, POSE_STAGE_TIMINGS or debug, extra, predict)
+
+# Control messages are small JSON text messages, e.g. {"type": "reps", "limit": 10}.
+# Anything larger is a frame, so frames are never parsed on the event loop.
+CONTROL_MESSAGE_MAX_BYTES = 1024
+
+def parse_control_message(text: str):
+    if len(text) > CONTROL_MESSAGE_MAX_BYTES or '"type"' not in text:
+        return None
+    try:
+        message = json.loads(text)
+    except ValueError:
+        return None
+    return message if isinstance(message, dict) and "type" in message else None
+
+async def handle_control_message(websocket: WebSocket, send_lock: asyncio.Lock, session: CurlSession, message: dict):
+    if message["type"] == "reps":
+        limit = message.get("limit")
+        if limit is not None and (not isinstance(limit, int) or isinstance(limit, bool) or limit < 0):
+            response_data = {"type": "reps", "error": "limit must be a non-negative integer"}
+        else:
+            reps = session.rep_log.recent(limit) if session is not None else []
+            response_data = {"type": "reps", "reps": reps}
+    else:
+        response_data = {"error": f"Unknown message type {message['type']}"}
+    async with send_lock:
+        await websocket.send_json(response_data)
+
+async def receive_frames(websocket: WebSocket, protocol: str, mailbox: FrameMailbox, send_lock: asyncio.Lock, get_session):
     try:
         while True:
-            # Receive the base64 encoded image
-            data = await websocket.receive_text()
-            image_data = json.loads(data)
-            image_base64 = image_data['image']
-            
-            # Decode base64 image
-            image_bytes = base64.b64decode(image_base64.split(',')[1])
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            # Convert to RGB
-            image = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            results = pose.process(image)
-
-            if not results.pose_landmarks:
-                await websocket.send_json({"error": "No human found"})
-                continue
-
-            # Process landmarks
-            landmarks = results.pose_landmarks.landmark
-            
-            # Analyze both arms
-            left_angles = left_arm_analysis.analyze_pose(landmarks, frame)
-            right_angles = right_arm_analysis.analyze_pose(landmarks, frame)
-
-            # Create response data
-            response_data = {
-                "left_counter": left_arm_analysis.counter,
-                "right_counter": right_arm_analysis.counter,
-                "left_errors": left_arm_analysis.detected_errors,
-                "right_errors": right_arm_analysis.detected_errors,
-                "left_angles": left_angles,
-                "right_angles": right_angles,
-                "stage": left_arm_analysis.stage  # Using left arm as primary reference
-            }
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+
+            text = message.get("text")
+            if text is not None:
+                control = parse_control_message(text)
+                if control is not None:
+                    await handle_control_message(websocket, send_lock, get_session(), control)
+                    continue
+
+            if protocol in (PROTOCOL_BINARY, PROTOCOL_LANDMARKS):
+                if message.get("bytes") is not None:
+                    mailbox.put(message["bytes"])
+            elif text is not None:
+                mailbox.put(text)
+    except Exception as e:
+        mailbox.close(e)
+
+@app.websocket("/ws")
+async def websocket_endpoint(websocket: WebSocket):
+    await websocket.accept()
+
+    # Clients opt into raw binary frames with ?protocol=binary, or send their
+    # own pose landmarks with ?protocol=landmarks; everyone else keeps sending
+    # base64 data URLs in JSON
+    protocol = websocket.query_params.get("protocol", PROTOCOL_JSON)
+    # ?debug=1 adds each frame's stage timings to its response as timings_ms
+    debug = websocket.query_params.get("debug") == "1"
+    exercises = [name for name in websocket.query_params.get("exercises", "").split(",") if name]
+    # ?predict=1 (or POSE_PREDICT=1) extrapolates landmarks on frames where the
+    # motion allows it instead of running pose inference; those responses carry "predicted": true
+    predict = websocket.query_params.get("predict", "1" if POSE_PREDICT else "0") == "1"
+    # ?response=compact sends short-key deltas instead of the full dict every
+    # frame, with a full snapshot every ?full_every= frames (0: on new reps and errors)
+    encoder = None
+    if websocket.query_params.get("response") == RESPONSE_COMPACT:
+        try:
+            encoder = CompactEncoder(int(websocket.query_params.get("full_every", COMPACT_FULL_EVERY)))
+        except ValueError:
+            encoder = CompactEncoder()
+    # ?session_id= from an earlier response resumes that session's counters;
+    # the first response of every session carries its session_id
+    # An id is only adopted once its snapshot is found, so a client cannot
+    # pick the id another session will be written under
+    requested_id = websocket.query_params.get("session_id", "")
+    session_id = secrets.token_urlsafe(16)
+    metrics.active_sessions.inc()
+
+    # Pin the session to one worker so its Pose graph keeps its tracking state.
+    # Landmark sessions need neither: their frames take tens of microseconds
+    # and are analysed right on the event loop.
+    landmarks_only = protocol == PROTOCOL_LANDMARKS
+    worker = None if landmarks_only else pose_workers.assign()
+    session = None
+
+    # Frames land in a one-slot mailbox; anything not picked up before the next
+    # frame arrives is dropped so results never fall behind the camera
+    mailbox = FrameMailbox()
+    send_lock = asyncio.Lock()
+    receiver = asyncio.create_task(receive_frames(websocket, protocol, mailbox, send_lock, lambda: session))
+    frame_time_ms = None
+    dropped_reported = 0
+
+    try:
+        if landmarks_only:
+            session = create_session(None, protocol, debug, exercises)
+        else:
+            try:
+                pose = await checkout_pose()
+            except PoseTimeout:
+                # Every graph is in use; 1013 tells the client to try again later
+                print(f"Warning: No Pose graph free after {POSE_CHECKOUT_TIMEOUT_SECONDS}s, closing /ws")
+                await websocket.close(code=1013)
+                return
+            session = create_session(pose, protocol, debug, exercises, predict)
+        resumed = 0 < len(requested_id) <= SESSION_ID_MAX_LENGTH and await resume_session(session, requested_id)
+        if resumed:
+            session_id = requested_id
+        first_response = True
+
+        while True:
+            message, received_at = await mailbox.get()
+            if landmarks_only:
+                response_data, features = session.process(message)
+            else:
+                response_data, features = await pose_workers.run(worker, session.process, message)
+            metrics.observe_frame(session.timings, features is not None)
+            if session.predicted:
+                metrics.frames_predicted.inc()
+            elif session.gated:
+                metrics.frames_unchanged.inc()
+            if features is not None:
+                if posture_batcher is not None:
+                    posture_started = time.perf_counter()
+                    response_data["posture"] = session.update_posture(await posture_batcher.classify(features))
+                    posture_seconds = time.perf_counter() - posture_started
+                    metrics.stage_seconds["posture"].observe(posture_seconds)
+                    if session.stage_timings:
+                        response_data["timings_ms"]["posture"] = round(posture_seconds * 1000, 3)
+                else:
+                    ensure_posture_loading()
+
+            # Smoothed server time per frame tells the client how fast it can send
+            elapsed_ms = (time.perf_counter() - received_at) * 1000
+            frame_time_ms = elapsed_ms if frame_time_ms is None else 0.8 * frame_time_ms + 0.2 * elapsed_ms
+
+            response_data["dropped_frames"] = mailbox.dropped
+            metrics.frames_dropped.inc(mailbox.dropped - dropped_reported)
+            dropped_reported = mailbox.dropped
+            response_data["server_ms"] = round(elapsed_ms, 1)
+            response_data["max_fps"] = round(1000 / max(frame_time_ms, 1), 1)
+            if "ts" in response_data:
+                response_data["latency_ms"] = round(time.time() * 1000 - response_data["ts"], 1)
+            if draining:
+                response_data["draining"] = True
+            if first_response:
+                response_data["session_id"] = session_id
+                response_data["resumed"] = resumed
+                first_response = False
 
             # Send the analysis results
-            await websocket.send_json(response_data)
+            async with send_lock:
+                send_started = time.perf_counter()
+                await websocket.send_text(encoder.encode(response_data) if encoder else dumps(response_data))
+            sent = time.perf_counter()
+            metrics.stage_seconds["send"].observe(sent - send_started)
+            metrics.stage_seconds["total"].observe(sent - received_at)
+            session_snapshots.offer(session_id, session)
+
+            if draining and session.resting(DRAIN_REST_SECONDS):
+                await websocket.close(code=1012)
+                break
 
     except Exception as e:
+        if not isinstance(e, WebSocketDisconnect):
+            metrics.errors.inc()
         print(f"Error: {e}")
     finally:
-        pose.close()
+        metrics.active_sessions.dec()
+        receiver.cancel()
+        if session is not None:
+            try:
+                await session_snapshots.write_now(session_id, session)
+            except Exception as e:
+                print(f"Warning: Session snapshot write failed: {e}")
+        if session is not None and session.pose is not None:
+            await pose_workers.run(worker, pose_pool.checkin, session.pose)
+        if worker is not None:
+            pose_workers.release(worker)
 
+# Single process; `python -m bicep.launcher` runs one worker per core
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8000) 